@@ -0,0 +1,48 @@
+"""
+Backfill the `quote_rollups` table from the quotes table.
+
+Usage:
+    python -m scripts.backfill_rollups [--start TS] [--end TS] [--step 604800]
+
+Rollups are recomputed (and overwritten) one `step` of seconds at a
+time, committing after each step. Without `--start`/`--end`, the whole
+quotes table is covered.
+
+Existing databases are backfilled once by the
+`0005_backfill_rollups` migration; use this to recompute a range.
+"""
+import argparse
+from sqlalchemy import func
+from src.db.datahandler import DataHandler
+from src.db.models import Base, Quote, QuoteRollup
+from src.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start", type=int, default=None)
+    parser.add_argument("--end", type=int, default=None)
+    parser.add_argument("--step", type=int, default=7 * 24 * 3600)
+    args = parser.parse_args()
+
+    with DataHandler() as dh:
+        Base.metadata.create_all(dh.engine, tables=[QuoteRollup.__table__])
+        first, last = dh.session.query(
+            func.min(Quote.timestamp), func.max(Quote.timestamp)
+        ).one()
+        if first is None:
+            logger.info("No quotes to roll up.")
+            return
+        start = (args.start or first) // 3600 * 3600
+        end = -(-(args.end or last + 1) // 3600) * 3600  # round up to the hour
+        step = args.step // 3600 * 3600 or 3600
+        for lo in range(start, end, step):
+            hi = min(lo + step, end)
+            dh.update_rollups(lo, hi)
+            logger.info("Rolled up quotes in [%s, %s).", lo, hi)
+
+
+if __name__ == "__main__":
+    main()
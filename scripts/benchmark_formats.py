@@ -0,0 +1,79 @@
+"""
+Benchmark the `/quotes` wire formats: payload size (raw and gzipped)
+and client decode time into a pandas DataFrame.
+
+Usage:
+    python -m scripts.benchmark_formats [--rows 1000000]
+
+Uses synthetic processed quotes shaped like a month of hourly rounds
+across all token pairs (72 pairs x 20 calls x 720 hours ~= 1M rows).
+"""
+import argparse
+import gzip
+import io
+import json
+import time
+from itertools import permutations
+from typing import Callable, Dict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.app.formats import read_columnar, serialize
+from src.configs import TOKEN_DTOs
+
+
+def sample_quotes(n: int) -> pd.DataFrame:
+    """Random quotes shaped like `DataHandler.get_quotes(process=True)`."""
+    rng = np.random.default_rng(0)
+    pairs = list(permutations(TOKEN_DTOs.keys(), 2))
+    idx = np.sort(rng.integers(0, len(pairs), n))
+    df = pd.DataFrame(
+        {
+            "src": [pairs[i][0] for i in idx],
+            "dst": [pairs[i][1] for i in idx],
+            "in_amount": rng.random(n) * 1e24,
+            "out_amount": rng.random(n) * 1e24,
+            "price": rng.random(n),
+            "timestamp": rng.integers(1_700_000_000, 1_702_592_000, n),
+            "price_impact": rng.random(n) * 0.05,
+        }
+    )
+    return df.set_index(["src", "dst"])
+
+
+DECODERS: Dict[str, Callable[[bytes], pd.DataFrame]] = {
+    "json": lambda body: pd.DataFrame(json.loads(body)),
+    "columnar": lambda body: read_columnar(json.loads(body)),
+    "arrow": lambda body: pa.ipc.open_stream(body).read_all().to_pandas(),
+    "parquet": lambda body: pq.read_table(io.BytesIO(body)).to_pandas(),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = sample_quotes(args.rows)
+    print(
+        f"{'format':>10} {'bytes':>14} {'gzip bytes':>14} "
+        f"{'encode s':>10} {'decode s':>10}"
+    )
+    for fmt, decode in DECODERS.items():
+        start = time.perf_counter()
+        body, _ = serialize(df, fmt, lambda obj: json.dumps(obj, separators=(",", ":")))
+        encoded = time.perf_counter() - start
+        zipped = len(gzip.compress(body, 6))
+        start = time.perf_counter()
+        decoded = decode(body)
+        elapsed = time.perf_counter() - start
+        assert len(decoded) == len(df)
+        print(
+            f"{fmt:>10} {len(body):>14,} {zipped:>14,} "
+            f"{encoded:>10.3f} {elapsed:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
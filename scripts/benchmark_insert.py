@@ -0,0 +1,102 @@
+"""
+Benchmark bulk quote inserts against the legacy per-row upserts.
+
+Usage:
+    python -m scripts.benchmark_insert [--uri URI] [--sizes 1000,100000,1000000]
+
+Rows are written to a scratch `quotes_benchmark` table (dropped at the end)
+so the benchmark can run against the local Postgres used for development.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Column, Integer, Numeric, Float, String
+from sqlalchemy.dialects.postgresql import insert
+from src.configs import URI, TOKEN_DTOs
+from src.db.datahandler import DataHandler
+from src.db.models import Base
+
+
+class QuoteBenchmark(Base):
+    """Scratch copy of the quotes table (without foreign keys or partitions)."""
+
+    __tablename__ = "quotes_benchmark"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    src = Column(String)
+    dst = Column(String)
+    in_amount = Column(Numeric)
+    out_amount = Column(Numeric)
+    gas = Column(Integer)
+    price = Column(Float)
+    route_id = Column(BigInteger)
+    timestamp = Column(Integer)
+
+
+def sample_quotes(n: int) -> pd.DataFrame:
+    """Random quotes shaped like the rows `insert_quotes` writes."""
+    rng = np.random.default_rng(0)
+    tokens = np.array(list(TOKEN_DTOs.keys()))
+    return pd.DataFrame(
+        {
+            "src": rng.choice(tokens, n),
+            "dst": rng.choice(tokens, n),
+            "in_amount": [int(x) * 10**12 for x in rng.integers(1, 10**12, n)],
+            "out_amount": [int(x) * 10**12 for x in rng.integers(1, 10**12, n)],
+            "gas": rng.integers(100_000, 1_000_000, n),
+            "price": rng.random(n),
+            "route_id": rng.choice(rng.integers(-(2**63), 2**63 - 1, 100), n),
+            "timestamp": rng.integers(1_700_000_000, 1_710_000_000, n),
+        }
+    )
+
+
+def insert_rowwise(dh: DataHandler, df: pd.DataFrame) -> None:
+    """The legacy `insert_df` loop: one INSERT ... ON CONFLICT per row."""
+    for _, row in df.iterrows():
+        stmt = insert(QuoteBenchmark.__table__).values(**row)
+        dh.session.execute(stmt.on_conflict_do_nothing())
+    dh.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uri", default=URI)
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument(
+        "--max-rowwise",
+        type=int,
+        default=None,
+        help="Skip the legacy loop above this many rows.",
+    )
+    args = parser.parse_args()
+
+    dh = DataHandler(args.uri)
+    QuoteBenchmark.__table__.create(dh.engine, checkfirst=True)
+
+    methods = {
+        "rowwise": lambda df: insert_rowwise(dh, df),
+        "values": lambda df: dh.insert_df(df, QuoteBenchmark, method="values"),
+        "copy": lambda df: dh.insert_df(df, QuoteBenchmark, method="copy"),
+    }
+
+    print(f"{'rows':>10} {'method':>8} {'seconds':>10} {'rows/s':>12}")
+    try:
+        for n in map(int, args.sizes.split(",")):
+            df = sample_quotes(n)
+            for name, fn in methods.items():
+                if name == "rowwise" and args.max_rowwise and n > args.max_rowwise:
+                    continue
+                start = time.perf_counter()
+                fn(df)
+                elapsed = time.perf_counter() - start
+                print(f"{n:>10} {name:>8} {elapsed:>10.3f} {n / elapsed:>12,.0f}")
+                dh.session.execute(QuoteBenchmark.__table__.delete())
+                dh.session.commit()
+    finally:
+        dh.close()
+        QuoteBenchmark.__table__.drop(dh.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark `DataHandler.process_quotes` against the legacy
+groupby + merge + sort_index implementation.
+
+Usage:
+    python -m scripts.benchmark_process_quotes [--sizes 1000000,10000000]
+
+Reports wall time and peak traced memory, and checks that both
+implementations return the same quotes.
+"""
+import argparse
+import time
+import tracemalloc
+from itertools import permutations
+from typing import Callable, Tuple
+import numpy as np
+import pandas as pd
+from src.configs import TOKEN_DTOs
+from src.db.datahandler import DataHandler
+
+
+def sample_quotes(n: int) -> pd.DataFrame:
+    """Random raw quotes shaped like `DataHandler.get_quotes()` output."""
+    rng = np.random.default_rng(0)
+    pairs = list(permutations(TOKEN_DTOs.keys(), 2))
+    idx = rng.integers(0, len(pairs), n)
+    return pd.DataFrame(
+        {
+            "src": np.array([p[0] for p in pairs], dtype=object)[idx],
+            "dst": np.array([p[1] for p in pairs], dtype=object)[idx],
+            "in_amount": rng.random(n) * 1e24,
+            "out_amount": rng.random(n) * 1e24,
+            "price": rng.random(n),
+            "timestamp": rng.integers(1_700_000_000, 1_710_000_000, n),
+        }
+    )
+
+
+def legacy_process_quotes(
+    df: pd.DataFrame, include_ref_price: bool = False
+) -> pd.DataFrame:
+    """The previous `process_quotes`, kept for comparison."""
+    df["in_amount"] = df["in_amount"].astype(float)
+    df["out_amount"] = df["out_amount"].astype(float)
+    df["hour"] = pd.to_datetime(df["timestamp"], unit="s").dt.floor("h")
+    grouped = (
+        df.groupby(["hour", "src", "dst"])
+        .agg(reference_price=("price", "max"))
+        .reset_index()
+    )
+    df = pd.merge(
+        df,
+        grouped,
+        left_on=["hour", "src", "dst"],
+        right_on=["hour", "src", "dst"],
+    )
+    df["price_impact"] = (df["reference_price"] - df["price"]) / df["reference_price"]
+    drop = ["hour"]
+    if not include_ref_price:
+        drop.append("reference_price")
+    df.drop(columns=drop, inplace=True)
+    df.set_index(["src", "dst"], inplace=True)
+    df.sort_index(inplace=True)
+    return df
+
+
+def measure(
+    fn: Callable[[pd.DataFrame], pd.DataFrame], df: pd.DataFrame
+) -> Tuple[pd.DataFrame, float, float]:
+    """Run `fn` on a copy of `df`, returning its output, seconds and peak MB."""
+    df = df.copy()
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = fn(df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak / 1024**2
+
+
+def canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """Order rows within each pair so outputs can be compared."""
+    return df.reset_index().sort_values(list(df.reset_index().columns), kind="stable")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000000,10000000")
+    args = parser.parse_args()
+
+    process = DataHandler.process_quotes
+    print(f"{'rows':>10} {'impl':>8} {'seconds':>10} {'peak MB':>10}")
+    for n in map(int, args.sizes.split(",")):
+        df = sample_quotes(n)
+        old, old_s, old_mb = measure(lambda x: legacy_process_quotes(x, True), df)
+        new, new_s, new_mb = measure(lambda x: process(x, True), df)
+        pd.testing.assert_frame_equal(
+            canonical(old).reset_index(drop=True),
+            canonical(new).reset_index(drop=True),
+        )
+        print(f"{n:>10} {'legacy':>8} {old_s:>10.3f} {old_mb:>10.1f}")
+        print(f"{n:>10} {'new':>8} {new_s:>10.3f} {new_mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
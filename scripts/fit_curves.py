@@ -0,0 +1,45 @@
+"""
+Fit (or refit) the price impact curves of past quotes.
+
+Usage:
+    python -m scripts.fit_curves [--start TS] [--end TS] [--step 604800]
+
+Hourly and daily curves are fitted one `step` of seconds at a time
+from the processed quotes and stored in `curve_fits`, replacing
+existing fits. Without `--start`/`--end`, all quotes are covered.
+"""
+import argparse
+from sqlalchemy import func
+from src.curves import DAY
+from src.db.datahandler import DataHandler
+from src.db.models import Quote
+from src.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start", type=int, default=None)
+    parser.add_argument("--end", type=int, default=None)
+    parser.add_argument("--step", type=int, default=7 * DAY)
+    args = parser.parse_args()
+
+    with DataHandler() as dh:
+        first, last = dh.session.query(
+            func.min(Quote.timestamp), func.max(Quote.timestamp)
+        ).one()
+        if first is None:
+            logger.info("No quotes to fit.")
+            return
+        start = (args.start or first) // DAY * DAY
+        end = args.end or last + 1
+        step = args.step // DAY * DAY or DAY
+        for lo in range(start, end, step):
+            hi = min(lo + step, end)
+            curves = dh.update_curves(lo, hi)
+            logger.info("Fitted %d curves in [%s, %s).", len(curves), lo, hi)
+
+
+if __name__ == "__main__":
+    main()
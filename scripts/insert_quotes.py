@@ -1,11 +1,18 @@
 import os
+import asyncio
 import traceback
 from datetime import datetime
+import pandas as pd
 from dotenv import load_dotenv
 from src.logging import get_logger
+from src.collector.daemon import CollectorDaemon
+from src.collector.spool import QuoteSpool
+from src.db.archive import QuoteArchive
 from src.db.datahandler import DataHandler
-from src.network.oneinch import OneInchQuotes
-from src.configs import TOKEN_DTOs
+from src.network.multichain import MultiChainQuotes
+from src.network.sampling import AdaptiveSampler
+from src.network.scheduler import PairScheduler
+from src.configs import ALL_TOKEN_DTOs
 
 load_dotenv()
 INCH_API_KEY = os.getenv("1INCH_API_KEY")
@@ -13,25 +20,101 @@ assert INCH_API_KEY, "Missing API Key in .env"
 
 logger = get_logger(__name__)
 
-# TODO make more granular, need lower API rate limits
-# currently 1RPS means it takes ~30 min to query 72 pairs 20 times each
+# Chains to quote, collected in parallel. Their tokens are
+# configured in `src.configs.tokens.CHAIN_TOKEN_DTOs`.
+CHAINS = os.getenv("1INCH_CHAINS", "ethereum,arbitrum,optimism").split(",")
+
+# Initial and maximum requests per second for our API tier, shared by
+# all chains. The rate adapts to 429s within these bounds. A round of
+# 96 pairs x 20 calls takes ~1920 / RPS seconds.
+RATE_LIMIT = float(os.getenv("1INCH_RPS", "1"))
+MAX_RATE_LIMIT = float(os.getenv("1INCH_MAX_RPS", str(2 * RATE_LIMIT)))
+
+# Calls per pair. Trade sizes are placed using the last rounds' curves,
+# so fewer calls (e.g. a quick round when the API is busy) still
+# resolve them.
+CALLS = int(os.getenv("1INCH_CALLS", "20"))
+
+# Calls per round over all chains, spent on the pairs most in need
+# of a refresh (if 0, enough to quote every pair). Pairs whose curves
+# are stable are refreshed less often, so adding tokens does not
+# multiply the cost of a round.
+BUDGET = int(os.getenv("1INCH_BUDGET", "0"))
+
+# Refresh state of each pair (last round, cadence, volatility).
+SCHEDULE_STATE = os.getenv("SCHEDULE_STATE", "data/schedule.json")
+
+# Quotes are appended to this local spool as they arrive, then
+# inserted into Postgres in batches, at least every QUOTES_FLUSH_INTERVAL
+# seconds. A round interrupted by a crash is resumed by the next run,
+# and quotes are kept in the spool while Postgres is down.
+SPOOL_DIR = os.getenv("QUOTES_SPOOL_DIR", "data/spool")
+FLUSH_INTERVAL = float(os.getenv("QUOTES_FLUSH_INTERVAL", "2"))
+
+# If set, the Parquet archive in this directory is synced after each round.
+ARCHIVE_DIR = os.getenv("QUOTES_ARCHIVE_DIR")
 
 # TODO start querying other token pairs for markets
 # we might want to include in the future.
 
 
+def prepare(dh: DataHandler, now: int) -> pd.DataFrame:
+    """
+    Store the tokens of newly configured chains and read the last day
+    of quotes, to place the trade sizes (pairs are refreshed at least
+    daily). If Postgres is unavailable, rounds are placed without
+    history and spooled.
+    """
+    try:
+        dh.insert_tokens()
+        latest = dh.latest_timestamp() or now
+        return dh.get_quotes(
+            start=latest - 24 * 3600,
+            end=latest + 1,
+            cols=["src", "dst", "in_amount", "timestamp"],
+            process=True,
+            method="rollup",
+        )
+    except Exception as e:
+        logger.warning("Postgres unavailable, spooling only: %s", e)
+        return pd.DataFrame()
+
+
+def build_collector(now: int, **kwargs) -> CollectorDaemon:
+    """
+    Set up the collector of the configured chains, warmed up at `now`.
+    `kwargs` are passed on to `CollectorDaemon` (e.g. `interval`).
+    """
+    dh = DataHandler()
+    quoter = MultiChainQuotes(
+        INCH_API_KEY,
+        CHAINS,
+        calls=CALLS,
+        rate_limit=RATE_LIMIT,
+        max_rate_limit=MAX_RATE_LIMIT,
+        sampler=AdaptiveSampler.from_quotes(ALL_TOKEN_DTOs, prepare(dh, now)),
+    )
+    scheduler = PairScheduler(quoter.pairs(), calls=CALLS).load(SCHEDULE_STATE)
+    return CollectorDaemon(
+        quoter,
+        dh,
+        QuoteSpool(SPOOL_DIR),
+        scheduler,
+        SCHEDULE_STATE,
+        budget=BUDGET,
+        flush_interval=FLUSH_INTERVAL,
+        archive=QuoteArchive(ARCHIVE_DIR) if ARCHIVE_DIR else None,
+        **kwargs,
+    )
+
+
 def main():
     dt = int(datetime.now().timestamp())
     logger.info(
         f"Fetching quotes on {datetime.fromtimestamp(dt).strftime('%m/%d/%Y, %H:%M:%S')} UTC"
     )
     try:
-        quoter = OneInchQuotes(INCH_API_KEY, TOKEN_DTOs, calls=20)
-        payload = quoter.all_quotes(list(TOKEN_DTOs.keys()))
-        df = quoter.to_df(payload)
-        dh = DataHandler()
-        logger.info("Inserting...")
-        dh.insert_quotes(df)
+        asyncio.run(build_collector(dt).collect(dt))
     except Exception as e:
         logger.error("Error %s\n%s", e, traceback.print_exc())
 
@@ -0,0 +1,57 @@
+"""
+Apply pending schema migrations and create upcoming `quotes`
+partitions. Optionally detach the partitions of old months.
+
+Usage:
+    python -m scripts.migrate_db [--detach-before TS] [--drop]
+
+Detached partitions are left as standalone `quotes_YYYY_MM` tables,
+to be archived (e.g. with pg_dump) or dropped with `--drop`.
+"""
+import argparse
+from sqlalchemy import text
+from src.db.datahandler import DataHandler
+from src.db.migrations import (
+    detach_partition,
+    list_partitions,
+    migrate,
+    next_month,
+    partition_start,
+)
+from src.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--detach-before",
+        type=int,
+        default=None,
+        help="Detach the partitions of months ending at or before this timestamp.",
+    )
+    parser.add_argument("--drop", action="store_true", help="Drop detached partitions.")
+    args = parser.parse_args()
+
+    with DataHandler() as dh:
+        applied = migrate(dh.engine)
+        logger.info("Applied migrations: %s", applied or "none")
+        if args.detach_before is None:
+            return
+
+        with dh.engine.connect() as conn:
+            partitions = list_partitions(conn)
+        for name in partitions:
+            start = partition_start(name)
+            if next_month(start) > args.detach_before:
+                continue
+            detach_partition(dh.engine, start)
+            if args.drop:
+                with dh.engine.begin() as conn:
+                    conn.execute(text(f"DROP TABLE {name}"))
+                logger.info("Dropped %s.", name)
+
+
+if __name__ == "__main__":
+    main()
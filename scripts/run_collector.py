@@ -0,0 +1,53 @@
+"""
+Run the quote collector as a long-running daemon.
+
+Usage:
+    python -m scripts.run_collector [--interval SECONDS] [--offset SECONDS]
+        [--host HOST] [--port PORT]
+
+Collects a round every `--interval` seconds, at `--offset` seconds
+past each multiple of it (by default on the hour), instead of one
+round per `python -m scripts.insert_quotes` run. It is configured by
+the same environment variables. SIGTERM stops it once the quotes in
+flight are stored; the round is resumed on restart. `GET /health`
+(503 when no round succeeded lately) and `GET /status` are served
+on `--port`.
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from scripts.insert_quotes import build_collector
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=int(os.getenv("COLLECTOR_INTERVAL", "3600")),
+        help="Seconds between rounds (default: $COLLECTOR_INTERVAL or 3600).",
+    )
+    parser.add_argument(
+        "--offset",
+        type=int,
+        default=int(os.getenv("COLLECTOR_OFFSET", "0")),
+        help="Seconds past the interval at which rounds start (default: 0).",
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.getenv("COLLECTOR_STATUS_PORT", "8081")),
+        help="Port of /health and /status (default: $COLLECTOR_STATUS_PORT or 8081).",
+    )
+    args = parser.parse_args()
+
+    collector = build_collector(
+        int(datetime.now().timestamp()), interval=args.interval, offset=args.offset
+    )
+    asyncio.run(collector.run(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Sync the local Parquet archive of quotes with the database.
+
+Usage:
+    python -m scripts.sync_archive [--root DIR]
+
+Archives the hours closed since the last sync, and rewrites the
+files of the last `--recheck-days` days missing quotes inserted
+late (e.g. replayed from the collector's spool). The first run
+exports the whole quotes table. Read the archive with
+`src.db.archive.QuoteArchive(root).get_quotes(...)`.
+"""
+import argparse
+import os
+from src.db.archive import QuoteArchive
+from src.db.datahandler import DataHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--root",
+        default=os.getenv("QUOTES_ARCHIVE_DIR", "data/archive"),
+        help="Archive directory (default: $QUOTES_ARCHIVE_DIR or data/archive).",
+    )
+    parser.add_argument(
+        "--lag",
+        type=int,
+        default=600,
+        help="Seconds after the end of an hour before it is archived.",
+    )
+    parser.add_argument("--recheck-days", type=int, default=7)
+    args = parser.parse_args()
+
+    with DataHandler() as dh:
+        QuoteArchive(args.root).sync(dh, args.lag, args.recheck_days * 86400)
+
+
+if __name__ == "__main__":
+    main()
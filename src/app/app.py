@@ -1,27 +1,137 @@
 """
 Provides an API for accessing quotes.
 """
-from flask import Flask, jsonify, request
+import gzip
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Tuple
+import numpy as np
+from flask import Flask, jsonify, request, stream_with_context
 from flask.wrappers import Response
-from flask_sqlalchemy import SQLAlchemy
 from flask_compress import Compress
 from werkzeug.exceptions import BadRequest
 from ..db.datahandler import DataHandler
-from ..configs import URI
+from ..db.pool import pool_stats, timed_engine
+from ..configs import URI, CHAIN_TOKEN_DTOs
+from ..curves import DAY, HOUR, SlippageIndex, WindowedStats
+from .cache import CachedResponse, ResponseCache
+from .coalesce import SingleFlight
+from .formats import MIMETYPES, serialize
+from .streaming import gzip_stream, json_array_stream, ndjson_stream
 
-db = SQLAlchemy()
 app = Flask(__name__)
 Compress(app)  # add gzip compress middleware
 
-app.config["SQLALCHEMY_DATABASE_URI"] = URI
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Flask-Compress buffers streamed responses to compress them,
+# so streams are gzipped incrementally by the view instead.
+app.config["COMPRESS_STREAMS"] = False
+app.config["COMPRESS_MIMETYPES"] = [
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.apache.arrow.stream",
+]  # Parquet pages are already compressed
+# Compute reference prices and price impact in Postgres with window
+# functions ("sql"), or from the hourly rollups where they are exact,
+# i.e. for hour-aligned windows ("rollup"), or in pandas after
+# fetching the raw quotes ("pandas").
+app.config["QUOTES_METHOD"] = os.getenv("QUOTES_METHOD", "sql")
+# `/slippage` prices trades from the quotes of the last
+# SLIPPAGE_WINDOW seconds, indexed in memory.
+app.config["SLIPPAGE_WINDOW"] = 30 * DAY
+# `/windows` restores its rolling statistics from this file on
+# startup and saves them after each new round.
+app.config["WINDOWS_CHECKPOINT"] = os.getenv("WINDOWS_CHECKPOINT", "data/windows.json")
+# Connections to Postgres kept open by each API process, shared by
+# all its requests, and the extra ones opened under load.
+app.config["DB_POOL_SIZE"] = int(os.getenv("DB_POOL_SIZE", "10"))
+app.config["DB_MAX_OVERFLOW"] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 
-
-db.init_app(app)
 app.json.compact = True  # type: ignore [attr-defined]
 
+engine = timed_engine(URI, app.config["DB_POOL_SIZE"], app.config["DB_MAX_OVERFLOW"])
+datahandler = DataHandler(engine=engine)
+
+cache = ResponseCache()
+flights: SingleFlight[CachedResponse] = SingleFlight()
+
+PERIODS = {"hour": HOUR, "day": DAY}
+
+slippage: Dict[str, Any] = {"latest": None, "index": None}
+slippage_lock = threading.Lock()
+
+windows = WindowedStats.load(app.config["WINDOWS_CHECKPOINT"])
+windows_state: Dict[str, Any] = {"latest": None}
+windows_lock = threading.Lock()
+
+
+@app.teardown_appcontext
+def remove_session(_exc: BaseException | None) -> None:
+    """End the session of the request, returning its connection to the pool."""
+    datahandler.close()
+
+
+def request_tokens() -> List[str] | None:
+    """
+    Tokens selected by the `tokens` and `chain` request parameters:
+    the comma-separated `tokens` that are on `chain` (a chain id).
+    None (all tokens) if neither is given.
+    """
+    tokens_raw = request.args.get("tokens", type=str)
+    chain = request.args.get("chain", type=int)
+    tokens = tokens_raw.lower().split(",") if tokens_raw else None
+    if chain is None:
+        return tokens
+    if chain not in CHAIN_TOKEN_DTOs:
+        raise BadRequest(f"Unsupported chain: {chain}.")
+    if not tokens:
+        return list(CHAIN_TOKEN_DTOs[chain])
+    tokens = [token for token in tokens if token in CHAIN_TOKEN_DTOs[chain]]
+    if not tokens:
+        raise BadRequest(f"No tokens on chain {chain}.")
+    return tokens
+
+
+def cached_response(
+    key: Hashable, compute: Callable[[], Tuple[bytes, str]]
+) -> Response:
+    """
+    Serve the response cached at `key`. On a miss, `compute` returns
+    the body and mimetype, which are compressed and cached. Identical
+    requests arriving meanwhile wait for that computation instead of
+    repeating it.
+    """
+    cached = cache.get(key)
+    if cached is None:
+
+        def load() -> CachedResponse:
+            body, mimetype = compute()
+            encoding = None
+            if (
+                mimetype in app.config["COMPRESS_MIMETYPES"]
+                and len(body) >= app.config["COMPRESS_MIN_SIZE"]
+            ):
+                body = gzip.compress(body, app.config["COMPRESS_LEVEL"])
+                encoding = "gzip"
+            return cache.put(key, body, mimetype, encoding)
+
+        try:
+            cached = flights.do(key, load)
+        except Exception as e:  # pylint: disable=broad-except
+            return jsonify({"error": str(e)})
 
-# TODO add response LRU caching
+    # Every variant varies, so shared caches never serve the wrong one.
+    headers = {"Vary": "Accept-Encoding"}
+    body = cached.body
+    if cached.encoding is not None:
+        if request.accept_encodings.quality(cached.encoding) > 0:
+            # Flask-Compress leaves responses with a Content-Encoding alone.
+            headers["Content-Encoding"] = cached.encoding
+        else:
+            body = gzip.decompress(body)
+    return Response(body, mimetype=cached.mimetype, headers=headers)
+
+
+# pylint: disable=too-many-locals
 @app.route("/quotes", methods=["GET"])
 def get_quotes() -> Response:
     """
@@ -37,10 +147,14 @@ def get_quotes() -> Response:
         Comma-separated string of token addresses to get quotes for.
         All pairwise permutations of the provided tokens will be fetched.
         If not provided, all token pairs are returned.
+    chain : int | None, default=None
+        Only return quotes of the tokens on this chain (e.g. 42161 for
+        Arbitrum). Refer to :data:`src.configs.tokens.CHAIN_TOKEN_DTOs`.
     cols : str | None, default=None
         Comma-separated string of columns to return.
         If not provided, the following are returned:
         [`src`, `dst`, `in_amount`, `out_amount`, `price`, `price_impact`, `timestamp`].
+        `chain_id` may also be requested.
     process : bool, default=True
         Whether to process the quotes. If processed, the returned quotes
         will be grouped by `hour` and a `price_impact` column will be added.
@@ -48,41 +162,321 @@ def get_quotes() -> Response:
     include-ref-price : bool, default=False
         Whether to include the inferred reference price for the
         price impact calc.
+    format : str, default="json"
+        One of "json" (a JSON array of records), "ndjson"
+        (newline-delimited JSON records, always streamed), "columnar"
+        (JSON grouped by pair, with token addresses sent once),
+        "arrow" (Arrow IPC stream) or "parquet".
+        Refer to :mod:`src.app.formats`.
+    stream : bool, default=False
+        Whether to stream the response in chunks read from the database
+        through a server-side cursor, keeping memory flat for large
+        windows. Streamed responses are not cached.
 
     Returns
     -------
     flask.wrappers.Response
         The quotes.
+
+    Note
+    ----
+    Responses are cached gzipped, keyed on the normalized parameters.
+    See :class:`src.app.cache.ResponseCache`. Concurrent identical
+    requests share one query, see :class:`src.app.coalesce.SingleFlight`.
     """
     start = request.args.get("start", type=int)
     end = request.args.get("end", type=int)
-    tokens_raw = request.args.get("tokens", type=str)
     cols_raw = request.args.get("cols", type=str)
     process = request.args.get("process", True, type=bool)
     include_ref_price = request.args.get("include-ref-price", False, type=bool)
+    fmt = request.args.get("format", "json", type=str)
+    stream = request.args.get("stream", False, type=bool)
 
     if not start or not end:
         raise BadRequest("start and end must be provided.")
+    if fmt not in MIMETYPES and fmt != "ndjson":
+        raise BadRequest(f"Unsupported format: {fmt}.")
+    if stream and fmt not in ("json", "ndjson"):
+        raise BadRequest("Only json and ndjson can be streamed.")
 
-    tokens = tokens_raw.split(",") if tokens_raw else None
+    tokens = request_tokens()
     cols = cols_raw.split(",") if cols_raw else None
 
-    with DataHandler() as datahandler:
-        try:
-            return jsonify(
-                datahandler.get_quotes(
-                    tokens,
-                    start,
-                    end,
-                    cols=cols,
-                    process=process,
-                    include_ref_price=include_ref_price,
-                )
-                .reset_index()
-                .to_dict(orient="records")
-            )  # TODO better json structure to minimize duplication
-        except Exception as e:  # pylint: disable=broad-except
-            return jsonify({"error": str(e)})
+    if stream or fmt == "ndjson":
+        return stream_quotes(tokens, start, end, cols, process, include_ref_price, fmt)
+
+    key = (
+        start,
+        end,
+        tuple(sorted(set(tokens))) if tokens else None,
+        tuple(cols) if cols else None,
+        process,
+        include_ref_price,
+        fmt,
+    )
+
+    if cache.stale():
+        cache.observe(datahandler.latest_timestamp())
+
+    def compute() -> Tuple[bytes, str]:
+        return serialize(
+            datahandler.get_quotes(
+                tokens,
+                start,
+                end,
+                cols=cols,
+                process=process,
+                include_ref_price=include_ref_price,
+                method=app.config["QUOTES_METHOD"],
+            ),
+            fmt,
+            app.json.dumps,  # type: ignore [attr-defined]
+        )
+
+    return cached_response(key, compute)
+
+
+# pylint: disable=too-many-arguments
+def stream_quotes(
+    tokens: List[str] | None,
+    start: int,
+    end: int,
+    cols: List[str] | None,
+    process: bool,
+    include_ref_price: bool,
+    fmt: str,
+) -> Response:
+    """
+    Stream quotes as NDJSON or a chunked JSON array, gzipped
+    on the fly if the client accepts it.
+    """
+
+    def frames() -> Iterator:
+        yield from datahandler.iter_quotes(
+            tokens,
+            start,
+            end,
+            cols=cols,
+            process=process,
+            include_ref_price=include_ref_price,
+            method=app.config["QUOTES_METHOD"],
+        )
+
+    dumps = app.json.dumps  # type: ignore [attr-defined]
+    if fmt == "ndjson":
+        body, mimetype = ndjson_stream(frames(), dumps), "application/x-ndjson"
+    else:
+        body, mimetype = json_array_stream(frames(), dumps), "application/json"
+
+    headers = {}
+    if request.accept_encodings.quality("gzip") > 0:
+        body = gzip_stream(body, app.config["COMPRESS_LEVEL"])
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+@app.route("/curves", methods=["GET"])
+def get_curves() -> Response:
+    """
+    Get fitted price impact curves.
+
+    Each curve models the quotes of one pair over one period as
+    `price_impact = exp(intercept) * in_amount ** slope`, fitted
+    on trade sizes in [`min_amount`, `max_amount`] (base units).
+    Refer to :func:`src.curves.fit_power_law`.
+
+    Parameters
+    ----------
+    start : int
+        The start timestamp to get curves for.
+    end : int
+        The end timestamp to get curves for.
+    tokens : str | None, default=None
+        Comma-separated string of token addresses, as for `/quotes`.
+    chain : int | None, default=None
+        Chain id of the tokens, as for `/quotes`.
+    period : str, default="hour"
+        Either "hour" or "day".
+    format : str, default="json"
+        One of "json", "columnar", "arrow" or "parquet".
+
+    Returns
+    -------
+    flask.wrappers.Response
+        The curves.
+    """
+    start = request.args.get("start", type=int)
+    end = request.args.get("end", type=int)
+    period = request.args.get("period", "hour", type=str)
+    fmt = request.args.get("format", "json", type=str)
+
+    if not start or not end:
+        raise BadRequest("start and end must be provided.")
+    if period not in PERIODS:
+        raise BadRequest(f"Unsupported period: {period}.")
+    if fmt not in MIMETYPES:
+        raise BadRequest(f"Unsupported format: {fmt}.")
+
+    tokens = request_tokens()
+    key = (
+        "curves",
+        start,
+        end,
+        tuple(sorted(set(tokens))) if tokens else None,
+        period,
+        fmt,
+    )
+
+    if cache.stale():
+        cache.observe(datahandler.latest_timestamp())
+
+    def compute() -> Tuple[bytes, str]:
+        return serialize(
+            datahandler.get_curves(tokens, start, end, PERIODS[period]),
+            fmt,
+            app.json.dumps,  # type: ignore [attr-defined]
+        )
+
+    return cached_response(key, compute)
+
+
+def slippage_index() -> SlippageIndex:
+    """
+    The slippage index over the last `SLIPPAGE_WINDOW` seconds of
+    quotes, rebuilt whenever a new round is observed.
+    """
+    if cache.stale():
+        cache.observe(datahandler.latest_timestamp())
+    with slippage_lock:
+        if slippage["index"] is None or slippage["latest"] != cache.latest:
+            end = (cache.latest or 0) + 1
+            slippage["index"] = datahandler.get_slippage_index(
+                None, end - app.config["SLIPPAGE_WINDOW"], end
+            )
+            slippage["latest"] = cache.latest
+        return slippage["index"]
+
+
+@app.route("/slippage", methods=["POST"])
+def post_slippage() -> Response:
+    """
+    Get the price impact of a batch of trades.
+
+    Each trade is priced on the quotes of its pair from the latest
+    hour at or before its timestamp, interpolating linearly between
+    the quoted trade sizes. Refer to :class:`src.curves.SlippageIndex`.
+
+    Parameters
+    ----------
+    src : str | List[str]
+        The token address sold by each trade.
+    dst : str | List[str]
+        The token address bought by each trade.
+    in_amount : float | List[float]
+        The amount of `src` sold by each trade, in base units.
+    timestamp : int | List[int]
+        The time of each trade.
+    max_age : int | None, default=None
+        Trades whose latest round is older than this many seconds
+        are not priced.
+
+    These are fields of the posted JSON object. Scalars are
+    broadcast against the arrays.
+
+    Returns
+    -------
+    flask.wrappers.Response
+        `{"price_impact": [...]}`, with `null` for trades that
+        could not be priced.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise BadRequest("A JSON object must be posted.")
+    missing = [f for f in ("src", "dst", "in_amount", "timestamp") if f not in payload]
+    if missing:
+        raise BadRequest(f"Missing fields: {', '.join(missing)}.")
+
+    try:
+        impact = slippage_index().lookup(
+            np.char.lower(np.asarray(payload["src"], dtype=str)),
+            np.char.lower(np.asarray(payload["dst"], dtype=str)),
+            np.asarray(payload["in_amount"], dtype=np.float64),
+            np.asarray(payload["timestamp"], dtype=np.int64),
+            payload.get("max_age"),
+        )
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"Invalid trades: {e}") from e
+
+    values = impact.astype(object)
+    values[np.isnan(impact)] = None
+    return jsonify({"price_impact": values.tolist()})
+
+
+@app.route("/windows", methods=["GET"])
+def get_windows() -> Response:
+    """
+    Get rolling price impact statistics.
+
+    For each pair, the median and 90th percentile of the hourly
+    price impact of trading fixed USD notionals, over the last
+    1h, 24h, 7d and 30d. Refer to :class:`src.curves.WindowedStats`.
+
+    Parameters
+    ----------
+    tokens : str | None, default=None
+        Comma-separated string of token addresses, as for `/quotes`.
+    chain : int | None, default=None
+        Chain id of the tokens, as for `/quotes`.
+    format : str, default="json"
+        One of "json", "columnar", "arrow" or "parquet".
+
+    Returns
+    -------
+    flask.wrappers.Response
+        The statistics.
+    """
+    fmt = request.args.get("format", "json", type=str)
+
+    if fmt not in MIMETYPES:
+        raise BadRequest(f"Unsupported format: {fmt}.")
+
+    tokens = request_tokens()
+
+    if cache.stale():
+        cache.observe(datahandler.latest_timestamp())
+
+    with windows_lock:
+        # Catch up from the checkpoint on the first request, then
+        # read only the new round after each insert.
+        if windows_state["latest"] != cache.latest:
+            if datahandler.update_windows(windows):
+                windows.save(app.config["WINDOWS_CHECKPOINT"])
+            windows_state["latest"] = cache.latest
+        stats = windows.stats(tokens)
+
+    body, mimetype = serialize(
+        stats, fmt, app.json.dumps  # type: ignore [attr-defined]
+    )
+    return Response(body, mimetype=mimetype)
+
+
+@app.route("/stats", methods=["GET"])
+def get_stats() -> Response:
+    """
+    Get API statistics.
+
+    Returns
+    -------
+    flask.wrappers.Response
+        Response cache counters (hits, misses, evictions, ...),
+        request coalescing counters (queries run, requests that
+        shared one) and database pool occupancy with the latency of
+        connection checkouts and queries.
+    """
+    return jsonify(
+        {"cache": cache.stats(), "coalesce": flights.stats(), "db": pool_stats(engine)}
+    )
 
 
 if __name__ == "__main__":
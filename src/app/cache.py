@@ -0,0 +1,146 @@
+"""
+Provides a bounded, time-bucket-aware response cache for the API.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable
+
+HOUR = 3600
+
+
+@dataclass
+class CachedResponse:
+    """A serialized response and the metadata needed to expire it."""
+
+    body: bytes
+    mimetype: str
+    created: float
+    encoding: str | None = None  # e.g. "gzip", if the body is compressed
+
+
+# pylint: disable=too-many-instance-attributes
+class ResponseCache:
+    """
+    LRU cache of serialized responses, bounded by entry count,
+    total size and age.
+
+    Quotes are inserted in hourly rounds, but a round can also
+    replay older quotes from the collector's spool into hours that
+    have already been served, so no window is safe from change. All
+    entries are dropped whenever an insert is observed via
+    :func:`observe`, and none is served after `max_age`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 256 * 1024**2,
+        max_age: float = 6 * HOUR,
+        refresh_interval: float = 60,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        max_entries : int, default=512
+            Maximum number of cached responses.
+        max_bytes : int, default=256MB
+            Maximum total size of cached bodies.
+        max_age : float, default=6 hours
+            Entries older than this are evicted.
+        refresh_interval : float, default=60
+            Seconds between checks for a new round, see :func:`stale`.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self.size = 0
+        self.latest: int | None = None  # timestamp of the latest quote seen
+        self.last_inserted: int | None = None  # of the last quote inserted
+        self.checked = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        """Whether it is time to check the database for a new round."""
+        return time.monotonic() - self.checked >= self.refresh_interval
+
+    def observe(self, last_inserted: int | None) -> None:
+        """
+        Record the timestamp of the quote inserted last. If it changed,
+        quotes were inserted: a new round, or older ones replayed from
+        the spool (the timestamp then goes back). Drop all entries.
+        """
+        with self._lock:
+            self.checked = time.monotonic()
+            if last_inserted is None or last_inserted == self.last_inserted:
+                return
+            self.last_inserted = last_inserted
+            self.latest = max(last_inserted, self.latest or last_inserted)
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.size = 0
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        """Get a cached response, counting the hit or miss."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry.created > self.max_age:
+                self._pop(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        body: bytes,
+        mimetype: str = "application/json",
+        encoding: str | None = None,
+    ) -> CachedResponse:
+        """
+        Cache a response, with its content `encoding` if compressed.
+        Bodies larger than the whole cache are not stored. Returns
+        the entry.
+        """
+        with self._lock:
+            entry = CachedResponse(body, mimetype, time.monotonic(), encoding)
+            if len(body) > self.max_bytes:
+                return entry
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = entry
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+                self.evictions += 1
+            return entry
+
+    def _pop(self, key: Hashable) -> None:
+        """Remove an entry. Caller must hold the lock."""
+        entry = self.entries.pop(key)
+        self.size -= len(entry.body)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "latest": self.latest,
+            }
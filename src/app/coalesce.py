@@ -0,0 +1,72 @@
+"""
+Provides single-flight coalescing of identical concurrent requests.
+"""
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class Flight(Generic[T]):
+    """A computation in progress, and its outcome once done."""
+
+    done: threading.Event = field(default_factory=threading.Event)
+    result: T | None = None
+    error: BaseException | None = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    Runs at most one computation per key at a time. Threads asking
+    for a key that is already being computed wait for it and share
+    its result, or its exception, instead of computing it again.
+
+    Nothing is kept once the computation returns, so a burst of
+    identical requests costs one query if the result is cached (e.g.
+    in a :class:`src.app.cache.ResponseCache`) before returning.
+    Requests are only coalesced within a process.
+    """
+
+    def __init__(self) -> None:
+        self.flights: Dict[Hashable, Flight[T]] = {}
+        self.computed = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """The result of `fn`, computed once for all concurrent callers of `key`."""
+        with self._lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = Flight()
+                self.computed += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result  # type: ignore [return-value]
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Computations run, and requests that shared one."""
+        with self._lock:
+            return {
+                "computed": self.computed,
+                "shared": self.shared,
+                "in_flight": len(self.flights),
+            }
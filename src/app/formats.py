@@ -0,0 +1,108 @@
+"""
+Provides the wire formats for `/quotes` responses.
+
+- `json`: a JSON array of records (one object per quote).
+- `columnar`: JSON grouped by pair. Token addresses are sent once
+  and pairs refer to them by integer code; column names are sent once
+  and each pair holds one array per column.
+- `arrow`: an Arrow IPC stream, with `src` and `dst` dictionary-encoded.
+- `parquet`: a Parquet file, with `src` and `dst` dictionary-encoded.
+"""
+import io
+from typing import Any, Callable, Dict, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+Dumps = Callable[[object], str]
+
+MIMETYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def flatten_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Move a named index (e.g. src, dst) into columns, drop a default one."""
+    return df.reset_index(drop=df.index.names == [None])
+
+
+def to_columnar(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Group quotes by pair into a compact JSON-able structure::
+
+        {
+            "tokens": [address, ...],
+            "columns": [col, ...],
+            "pairs": [{"src": code, "dst": code, "data": [[...], ...]}, ...]
+        }
+
+    where `data` holds one array per entry of `columns`.
+    """
+    df = flatten_index(df)
+    if df.empty:
+        return {"tokens": [], "columns": [], "pairs": []}
+    if "src" not in df or "dst" not in df:
+        raise ValueError("columnar format requires the src and dst columns.")
+    codes, tokens = pd.factorize(pd.concat([df["src"], df["dst"]], ignore_index=True))
+    src, dst = codes[: len(df)], codes[len(df) :]
+    cols = [col for col in df.columns if col not in ("src", "dst")]
+    pairs = []
+    for (s, d), idx in df.groupby([src, dst], sort=True).indices.items():
+        pair = df.iloc[idx]
+        pairs.append(
+            {
+                "src": int(s),
+                "dst": int(d),
+                "data": [pair[col].tolist() for col in cols],
+            }
+        )
+    return {"tokens": list(tokens), "columns": cols, "pairs": pairs}
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """Quotes as an Arrow table with dictionary-encoded token columns."""
+    table = pa.Table.from_pandas(flatten_index(df), preserve_index=False)
+    for col in ("src", "dst"):
+        if col in table.column_names:
+            i = table.column_names.index(col)
+            table = table.set_column(i, col, table[col].dictionary_encode())
+    return table
+
+
+def serialize(df: pd.DataFrame, fmt: str, dumps: Dumps) -> Tuple[bytes, str]:
+    """Serialize quotes to `fmt`, returning the body and its mimetype."""
+    if fmt == "json":
+        body = dumps(df.reset_index().to_dict(orient="records")).encode()
+    elif fmt == "columnar":
+        body = dumps(to_columnar(df)).encode()
+    elif fmt == "arrow":
+        table = to_arrow(df)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    elif fmt == "parquet":
+        buf = io.BytesIO()
+        pq.write_table(to_arrow(df), buf, compression="zstd")
+        body = buf.getvalue()
+    else:
+        raise ValueError(f"Unsupported format: {fmt}.")
+    return body, MIMETYPES[fmt]
+
+
+def read_columnar(payload: Dict[str, Any]) -> pd.DataFrame:
+    """Client-side decoder: rebuild a flat dataframe from `columnar` JSON."""
+    tokens = np.array(payload["tokens"], dtype=object)
+    frames = []
+    for pair in payload["pairs"]:
+        frame = pd.DataFrame(dict(zip(payload["columns"], pair["data"])))
+        frame.insert(0, "dst", tokens[pair["dst"]])
+        frame.insert(0, "src", tokens[pair["src"]])
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,43 @@
+"""
+Provides generators for streaming large query results
+as NDJSON or a chunked JSON array.
+"""
+import zlib
+from typing import Iterable, Iterator
+import pandas as pd
+from .formats import Dumps, flatten_index
+
+
+def ndjson_stream(frames: Iterable[pd.DataFrame], dumps: Dumps) -> Iterator[bytes]:
+    """One JSON record per line, one chunk per dataframe."""
+    for df in frames:
+        records = flatten_index(df).to_dict(orient="records")
+        if records:
+            yield ("\n".join(dumps(r) for r in records) + "\n").encode()
+
+
+def json_array_stream(frames: Iterable[pd.DataFrame], dumps: Dumps) -> Iterator[bytes]:
+    """A single JSON array of records, written one dataframe at a time."""
+    yield b"["
+    first = True
+    for df in frames:
+        records = flatten_index(df).to_dict(orient="records")
+        if not records:
+            continue
+        body = ",".join(dumps(r) for r in records)
+        yield (body if first else "," + body).encode()
+        first = False
+    yield b"]"
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip a stream incrementally, so the compressed body
+    never has to be held in memory.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,290 @@
+"""
+Provides the `CollectorDaemon` class, which collects rounds of
+quotes on a wall-clock grid in one long-running process.
+"""
+import asyncio
+import signal
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Sequence, Tuple
+from aiohttp import web
+from ..db.archive import QuoteArchive
+from ..db.datahandler import DataHandler
+from ..db.migrations import ensure_partitions
+from ..logging import get_logger
+from ..network.multichain import MultiChainQuotes
+from ..network.oneinch import Amounts
+from ..network.ratelimit import AdaptiveRateLimiter
+from ..network.sampling import Pair
+from ..network.scheduler import PairScheduler
+from .pipeline import QuotePipeline, Sessions
+from .spool import QuoteSpool
+
+logger = get_logger(__name__)
+
+
+def next_tick(now: float, interval: int, offset: int = 0) -> int:
+    """First time after `now` on a grid of `interval` seconds from `offset`."""
+    return int((now - offset) // interval + 1) * interval + offset
+
+
+# pylint: disable=too-many-instance-attributes
+class CollectorDaemon:
+    """
+    Collects a round every `interval` seconds, at fixed times
+    (e.g. on the hour), keeping its state warm between rounds: the
+    HTTP pool of each chain, the rate limiter (and the rate it has
+    learned), the database engine and route ids, and the sampler and
+    scheduler, which are otherwise rebuilt from Postgres on each run.
+
+    Rounds never overlap: a round that overruns the grid delays the
+    next one to the following tick. On SIGTERM (or SIGINT), no new
+    quotes are requested, the ones in flight are spooled and inserted,
+    and the round is left unfinished in the spool, so the next start
+    resumes it right away.
+
+    :func:`collect` runs a single round, for one-shot runs such as
+    `scripts/insert_quotes.py`. While running, `/health` and `/status`
+    are served on `port`, see :func:`status`.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        quoter: MultiChainQuotes,
+        dh: DataHandler,
+        spool: QuoteSpool,
+        scheduler: PairScheduler,
+        schedule_path: str,
+        interval: int = 3600,
+        offset: int = 0,
+        budget: int = 0,
+        flush_interval: float = 2.0,
+        archive: QuoteArchive | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        quoter : MultiChainQuotes
+            Quotes the pairs of every chain.
+        dh : DataHandler
+            Stores the quotes and fits the curves.
+        spool : QuoteSpool
+            Write-ahead log of the rounds.
+        scheduler : PairScheduler
+            Plans each round, saved to `schedule_path` after it.
+        schedule_path : str
+            Path of the scheduler state.
+        interval, offset : int, default=1 hour, 0
+            Rounds start at `offset` seconds past each multiple of
+            `interval` since the epoch.
+        budget : int, default=0
+            Calls per round (if 0, enough to quote every pair).
+        flush_interval : float, default=2.0
+            Refer to :class:`QuotePipeline`.
+        archive : QuoteArchive | None, default=None
+            Synced after each round, if given.
+        """
+        self.quoter = quoter
+        self.dh = dh
+        self.spool = spool
+        self.scheduler = scheduler
+        self.schedule_path = schedule_path
+        self.interval = interval
+        self.offset = offset
+        self.budget = budget
+        self.flush_interval = flush_interval
+        self.archive = archive
+        self.limiter = AdaptiveRateLimiter(
+            quoter.rate_limit, max_rate=quoter.max_rate_limit
+        )
+        self.stopping = asyncio.Event()
+        self.state = "idle"
+        self.started = time.time()
+        self.next_round: int | None = None
+        self.pipeline: QuotePipeline | None = None
+        self.last: Dict[str, Any] = {}  # summary of the last round
+        self.last_success: float | None = None
+
+    def stop(self) -> None:
+        """Stop after the quotes in flight, e.g. on SIGTERM."""
+        logger.info("Stopping...")
+        self.state = "stopping"
+        self.stopping.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def healthy(self) -> bool:
+        """Whether a round succeeded within the last two intervals."""
+        since = self.last_success or self.started
+        return time.time() - since < 2 * self.interval + 60
+
+    def status(self) -> Dict[str, Any]:
+        """State, last round, and the live stats of the current round."""
+        return {
+            "state": self.state,
+            "healthy": self.healthy(),
+            "uptime": time.time() - self.started,
+            "next_round": self.next_round,
+            "last_round": self.last,
+            "pipeline": self.pipeline.stats() if self.pipeline else None,  # live
+            "rate_limit": self.limiter.rate,
+            "spooled_rounds": self.spool.rounds(),
+        }
+
+    def _plan(self, now: int) -> Tuple[int, Sequence[Tuple[Pair, Amounts]]]:
+        """
+        Open a round: the unfinished one in the spool if any, or a
+        new one at `now`. Returns its timestamp and trade sizes.
+        """
+        pending = self.spool.pending()
+        if pending:
+            missing = sum(len(amounts) for _, amounts in pending[1])
+            logger.info("Resuming round %d: %d quotes missing.", pending[0], missing)
+            return pending
+        pairs = list(self.scheduler.pairs)
+        plan = self.scheduler.plan(
+            self.budget or len(pairs) * self.scheduler.calls, now
+        )
+        logger.info("Quoting %d of %d pairs.", len(plan), len(pairs))
+        sizes: List[Tuple[Pair, Amounts]] = [
+            (pair, self.quoter.trade_sizes(pair, calls)) for pair, calls in plan
+        ]
+        if sizes:
+            self.spool.start_round(now, sizes)
+        return now, sizes
+
+    def _ensure_partitions(self, since: int | None) -> None:
+        try:
+            with self.dh.engine.begin() as conn:
+                ensure_partitions(conn, since=since)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Could not create partitions: %s", e)
+
+    def _after_round(self, start: int) -> None:
+        """Fit the curves of the rounds since `start`, and sync the archive."""
+        logger.info("Fitting curves...")
+        self.dh.update_curves(start, int(time.time()) + 1)
+        if self.archive:
+            logger.info("Syncing archive...")
+            self.archive.sync(self.dh)
+
+    async def collect(self, now: int, sessions: Sessions | None = None) -> bool:
+        """
+        Collect the round at `now`, or resume an unfinished one, then
+        drain the spool and refit the curves. Returns whether the
+        quotes are all in Postgres (if not, they are left in the spool
+        for the next round).
+        """
+        for quoter in self.quoter.quoters.values():
+            quoter.latency.reset()  # its sessions outlive the round
+        spooled = self.spool.rounds()  # quotes may not all be in Postgres yet
+        await asyncio.to_thread(
+            self._ensure_partitions, spooled[0] if spooled else None
+        )
+        round_: int = now
+        sizes: Sequence[Tuple[Pair, Amounts]] = []
+        if not self.stopping.is_set():  # may be set while creating partitions
+            round_, sizes = self._plan(now)
+        self.last = {"round": round_, "start": time.time(), "quotes": 0}
+        if self.spool.round is not None:
+            self.state = "collecting"
+            self.pipeline = pipeline = QuotePipeline(
+                self.quoter,
+                self.spool,
+                self.dh,
+                flush_interval=self.flush_interval,
+                limiter=self.limiter,
+            )
+            try:
+                self.last["quotes"] = await pipeline.run(sizes, sessions)
+            finally:
+                self.last["pipeline"] = pipeline.stats()
+                self.pipeline = None
+            if self.stopping.is_set():
+                logger.info("Round %d interrupted, left in the spool.", round_)
+                self.spool.close()
+            else:
+                quotes = self.spool.quotes(round_)
+                self.spool.finish_round()
+                self.scheduler.record_quotes(quotes, round_)
+                self.scheduler.save(self.schedule_path)
+        self.state = "draining"
+        drained = await asyncio.to_thread(self.spool.drain, self.dh)
+        if not drained:
+            logger.warning("Quotes left in the spool for the next round.")
+        elif (sizes or spooled) and not self.stopping.is_set():
+            await asyncio.to_thread(self._after_round, min(spooled + [round_]))
+        self.last.update(end=time.time(), drained=drained)
+        return drained
+
+    async def _status(self, _request: web.Request) -> web.Response:
+        return web.json_response(self.status())
+
+    async def _health(self, _request: web.Request) -> web.Response:
+        healthy = self.healthy()
+        return web.json_response(
+            {"status": "ok" if healthy else "stale", "last_round": self.last},
+            status=200 if healthy else 503,
+        )
+
+    async def _serve(self, host: str, port: int) -> web.AppRunner:
+        """Serve `/health` and `/status` on `host`:`port`."""
+        app = web.Application()
+        app.router.add_get("/health", self._health)
+        app.router.add_get("/status", self._status)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def _wait(self, until: float) -> None:
+        """Sleep until `until` (a timestamp), or until stopped."""
+        try:
+            await asyncio.wait_for(self.stopping.wait(), max(0.0, until - time.time()))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, host: str = "0.0.0.0", port: int = 8081) -> None:
+        """Collect rounds on the grid until SIGTERM or SIGINT."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+        runner = await self._serve(host, port)
+        logger.info("Collector up, status on %s:%d.", host, port)
+        resume = self.spool.pending() is not None
+        self.spool.close()
+        tick = (
+            int(time.time())
+            if resume
+            else next_tick(time.time(), self.interval, self.offset)
+        )
+        try:
+            async with AsyncExitStack() as stack:
+                sessions = {
+                    chain: await stack.enter_async_context(quoter.client_session())
+                    for chain, quoter in self.quoter.quoters.items()
+                }
+                while not self.stopping.is_set():
+                    self.next_round = tick
+                    self.state = "idle"
+                    await self._wait(tick)
+                    if self.stopping.is_set():
+                        break
+                    try:
+                        if await self.collect(tick, sessions):
+                            self.last_success = time.time()
+                    except Exception as e:  # pylint: disable=broad-except
+                        logger.exception("Round %d failed: %s", tick, e)
+                        self.spool.close()
+                        self.last.update(end=time.time(), error=str(e))
+                    following = next_tick(time.time(), self.interval, self.offset)
+                    if following - tick > self.interval:
+                        skipped = (following - tick) // self.interval - 1
+                        logger.warning("Round overran, skipping %d ticks.", skipped)
+                    tick = following
+        finally:
+            self.state = "stopped"
+            await runner.cleanup()
+            self.quoter.close()
+        logger.info("Collector stopped.")
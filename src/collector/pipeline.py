@@ -0,0 +1,313 @@
+"""
+Provides the `QuotePipeline` class, which streams a round of
+quotes from the 1inch API into Postgres through bounded queues.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Sequence, Tuple
+import aiohttp
+import numpy as np
+from ..db.datahandler import DataHandler
+from ..logging import get_logger
+from ..network.multichain import MultiChainQuotes
+from ..network.oneinch import Amounts, QuoteResponse
+from ..network.ratelimit import AdaptiveRateLimiter, TokenBucket
+from ..network.sampling import Pair
+from .spool import QuoteSpool, quote_record, quotes_frame
+
+logger = get_logger(__name__)
+
+Sessions = Dict[str, aiohttp.ClientSession]
+
+
+@dataclass
+class StageStats:
+    """
+    Items through a stage of a :class:`QuotePipeline`, and the
+    latest `samples` durations of its steps (in seconds).
+    """
+
+    samples: int = 4096
+    items: int = 0
+    errors: int = 0
+    busy: float = 0.0
+    seconds: Deque[float] = field(default_factory=deque)
+
+    def __post_init__(self) -> None:
+        self.seconds = deque(maxlen=self.samples)
+
+    def record(self, seconds: float, items: int = 1) -> None:
+        """Record a step of `seconds` over `items` items."""
+        self.items += items
+        self.busy += seconds
+        self.seconds.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """Aggregate the samples, in seconds."""
+        if not self.seconds:
+            return {"items": self.items, "errors": self.errors}
+        seconds = np.array(self.seconds)
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "busy_total": self.busy,
+            "p50": float(np.percentile(seconds, 50)),
+            "p95": float(np.percentile(seconds, 95)),
+        }
+
+
+# pylint: disable=too-many-instance-attributes
+class QuotePipeline:
+    """
+    Streams a round of quotes through three concurrent stages,
+    connected by bounded queues:
+
+    - fetch: `workers` tasks take the (pair, trade size) slots of the
+      round in order, quote them under one rate limiter over all
+      chains and put the responses on the `fetched` queue. A pair's
+      quotes are fed back to the sampler once all its slots are tried.
+    - spool: appends each response to the open round of the
+      :class:`src.collector.spool.QuoteSpool` (in a thread, as it
+      fsyncs) and puts it on the `spooled` queue.
+    - write: inserts the spooled quotes into Postgres (in a thread)
+      in batches of up to `batch`, at least every `flush_interval`
+      seconds, so each pair is queryable through `/quotes` seconds
+      after it is fetched rather than at the end of the round. The
+      spool offset reached is recorded after each commit.
+
+    The queues hold at most `queue_size` responses each. When Postgres
+    is slower than the API the writer falls behind, the queues fill up
+    and the fetch workers wait, so memory stays bounded. Should an
+    insert fail (or the spool not be drained when the round starts),
+    the rest of the round is only spooled and left to
+    :func:`src.collector.spool.QuoteSpool.drain`.
+
+    :func:`stats` reports the depth of each queue, the items and step
+    latencies of each stage, and the lag from fetch to commit.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        quoter: MultiChainQuotes,
+        spool: QuoteSpool,
+        dh: DataHandler,
+        workers: int = 16,
+        queue_size: int = 256,
+        batch: int = 500,
+        flush_interval: float = 2.0,
+        limiter: TokenBucket | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        quoter : MultiChainQuotes
+            Quotes the pairs of every chain.
+        spool : QuoteSpool
+            Write-ahead log of the round, which must be open (see
+            :func:`QuoteSpool.start_round` and :func:`QuoteSpool.pending`).
+        dh : DataHandler
+            Inserts the quotes.
+        workers : int, default=16
+            Concurrent requests. Pacing is left to `limiter`.
+        queue_size : int, default=256
+            Capacity of each queue between stages.
+        batch : int, default=500
+            Maximum quotes per insert.
+        flush_interval : float, default=2.0
+            Maximum seconds a quote waits for its batch to fill.
+        limiter : TokenBucket | None, default=None
+            Paces requests over all chains. Defaults to an
+            :class:`AdaptiveRateLimiter` over the rate of `quoter`.
+        """
+        self.quoter = quoter
+        self.spool = spool
+        self.dh = dh
+        self.workers = workers
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.limiter = limiter or AdaptiveRateLimiter(
+            quoter.rate_limit, max_rate=quoter.max_rate_limit
+        )
+        self.slots: asyncio.Queue = asyncio.Queue()
+        self.fetched: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.spooled: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stages = {name: StageStats() for name in ["fetch", "spool", "write"]}
+        self.lag = StageStats()  # from fetch to commit, per quote
+        self.behind = False  # whether the spool must be drained after the round
+        self.stopped = False
+        self._remaining: Dict[Pair, int] = {}
+        self._responses: Dict[Pair, List[QuoteResponse]] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depths, per-stage throughput and latencies, and lag."""
+        return {
+            "queues": {
+                "slots": self.slots.qsize(),
+                "fetched": self.fetched.qsize(),
+                "spooled": self.spooled.qsize(),
+                "capacity": self.fetched.maxsize,
+            },
+            **{name: stats.summary() for name, stats in self.stages.items()},
+            "lag": self.lag.summary(),
+            "behind": self.behind,
+        }
+
+    def stop(self) -> None:
+        """
+        Request no more quotes. Those in flight are still spooled and
+        inserted, and :func:`run` returns once they are; the slots left
+        are quoted when the round is resumed.
+        """
+        self.stopped = True
+        while not self.slots.empty():
+            self.slots.get_nowait()
+
+    async def run(
+        self, sizes: Sequence[Tuple[Pair, Amounts]], sessions: Sessions | None = None
+    ) -> int:
+        """
+        Quote the (pair, trade sizes in base units) of `sizes` into
+        the open round of the spool and Postgres. `sessions` are the
+        HTTP sessions of each chain, opened for the round if not
+        given. Returns the number of quotes fetched.
+        """
+        if self.spool.round is None:
+            raise RuntimeError("No round is open.")
+        # Offsets are only advanced past quotes known to be in Postgres.
+        self.behind = not await asyncio.to_thread(self.spool.drain, self.dh)
+        for pair, amounts in sizes:
+            if self.stopped:  # while draining
+                break
+            self._remaining[pair] = len(amounts)
+            self._responses[pair] = []
+            for amount in amounts:
+                self.slots.put_nowait((pair, int(amount)))
+        async with AsyncExitStack() as stack:
+            if sessions is None:
+                sessions = {
+                    chain: await stack.enter_async_context(quoter.client_session())
+                    for chain, quoter in self.quoter.quoters.items()
+                }
+            fetchers = [
+                asyncio.create_task(self._fetch(sessions))
+                for _ in range(min(self.workers, self.slots.qsize()))
+            ]
+            tasks = fetchers + [
+                asyncio.create_task(self._spool()),
+                asyncio.create_task(self._write()),
+            ]
+            try:
+                await asyncio.gather(*fetchers)
+                await self.fetched.put(None)
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+        logger.info("Pipeline: %s", self.stats())
+        return self.stages["fetch"].items
+
+    async def _fetch(self, sessions: Sessions) -> None:
+        """Fetch stage: quote slots until there are none left."""
+        while not self.slots.empty():
+            pair, amount = self.slots.get_nowait()
+            chain = self.quoter.chain(pair)
+            quoter = self.quoter.quoters[chain]
+            start = time.perf_counter()
+            try:
+                res = await quoter.quote_async(
+                    sessions[chain],
+                    self.limiter,
+                    quoter.config[pair[0]].address,
+                    quoter.config[pair[1]].address,
+                    amount,
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                # A failed request, after retries, or a malformed response.
+                logger.warning("Skipping %s quote for %d: %r", pair, amount, e)
+                self.stages["fetch"].errors += 1
+            else:
+                fetched_at = time.perf_counter()
+                self.stages["fetch"].record(fetched_at - start)
+                self._responses[pair].append(res)
+                await self.fetched.put((pair, res, fetched_at))
+            self._remaining[pair] -= 1
+            if not self._remaining[pair]:
+                quoter.observe(pair, self._responses.pop(pair))
+                logger.info("Fetched: %s... %d left", pair, self.slots.qsize())
+
+    async def _spool(self) -> None:
+        """Spool stage: log each response before it is inserted."""
+        while (item := await self.fetched.get()) is not None:
+            pair, res, fetched_at = item
+            start = time.perf_counter()
+            offset = await asyncio.to_thread(self.spool.append, pair, res)
+            self.stages["spool"].record(time.perf_counter() - start)
+            await self.spooled.put((quote_record(pair, res), offset, fetched_at))
+        await self.spooled.put(None)
+
+    async def _write(self) -> None:
+        """Write stage: insert spooled quotes in batches."""
+        records: List[dict] = []
+        fetched: List[float] = []
+        offset = 0
+        deadline = 0.0
+        getter: asyncio.Task | None = None
+        closing = False
+        try:
+            while not closing:
+                if getter is None:
+                    getter = asyncio.ensure_future(self.spooled.get())
+                timeout = max(0.0, deadline - time.perf_counter()) if records else None
+                # The pending get is kept across timeouts, so no item is lost.
+                done, _ = await asyncio.wait({getter}, timeout=timeout)
+                if done:
+                    item = getter.result()
+                    getter = None
+                    if item is None:
+                        closing = True
+                    else:
+                        if not records:
+                            deadline = time.perf_counter() + self.flush_interval
+                        record, offset, fetched_at = item
+                        records.append(record)
+                        fetched.append(fetched_at)
+                if records and (
+                    closing
+                    or len(records) >= self.batch
+                    or time.perf_counter() >= deadline
+                ):
+                    await self._insert(records, offset, fetched)
+                    records, fetched = [], []
+        finally:
+            if getter is not None:
+                getter.cancel()
+
+    async def _insert(
+        self, records: List[dict], offset: int, fetched: List[float]
+    ) -> None:
+        """
+        Insert a batch ending at spool `offset`, and mark it drained.
+        Once behind, batches are not inserted: they are drained later,
+        oldest first, so quotes never reach Postgres out of order and
+        a dead database does not stall the round.
+        """
+        if self.behind:
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.dh.insert_quotes, quotes_frame(records))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Could not insert, leaving quotes in the spool: %s", e)
+            self.behind = True
+            self.stages["write"].errors += len(records)
+            return
+        committed = time.perf_counter()
+        self.stages["write"].record(committed - start, len(records))
+        for fetched_at in fetched:
+            self.lag.record(committed - fetched_at)
+        if self.spool.round is not None:
+            await asyncio.to_thread(self.spool.mark_drained, self.spool.round, offset)
@@ -0,0 +1,274 @@
+"""
+Provides the `QuoteSpool` class, a local write-ahead log of the
+quotes of each collection round, drained to Postgres in batches.
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
+import pandas as pd
+from ..configs import ALL_TOKEN_DTOs
+from ..db.datahandler import DataHandler
+from ..logging import get_logger
+from ..network.oneinch import Amounts, QuoteResponse, dumps_column
+from ..network.sampling import Pair
+
+logger = get_logger(__name__)
+
+SUFFIX = ".ndjson"
+
+QUOTE_FIELDS = [
+    "src",
+    "dst",
+    "in_amount",
+    "out_amount",
+    "gas",
+    "price",
+    "protocols",
+    "timestamp",
+]
+
+
+def quote_record(pair: Pair, res: QuoteResponse) -> Dict[str, Any]:
+    """Spool record of a quote of `pair`."""
+    return {
+        "type": "quote",
+        "src": pair[0],
+        "dst": pair[1],
+        "in_amount": res.in_amount,
+        "out_amount": res.out_amount,
+        "gas": res.gas,
+        "price": res.price,
+        "protocols": res.protocols,
+        "timestamp": res.timestamp,
+    }
+
+
+def quotes_frame(records: List[dict]) -> pd.DataFrame:
+    """Quote `records` in the layout of `OneInchQuotes.to_df`."""
+    df = pd.DataFrame.from_records(records, columns=QUOTE_FIELDS)
+    df["protocols"] = dumps_column(df["protocols"].tolist())
+    df["chain_id"] = [ALL_TOKEN_DTOs[src].chain_id for src in df["src"]]
+    return df
+
+
+class QuoteSpool:
+    """
+    Append-only NDJSON files in `directory`, one per round, named
+    after the round's timestamp.
+
+    A round starts with a `plan` record holding the trade sizes of
+    each pair (its slots), followed by a `quote` record per response,
+    appended (and fsync'd) as it arrives, and a `done` record once
+    every slot was tried. Nothing is lost if the collector or
+    Postgres goes down mid-round: :func:`pending` returns the slots
+    of an unfinished round still without a quote, so a restarted
+    collector only quotes those, and quotes stay in the spool until
+    drained.
+
+    :func:`drain` inserts the quotes not yet in Postgres, `batch` at
+    a time, and records the byte offset reached in `drained.json`
+    after each commit. A crash between the two replays the batch,
+    whose quotes the unique index on `quotes` skips. Rounds that are
+    done and fully drained are deleted.
+    """
+
+    def __init__(self, directory: str, fsync: bool = True) -> None:
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory of the spool files, created if needed.
+        fsync : bool, default=True
+            Whether to fsync each record, so it survives a crash of the
+            machine and not only of the collector.
+        """
+        self.directory = directory
+        self.fsync = fsync
+        self.state_path = os.path.join(directory, "drained.json")
+        self.round: int | None = None
+        self._file: TextIO | None = None
+        self._size = 0  # of the open round, in bytes
+        os.makedirs(directory, exist_ok=True)
+        self.offsets = self._load_offsets()
+
+    def _path(self, round_: int) -> str:
+        return os.path.join(self.directory, f"{round_}{SUFFIX}")
+
+    def rounds(self) -> List[int]:
+        """Timestamps of the rounds in the spool, oldest first."""
+        return sorted(
+            int(name[: -len(SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SUFFIX)
+        )
+
+    def _records(self, round_: int, offset: int = 0) -> Iterator[Tuple[int, dict]]:
+        """
+        Complete records of `round_` from byte `offset`, each with the
+        offset right after it. A torn last line is left out.
+        """
+        with open(self._path(round_), "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                yield offset, json.loads(line)
+
+    def _write(self, record: Dict[str, Any]) -> int:
+        """Append `record` to the open round. Returns the offset after it."""
+        if self._file is None:
+            raise RuntimeError("No round is open.")
+        line = json.dumps(record) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._size += len(line.encode())
+        return self._size
+
+    # pylint: disable=consider-using-with
+    def _open(self, round_: int) -> None:
+        """Open `round_` for appending, cutting off a torn last line."""
+        self.close()
+        path = self._path(round_)
+        if os.path.exists(path):
+            with open(path, "rb+") as f:
+                f.truncate(f.read().rfind(b"\n") + 1)
+        self._file = open(
+            path, "a", encoding="utf-8"
+        )  # pylint: disable=consider-using-with
+        self._size = os.path.getsize(path)
+        self.round = round_
+
+    def close(self) -> None:
+        """Close the open round, if any."""
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self.round = None
+
+    def pending(self) -> Tuple[int, List[Tuple[Pair, List[int]]]] | None:
+        """
+        The latest round if it is unfinished: its timestamp and the
+        trade sizes of each pair that have no quote yet. The round is
+        reopened, so the missing quotes are appended to it.
+        """
+        rounds = self.rounds()
+        if not rounds:
+            return None
+        slots: Dict[Pair, List[int]] = {}
+        for _, record in self._records(rounds[-1]):
+            if record["type"] == "plan":
+                slots = {(src, dst): amounts for src, dst, amounts in record["sizes"]}
+            elif record["type"] == "quote":
+                amounts = slots.get((record["src"], record["dst"]), [])
+                if record["in_amount"] in amounts:
+                    amounts.remove(record["in_amount"])
+            elif record["type"] == "done":
+                return None
+        self._open(rounds[-1])
+        return rounds[-1], [
+            (pair, amounts) for pair, amounts in slots.items() if amounts
+        ]
+
+    def start_round(self, round_: int, sizes: List[Tuple[Pair, Amounts]]) -> None:
+        """Open a new round at `round_` and log its trade sizes per pair."""
+        self._open(round_)
+        self._write(
+            {
+                "type": "plan",
+                "sizes": [
+                    [src, dst, [int(amount) for amount in amounts]]
+                    for (src, dst), amounts in sizes
+                ],
+            }
+        )
+
+    def append(self, pair: Pair, res: QuoteResponse) -> int:
+        """
+        Log a quote of `pair` in the open round. Can be passed as the
+        `on_quote` callback of :class:`src.network.oneinch.OneInchQuotes`.
+        Returns the offset right after it, see :func:`mark_drained`.
+        """
+        return self._write(quote_record(pair, res))
+
+    def finish_round(self) -> None:
+        """Mark the open round as done and close it."""
+        self._write({"type": "done"})
+        self.close()
+
+    def quotes(self, round_: int) -> pd.DataFrame:
+        """All quotes of `round_` in the spool."""
+        return quotes_frame(
+            [r for _, r in self._records(round_) if r["type"] == "quote"]
+        )
+
+    def _load_offsets(self) -> Dict[str, int]:
+        """Byte offset drained so far in each round."""
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_offsets(self) -> None:
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.offsets, f)
+        os.replace(tmp, self.state_path)
+
+    def mark_drained(self, round_: int, offset: int) -> None:
+        """
+        Record that the quotes of `round_` up to byte `offset` were
+        inserted by the caller, e.g. by
+        :class:`src.collector.pipeline.QuotePipeline`.
+        """
+        key = str(round_)
+        self.offsets[key] = max(self.offsets.get(key, 0), offset)
+        self._save_offsets()
+
+    @staticmethod
+    def _insert(dh: DataHandler, records: List[dict]) -> bool:
+        """Insert quote `records`. Returns False if Postgres failed."""
+        try:
+            dh.insert_quotes(quotes_frame(records))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Could not drain %d quotes: %s", len(records), e)
+            return False
+        return True
+
+    def drain(self, dh: DataHandler, batch: int = 1000) -> bool:
+        """
+        Insert the quotes not yet drained into Postgres, `batch` at a
+        time. Returns whether the spool is fully drained: if Postgres
+        is unavailable, the quotes are kept for the next drain.
+
+        Rounds that are done (or were abandoned for a later round)
+        are deleted once drained.
+        """
+        rounds = self.rounds()
+        for round_ in rounds:
+            key = str(round_)
+            offset = self.offsets.get(key, 0)
+            rows: List[dict] = []
+            done = round_ < rounds[-1]
+            for end, record in self._records(round_, offset):
+                if record["type"] == "quote":
+                    rows.append(record)
+                done = done or record["type"] == "done"
+                offset = end
+                if len(rows) >= batch:
+                    if not self._insert(dh, rows):
+                        return False
+                    rows = []
+                    self.offsets[key] = offset
+                    self._save_offsets()
+            if rows and not self._insert(dh, rows):
+                return False
+            if done and round_ != self.round:
+                os.remove(self._path(round_))
+                self.offsets.pop(key, None)
+            else:
+                self.offsets[key] = offset
+            self._save_offsets()
+        return True
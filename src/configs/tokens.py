@@ -3,11 +3,20 @@ Token DTOs for convenient access to token info.
 Adding a new token:
 1. Add the address to the addresses section.
 2. Add the DTO to the DTOs section.
-3. Add the DTO to the DTOs dict.
+3. Add the DTO to the DTOs dict of its chain.
 4. Add the Coingecko ID to the COINGECKO_IDS dict.
+
+Tokens are identified by address alone, so addresses must
+be unique across chains.
 """
+from typing import Dict
 from ..data_transfer_objects import TokenDTO
 
+# Chain ids, as in `src.network.oneinch.OneInchQuotes.chains`
+ETHEREUM = 1
+OPTIMISM = 10
+ARBITRUM = 42161
+
 # Addresses
 USDC = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
 USDT = "0xdac17f958d2ee523a2206206994597c13d831ec7"
@@ -132,3 +141,106 @@ TOKEN_DTOs = {
     WBTC: WBTX_DTO,
     TBTC: TBTC_DTO,
 }
+
+# Arbitrum
+ARB_USDC = "0xaf88d065e77c8cc2239327c5edb3a432268e5831"
+ARB_USDT = "0xfd086bc7cd5c481dcc9c85ebe478a1c0b69fcbb9"
+ARB_WETH = "0x82af49447d8a07e3bd95bd0d56f35241523fbab1"
+ARB_WBTC = "0x2f2a2543b76a4166549f7aab2e75bef0aefc5b0f"
+
+ARB_TOKEN_DTOs = {
+    ARB_USDC: TokenDTO(
+        address=ARB_USDC,
+        name="USD Coin",
+        symbol="USDC",
+        decimals=6,
+        min_trade_size=1e3,
+        max_trade_size=1e7,
+        chain_id=ARBITRUM,
+    ),
+    ARB_USDT: TokenDTO(
+        address=ARB_USDT,
+        name="Tether USD",
+        symbol="USDT",
+        decimals=6,
+        min_trade_size=1e3,
+        max_trade_size=1e7,
+        chain_id=ARBITRUM,
+    ),
+    ARB_WETH: TokenDTO(
+        address=ARB_WETH,
+        name="Wrapped Ether",
+        symbol="WETH",
+        decimals=18,
+        min_trade_size=0.5,
+        max_trade_size=5000,
+        chain_id=ARBITRUM,
+    ),
+    ARB_WBTC: TokenDTO(
+        address=ARB_WBTC,
+        name="Wrapped BTC",
+        symbol="WBTC",
+        decimals=8,
+        min_trade_size=0.03,
+        max_trade_size=300,
+        chain_id=ARBITRUM,
+    ),
+}
+
+# Optimism
+OP_USDC = "0x0b2c639c533813f4aa9d7837caf62653d097ff85"
+OP_USDT = "0x94b008aa00579c1307b0ef2c499ad98a8ce58e58"
+OP_WETH = "0x4200000000000000000000000000000000000006"
+OP_WBTC = "0x68f180fcce6836688e9084f035309e29bf0a2095"
+
+OP_TOKEN_DTOs = {
+    OP_USDC: TokenDTO(
+        address=OP_USDC,
+        name="USD Coin",
+        symbol="USDC",
+        decimals=6,
+        min_trade_size=1e3,
+        max_trade_size=1e7,
+        chain_id=OPTIMISM,
+    ),
+    OP_USDT: TokenDTO(
+        address=OP_USDT,
+        name="Tether USD",
+        symbol="USDT",
+        decimals=6,
+        min_trade_size=1e3,
+        max_trade_size=1e7,
+        chain_id=OPTIMISM,
+    ),
+    OP_WETH: TokenDTO(
+        address=OP_WETH,
+        name="Wrapped Ether",
+        symbol="WETH",
+        decimals=18,
+        min_trade_size=0.5,
+        max_trade_size=5000,
+        chain_id=OPTIMISM,
+    ),
+    OP_WBTC: TokenDTO(
+        address=OP_WBTC,
+        name="Wrapped BTC",
+        symbol="WBTC",
+        decimals=8,
+        min_trade_size=0.03,
+        max_trade_size=300,
+        chain_id=OPTIMISM,
+    ),
+}
+
+# Tokens quoted on each chain, by chain id
+CHAIN_TOKEN_DTOs: Dict[int, Dict[str, TokenDTO]] = {
+    ETHEREUM: TOKEN_DTOs,
+    ARBITRUM: ARB_TOKEN_DTOs,
+    OPTIMISM: OP_TOKEN_DTOs,
+}
+
+ALL_TOKEN_DTOs = {k: v for dtos in CHAIN_TOKEN_DTOs.values() for k, v in dtos.items()}
+assert len(ALL_TOKEN_DTOs) == sum(map(len, CHAIN_TOKEN_DTOs.values()))
+
+# USDC of each chain, to price notionals in USD
+USD_TOKENS = {ETHEREUM: USDC, ARBITRUM: ARB_USDC, OPTIMISM: OP_USDC}
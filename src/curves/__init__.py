@@ -0,0 +1,17 @@
+"""Package for fitting and evaluating price impact curves."""
+from .powerlaw import CURVE_COLS, DAY, HOUR, evaluate_power_law, fit_power_law
+from .slippage import SlippageIndex
+from .windows import NOTIONALS, WINDOW_COLS, WINDOWS, WindowedStats
+
+__all__ = [
+    "CURVE_COLS",
+    "DAY",
+    "HOUR",
+    "NOTIONALS",
+    "SlippageIndex",
+    "WINDOW_COLS",
+    "WINDOWS",
+    "WindowedStats",
+    "evaluate_power_law",
+    "fit_power_law",
+]
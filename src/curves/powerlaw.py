@@ -0,0 +1,130 @@
+"""
+Provides vectorized fitting of power-law price impact curves,
+one per (pair, period), across all pairs at once.
+"""
+import numpy as np
+import pandas as pd
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+CURVE_COLS = [
+    "period",
+    "start",
+    "n_quotes",
+    "intercept",
+    "slope",
+    "r2",
+    "min_amount",
+    "max_amount",
+]
+
+
+# pylint: disable=too-many-locals
+def fit_power_law(
+    quotes: pd.DataFrame, period: int = HOUR, min_quotes: int = 3
+) -> pd.DataFrame:
+    """
+    Fit `price_impact = exp(intercept) * in_amount ** slope` for
+    each pair and each `period` (in seconds) of quotes.
+
+    The fit is least squares in log-log space. The sums it needs are
+    accumulated for every group at once with `np.bincount`, so the cost
+    is a few passes over the quotes whatever the number of groups.
+    Quotes without a positive price impact (the reference quote of
+    each round) or amount are skipped.
+
+    Parameters
+    ----------
+    quotes : pd.DataFrame
+        Processed quotes indexed by (src, dst), with the `in_amount`,
+        `price_impact` and `timestamp` columns, as returned by
+        :func:`src.db.datahandler.DataHandler.get_quotes` with
+        `process=True`.
+    period : int, default=3600
+        Length of the fitting windows, aligned to the epoch.
+    min_quotes : int, default=3
+        Groups with fewer usable quotes are not fitted.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per fitted (src, dst, start), indexed by (src, dst),
+        with the columns of `CURVE_COLS`. `min_amount` and
+        `max_amount` bound the trade sizes the curve was fitted on.
+    """
+    if quotes.empty:
+        return pd.DataFrame(
+            columns=CURVE_COLS,
+            index=pd.MultiIndex.from_arrays([[], []], names=["src", "dst"]),
+        )
+    amount = quotes["in_amount"].to_numpy(dtype=np.float64)
+    impact = quotes["price_impact"].to_numpy(dtype=np.float64)
+    keep = (amount > 0) & (impact > 0)
+
+    # Reuse the integer codes of the (src, dst) index.
+    pairs = quotes.index
+    if not isinstance(pairs, pd.MultiIndex):
+        pairs = pd.MultiIndex.from_frame(quotes[["src", "dst"]])
+    src, dst = pairs.codes[0][keep], pairs.codes[1][keep]
+    src_tokens, dst_tokens = pairs.levels[0], pairs.levels[1]
+    start = quotes["timestamp"].to_numpy(dtype=np.int64)[keep] // period * period
+    group, starts = pd.factorize(
+        (src.astype(np.int64) * len(dst_tokens) + dst) * (2**32) + start // period,
+        sort=True,
+    )
+    x = np.log(amount[keep])
+    y = np.log(impact[keep])
+    n_groups = len(starts)
+
+    def total(weights: np.ndarray | None = None) -> np.ndarray:
+        return np.bincount(group, weights=weights, minlength=n_groups)
+
+    n = total()
+    # Center on the group means so the sums of squares stay well-conditioned.
+    mean_x = total(x) / n
+    mean_y = total(y) / n
+    dx = x - mean_x[group]
+    dy = y - mean_y[group]
+    sxx = total(dx * dx)
+    sxy = total(dx * dy)
+    syy = total(dy * dy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = sxy / sxx
+        r2 = sxy * sxy / (sxx * syy)
+    intercept = mean_y - slope * mean_x
+
+    order = np.argsort(group, kind="stable")
+    bounds = np.flatnonzero(np.diff(group[order], prepend=-1))
+    first = order[bounds]
+    min_amount = np.minimum.reduceat(amount[keep][order], bounds)
+    max_amount = np.maximum.reduceat(amount[keep][order], bounds)
+
+    fitted = (n >= min_quotes) & np.isfinite(slope)
+    index = pd.MultiIndex.from_arrays(
+        [src_tokens[src[first]][fitted], dst_tokens[dst[first]][fitted]],
+        names=["src", "dst"],
+    )
+    return pd.DataFrame(
+        {
+            "period": period,
+            "start": start[first][fitted],
+            "n_quotes": n[fitted].astype(np.int64),
+            "intercept": intercept[fitted],
+            "slope": slope[fitted],
+            "r2": r2[fitted],
+            "min_amount": min_amount[fitted],
+            "max_amount": max_amount[fitted],
+        },
+        index=index,
+    )
+
+
+def evaluate_power_law(
+    intercept: np.ndarray, slope: np.ndarray, in_amount: np.ndarray
+) -> np.ndarray:
+    """
+    Price impact of trades of `in_amount` (in the src token's base
+    units) on fitted curves. Arguments broadcast against each other.
+    """
+    return np.exp(intercept + slope * np.log(in_amount))
@@ -0,0 +1,163 @@
+"""
+Provides the `WindowedStats` class, which keeps rolling
+statistics of price impact per pair, updated round by round.
+"""
+import json
+import os
+import warnings
+from bisect import bisect_left
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from .powerlaw import DAY, HOUR
+
+WINDOWS = {"1h": HOUR, "24h": DAY, "7d": 7 * DAY, "30d": 30 * DAY}
+
+# Trade sizes, in USD, at which price impact is tracked.
+NOTIONALS = (10_000, 100_000, 1_000_000)
+
+WINDOW_COLS = ["window", "notional", "n_rounds", "median", "p90"]
+
+
+class WindowedStats:
+    """
+    Rolling windows of the price impact of each pair at fixed USD
+    notional sizes, one value per round (hour).
+
+    Each pair keeps the impacts of its rounds over the longest
+    window, sorted by hour. :func:`add` inserts one round and drops
+    the rounds that fell out of the longest window, so an update
+    costs O(new round) whatever the history. :func:`stats` computes
+    the median and 90th percentile of each window from at most
+    `max(windows) / 3600` rounds per pair, and is cached until the
+    next update.
+
+    Windows end at the latest round added (inclusive): the `1h`
+    window is the latest round alone.
+    """
+
+    def __init__(
+        self,
+        notionals: Sequence[int] = NOTIONALS,
+        windows: Dict[str, int] | None = None,
+    ) -> None:
+        self.notionals = tuple(notionals)
+        self.windows = dict(windows or WINDOWS)
+        self.span = max(self.windows.values())
+        self.last_hour: int | None = None
+        # (src, dst) -> (sorted hours, impacts at `notionals` per hour)
+        self.rounds: Dict[Tuple[str, str], Tuple[List[int], List[List[float]]]] = {}
+        self._stats: pd.DataFrame | None = None
+
+    def __len__(self) -> int:
+        return sum(len(hours) for hours, _ in self.rounds.values())
+
+    def add(self, src: str, dst: str, hour: int, impacts: Sequence[float]) -> None:
+        """
+        Add (or replace) the round of (src, dst) starting at `hour`,
+        with its price impact at each of `notionals` (NaN if unknown).
+        """
+        hours, values = self.rounds.setdefault((src, dst), ([], []))
+        i = bisect_left(hours, hour)
+        if i < len(hours) and hours[i] == hour:
+            values[i] = list(impacts)
+        else:
+            hours.insert(i, hour)
+            values.insert(i, list(impacts))
+        if self.last_hour is None or hour > self.last_hour:
+            self.last_hour = hour
+        expired = bisect_left(hours, self.last_hour - self.span + HOUR)
+        del hours[:expired], values[:expired]
+        if not hours:  # the round was already out of every window
+            del self.rounds[(src, dst)]
+        self._stats = None
+
+    def stats(self, tokens: List[str] | None = None) -> pd.DataFrame:
+        """
+        Median and 90th percentile of the price impact at each
+        notional over each window, for the pairs between `tokens`
+        (all pairs if None). Indexed by (src, dst), with the
+        columns of `WINDOW_COLS`. Windows without any round
+        are omitted.
+        """
+        if self._stats is None:
+            self._stats = self._compute()
+        stats = self._stats
+        if not tokens:
+            return stats
+        src = stats.index.get_level_values("src")
+        dst = stats.index.get_level_values("dst")
+        return stats.loc[src.isin(tokens) & dst.isin(tokens)]
+
+    def _compute(self) -> pd.DataFrame:
+        rows: List[Tuple[Any, ...]] = []
+        for pair, (hours, values) in sorted(self.rounds.items()):
+            hours_arr = np.asarray(hours)
+            impacts = np.asarray(values, dtype=np.float64).reshape(len(hours), -1)
+            for window, length in self.windows.items():
+                recent = impacts[hours_arr > (self.last_hour or 0) - length]
+                counts = np.count_nonzero(~np.isnan(recent), axis=0)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    median = np.nanmedian(recent, axis=0)
+                    p90 = np.nanpercentile(recent, 90, axis=0)
+                for j, notional in enumerate(self.notionals):
+                    if not counts[j]:
+                        continue
+                    rows.append((*pair, window, notional, counts[j], median[j], p90[j]))
+        return pd.DataFrame(rows, columns=["src", "dst", *WINDOW_COLS]).set_index(
+            ["src", "dst"]
+        )
+
+    def save(self, path: str) -> None:
+        """Checkpoint the rounds to `path` as JSON, atomically."""
+        state = {
+            "notionals": list(self.notionals),
+            "windows": self.windows,
+            "last_hour": self.last_hour,
+            "rounds": [
+                {
+                    "src": src,
+                    "dst": dst,
+                    "hours": hours,
+                    "impacts": [
+                        [None if np.isnan(v) else v for v in row] for row in values
+                    ],
+                }
+                for (src, dst), (hours, values) in self.rounds.items()
+            ],
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        notionals: Sequence[int] = NOTIONALS,
+        windows: Dict[str, int] | None = None,
+    ) -> "WindowedStats":
+        """
+        Restore a checkpoint written by :func:`save`. Returns empty
+        stats if there is none, or if it was taken with other
+        `notionals` or `windows`.
+        """
+        stats = cls(notionals, windows)
+        if not os.path.exists(path):
+            return stats
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state["notionals"] != list(stats.notionals) or (
+            state["windows"] != stats.windows
+        ):
+            return stats
+        stats.last_hour = state["last_hour"]
+        for pair in state["rounds"]:
+            stats.rounds[(pair["src"], pair["dst"])] = (
+                pair["hours"],
+                [[np.nan if v is None else v for v in row] for row in pair["impacts"]],
+            )
+        return stats
@@ -9,10 +9,12 @@ class TokenDTO:
     token data.
     """
 
-    # TODO DTO min/max trade sizes should be dynamic
     address: str
     name: str
     symbol: str
     decimals: int
-    min_trade_size: float  # min amt_in for 1inch quotes
-    max_trade_size: float  # max amt_in for 1inch quotes
+    # Initial bounds of amt_in for 1inch quotes. They then follow the
+    # observed liquidity, see `src.network.sampling.AdaptiveSampler`.
+    min_trade_size: float
+    max_trade_size: float
+    chain_id: int = 1  # Ethereum mainnet
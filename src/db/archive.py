@@ -0,0 +1,276 @@
+"""
+Provides a `QuoteArchive` class that mirrors the quotes table
+into a local Parquet dataset, for backtests and notebooks that
+read months of quotes at a time.
+"""
+import json
+import os
+import time
+from itertools import product
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import func, select, tuple_
+from .datahandler import DEFAULT_QUOTE_COLS, DataHandler
+from .models import Quote
+from ..curves import DAY, HOUR
+from ..logging import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("in_amount", pa.decimal128(38, 0)),
+        ("out_amount", pa.decimal128(38, 0)),
+        ("gas", pa.int64()),
+        ("price", pa.float64()),
+        ("route_id", pa.int64()),
+        ("chain_id", pa.int32()),
+        ("timestamp", pa.int64()),
+    ]
+)
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("src", pa.string()), ("dst", pa.string()), ("day", pa.int32())]),
+    flavor="hive",
+)
+
+
+def day_key(timestamp: Any) -> Any:
+    """UTC day of `timestamp` (scalar or array) as a `YYYYMMDD` integer."""
+    days = (np.asarray(timestamp, dtype=np.int64) // DAY).astype("datetime64[D]")
+    dates = np.datetime_as_string(days)
+    return np.char.replace(dates, "-", "").astype(np.int32)
+
+
+def _num_rows(path: str) -> int:
+    """
+    Number of quotes in the file at `path`, from its footer, or -1
+    if it was written with other columns than `ARCHIVE_SCHEMA`.
+    """
+    if not os.path.exists(path):
+        return 0
+    metadata = pq.read_metadata(path)
+    if metadata.schema.names != ARCHIVE_SCHEMA.names:
+        return -1
+    return metadata.num_rows
+
+
+class QuoteArchive:
+    """
+    A Parquet dataset of quotes under `root`, hive-partitioned as
+    `src=<address>/dst=<address>/day=<YYYYMMDD>/quotes.parquet`.
+
+    Each file holds one day of one pair, sorted by timestamp, so a
+    read only opens the files of the requested pairs and days, and
+    row groups are pruned on `timestamp`. :func:`sync` archives the
+    hours closed since the last sync, tracked in `root/_state.json`,
+    and rewrites the recent files missing quotes inserted late.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.state_path = os.path.join(root, "_state.json")
+
+    def state(self) -> Dict[str, int]:
+        """Sync state: the end of the last hour archived."""
+        if not os.path.exists(self.state_path):
+            return {"synced_until": 0}
+        with open(self.state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, state: Dict[str, int]) -> None:
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _path(self, src: str, dst: str, day: int) -> str:
+        return os.path.join(
+            self.root, f"src={src}", f"dst={dst}", f"day={day}", "quotes.parquet"
+        )
+
+    def sync(
+        self, datahandler: DataHandler, lag: int = 600, recheck: int = 7 * DAY
+    ) -> int:
+        """
+        Archive the hours that closed at least `lag` seconds ago, so
+        the collector is done inserting their quotes.
+
+        Quotes are not archived by id: ids are drawn from a sequence
+        on insert, so a quote can commit after quotes with larger
+        ids. Instead, each (pair, day) file since the last sync, or
+        in the last `recheck` seconds, whose row count differs from
+        Postgres is rewritten from it. This picks up both the new
+        hours and late quotes (e.g. replayed from the collector's
+        spool). Quotes inserted
+        later than that into older days are not archived.
+        Returns the number of quotes written.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        state = self.state()
+        synced = state.get("synced_until", 0)
+        cutoff = int(time.time() - lag) // HOUR * HOUR
+        start = max(min(synced, cutoff - recheck), 0) // DAY * DAY
+        stale = self._stale(datahandler, start, cutoff)
+        n_quotes = 0
+        for day in sorted(stale):
+            end = min(day * DAY + DAY, cutoff)
+            n_quotes += self._export(datahandler, day * DAY, end, stale[day])
+            state["synced_until"] = max(synced, end)
+            self._save_state(state)
+        state["synced_until"] = max(synced, cutoff)
+        self._save_state(state)
+        datahandler.session.commit()  # close the read transaction
+        logger.info(
+            "Archived %d quotes in %d files, up to %d.",
+            n_quotes,
+            sum(map(len, stale.values())),
+            state["synced_until"],
+        )
+        return n_quotes
+
+    # pylint: disable=not-callable
+    def _stale(
+        self, datahandler: DataHandler, start: int, end: int
+    ) -> Dict[int, List[Tuple[str, str]]]:
+        """
+        Pairs whose file does not hold their quotes in [start, end),
+        per day since epoch. Files of pairs with no quotes left in
+        Postgres are removed.
+        """
+        epoch_day = Quote.timestamp // DAY
+        query = (
+            select(Quote.src, Quote.dst, epoch_day, func.count())
+            .where(Quote.timestamp >= start, Quote.timestamp < end)
+            .group_by(Quote.src, Quote.dst, epoch_day)
+        )
+        stale: Dict[int, List[Tuple[str, str]]] = {}
+        keep = set()
+        for src, dst, day, count in datahandler.session.execute(query):
+            path = self._path(src, dst, day_key(day * DAY))
+            if count != _num_rows(path):
+                stale.setdefault(day, []).append((src, dst))
+            keep.add(path)
+        for path in self._files(None, start, end):
+            if path not in keep:  # its quotes were deleted from Postgres
+                os.remove(path)
+        return stale
+
+    def _export(
+        self,
+        datahandler: DataHandler,
+        start: int,
+        end: int,
+        pairs: List[Tuple[str, str]],
+    ) -> int:
+        """Rewrite the files of `pairs` on the day of [start, end)."""
+        query = (
+            select(
+                Quote.src,
+                Quote.dst,
+                *[getattr(Quote, c) for c in ARCHIVE_SCHEMA.names],
+            )
+            .where(
+                Quote.timestamp >= start,
+                Quote.timestamp < end,
+                tuple_(Quote.src, Quote.dst).in_(pairs),
+            )
+            .order_by(Quote.src, Quote.dst, Quote.timestamp, Quote.id)
+        )
+        result = datahandler.session.execute(query)
+        df = pd.DataFrame.from_records(result.all(), columns=list(result.keys()))
+        for (src, dst), group in df.groupby(["src", "dst"], sort=False):
+            self._write(self._path(src, dst, day_key(start)), group)
+        return len(df)
+
+    @staticmethod
+    def _write(path: str, group: pd.DataFrame) -> None:
+        """Replace the file at `path` with the quotes in `group`, atomically."""
+        table = pa.Table.from_pandas(
+            group[ARCHIVE_SCHEMA.names], schema=ARCHIVE_SCHEMA, preserve_index=False
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        pq.write_table(table, tmp, compression="zstd", row_group_size=4096)
+        os.replace(tmp, path)
+
+    def _files(
+        self, tokens: List[str] | None, start: int | None, end: int | None
+    ) -> List[str]:
+        """Files of the requested pairs overlapping [start, end)."""
+        if tokens:
+            pairs: Iterable = product(tokens, tokens)
+        else:
+            pairs = (
+                (src[4:], dst[4:])
+                for src in sorted(os.listdir(self.root))
+                if src.startswith("src=")
+                for dst in sorted(os.listdir(os.path.join(self.root, src)))
+                if dst.startswith("dst=")
+            )
+        first = day_key(start) if start else None
+        last = day_key(end - 1) if end else None
+        files = []
+        for src, dst in pairs:
+            pair_dir = os.path.join(self.root, f"src={src}", f"dst={dst}")
+            if not os.path.isdir(pair_dir):
+                continue
+            for name in sorted(os.listdir(pair_dir)):
+                if not name.startswith("day="):
+                    continue
+                day = int(name[4:])
+                if (first and day < first) or (last and day > last):
+                    continue
+                files.append(os.path.join(pair_dir, name, "quotes.parquet"))
+        return files
+
+    # pylint: disable=too-many-arguments
+    def get_quotes(
+        self,
+        tokens: List[str] | None = None,
+        start: int | None = None,
+        end: int | None = None,
+        cols: List[str] | None = None,
+        process: bool = False,
+        include_ref_price: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Read archived quotes, like
+        :func:`src.db.datahandler.DataHandler.get_quotes`.
+
+        Only the files of the requested pairs and days are opened,
+        only `cols` are read, and row groups outside [start, end)
+        are skipped using their `timestamp` statistics.
+        """
+        if not cols:
+            cols = DEFAULT_QUOTE_COLS
+        unknown = set(cols) - {"src", "dst", *ARCHIVE_SCHEMA.names}
+        if unknown:
+            raise ValueError(f"Columns not archived: {sorted(unknown)}")
+        files = self._files(tokens, start, end)
+        if not files:
+            return pd.DataFrame()
+        dataset = ds.dataset(
+            files,
+            schema=pa.unify_schemas([ARCHIVE_SCHEMA, PARTITIONING.schema]),
+            format="parquet",
+            partitioning=PARTITIONING,
+            partition_base_dir=self.root,
+        )
+        condition = ds.scalar(True)
+        if start:
+            condition &= ds.field("timestamp") >= start
+        if end:
+            condition &= ds.field("timestamp") < end
+        table = dataset.to_table(columns=cols, filter=condition)
+        if not table.num_rows:
+            return pd.DataFrame()
+        df = table.to_pandas()
+        if process:
+            df = DataHandler.process_quotes(df, include_ref_price)
+        return df
@@ -2,20 +2,64 @@
 Provides a `DataHandler` class 
 for accessing our PG database.
 """
-from typing import List, Type
+import io
+from typing import Any, Iterator, List, Sequence, Tuple, Type
 from types import TracebackType
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    Engine,
+    Float,
+    Integer,
+    MetaData,
+    Select,
+    Table,
+    and_,
+    cast,
+    create_engine,
+    func,
+    over,
+    select,
+)
+from sqlalchemy.orm import Query, sessionmaker
 from sqlalchemy.orm import scoped_session
-from sqlalchemy.dialects.postgresql import insert
-from .models import Base, Token, Quote
-from ..configs import URI, TOKEN_DTOs
+from sqlalchemy.dialects.postgresql import insert, Insert
+from .migrations import migrate
+from .models import Base, CurveFit, Token, Quote, QuoteRollup, Route
+from .rollups import upsert_rollups
+from .routes import RouteCache, canonical_route, route_dexes, route_id
+from ..configs import URI, ALL_TOKEN_DTOs
+from ..configs.tokens import USD_TOKENS
+from ..curves import (
+    DAY,
+    HOUR,
+    SlippageIndex,
+    WindowedStats,
+    evaluate_power_law,
+    fit_power_law,
+)
 from ..logging import get_logger
 
 
 logger = get_logger(__name__)
 
+DEFAULT_QUOTE_COLS = [
+    "src",
+    "dst",
+    "in_amount",
+    "out_amount",
+    "price",
+    "timestamp",
+]
+
+QUOTE_METHODS = ("pandas", "sql", "rollup")
+
+# Notionals are converted at the latest USD price of a token up to a
+# day old, the longest cadence of a pair (see `PairScheduler`).
+USD_PRICE_MAX_AGE = DAY
+
 
 class DataHandler:
     """
@@ -25,11 +69,22 @@ class DataHandler:
     data, and querying data.
     """
 
-    def __init__(self, uri: str = URI) -> None:
-        self.uri = uri
-        self.engine = create_engine(uri)
+    def __init__(self, uri: str = URI, engine: Engine | None = None) -> None:
+        """
+        Parameters
+        ----------
+        uri : str, default=URI
+            Database to connect to, if no `engine` is given.
+        engine : Engine | None, default=None
+            An existing engine to share, e.g. the process-wide one
+            of the API (see :func:`src.db.pool.timed_engine`). Its
+            pool is left open by :func:`close`.
+        """
+        self.uri = uri if engine is None else engine.url.render_as_string(False)
+        self.engine = engine if engine is not None else create_engine(uri)
         self.session_factory = sessionmaker(bind=self.engine)
         self.session = scoped_session(self.session_factory)
+        self.routes = RouteCache()  # ids of routes already stored
 
     def close(self) -> None:
         """Close the SQLAlchemy session."""
@@ -51,26 +106,256 @@ class DataHandler:
     def create_database(self) -> None:
         """Create SQL tables if they don't exist"""
         logger.info("Creating database...")
-        Base.metadata.create_all(self.engine)
+        migrate(self.engine)
         logger.info("Inserting tokens from config...")
         self.insert_tokens()
         logger.info("Done.")
 
     def insert_tokens(self) -> None:
-        """Create the tokens table based on the config."""
+        """
+        Insert the tokens of every chain in the config. Tokens
+        already stored are skipped.
+        """
         tokens = [
-            {"id": v.address, "symbol": v.symbol, "decimals": v.decimals}
-            for v in TOKEN_DTOs.values()
+            {
+                "id": v.address,
+                "symbol": v.symbol,
+                "decimals": v.decimals,
+                "chain_id": v.chain_id,
+            }
+            for v in ALL_TOKEN_DTOs.values()
         ]
-        for token in tokens:
-            self.session.add(Token(*token))
-        self.session.commit()
+        self.insert_list(tokens, Token)
 
     def insert_quotes(self, quotes: pd.DataFrame) -> None:
-        """Given a dataframe of quotes, insert them sequentially in db."""
+        """
+        Given a dataframe of quotes, bulk insert them in db
+        and update the rollups of the rounds they belong to,
+        in the same transaction.
+
+        The `protocols` column (1inch routes as JSON strings)
+        is replaced by the id of the route in the `routes`
+        table, see :func:`_route_ids`.
+        """
         if quotes.empty:
             return
-        self.insert_df(quotes, Quote)
+        pairs = list(quotes[["src", "dst"]].drop_duplicates().itertuples(index=False))
+        start = int(quotes["timestamp"].min()) // 3600 * 3600
+        end = int(quotes["timestamp"].max()) // 3600 * 3600 + 3600
+        try:
+            new_routes: List[int] = []
+            if "protocols" in quotes.columns:
+                route_ids, new_routes = self._route_ids(quotes["protocols"])
+                quotes = quotes.drop(columns="protocols").assign(route_id=route_ids)
+            self._copy_df(quotes, Quote, False, None)
+            self._update_rollups(start, end, pairs)
+        except Exception as e:
+            self.session.rollback()
+            raise e
+
+        self.session.commit()
+        self.routes.add(new_routes)
+
+    def _route_ids(self, protocols: pd.Series) -> Tuple[np.ndarray, List[int]]:
+        """
+        Content-hash the routes in `protocols` and insert the ones
+        not in the route LRU into `routes` (skipping conflicts).
+        Each distinct route is only hashed once. Returns the route id
+        of every row and the ids that were written.
+        """
+        codes, uniques = pd.factorize(protocols)
+        ids = np.empty(len(uniques), dtype=np.int64)
+        records = []
+        for i, route in enumerate(uniques):
+            canonical, parsed = canonical_route(route)
+            ids[i] = route_id(canonical)
+            if ids[i] not in self.routes:
+                records.append(
+                    {
+                        "id": int(ids[i]),
+                        "protocols": parsed,
+                        "dexes": route_dexes(parsed),
+                    }
+                )
+        if records:
+            self._insert_records(records, Route, False, None)
+        return ids[codes], [record["id"] for record in records]
+
+    def update_rollups(
+        self,
+        start: int | None = None,
+        end: int | None = None,
+        pairs: List[Tuple[str, str]] | None = None,
+    ) -> None:
+        """
+        Recompute the rollups of all rounds with quotes in
+        [start, end), optionally only for the given (src, dst)
+        `pairs`. `start` and `end` should be aligned to the hour.
+        Used to backfill the `quote_rollups` table.
+        """
+        try:
+            self._update_rollups(start, end, pairs)
+        except Exception as e:
+            self.session.rollback()
+            raise e
+
+        self.session.commit()
+
+    def _update_rollups(
+        self,
+        start: int | None,
+        end: int | None,
+        pairs: List[Tuple[str, str]] | None,
+    ) -> None:
+        """Upsert the rollups of the quotes in [start, end), see :func:`upsert_rollups`."""
+        self.session.execute(upsert_rollups(start, end, pairs))
+
+    # pylint: disable=too-many-arguments
+    def update_curves(
+        self, start: int, end: int, periods: Tuple[int, ...] = (HOUR, DAY)
+    ) -> pd.DataFrame:
+        """
+        Refit the price impact curves of every `period` overlapping
+        [start, end) from the processed quotes, replacing stored fits.
+        Periods are widened to their boundaries, so a partial day is
+        refitted with all of its quotes so far. Returns the fits.
+        """
+        fits = []
+        for period in periods:
+            quotes = self.get_quotes(
+                start=start // period * period,
+                end=-(-end // period) * period,
+                cols=["src", "dst", "in_amount", "timestamp"],
+                process=True,
+                method="rollup",
+            )
+            fits.append(fit_power_law(quotes, period))
+        curves = pd.concat(fits).reset_index()
+        self.insert_df(
+            curves,
+            CurveFit,
+            replace=True,
+            index_elements=["src", "dst", "period", "start"],
+        )
+        return curves
+
+    def get_curves(
+        self,
+        tokens: List[str] | None = None,
+        start: int | None = None,
+        end: int | None = None,
+        period: int = HOUR,
+    ) -> pd.DataFrame:
+        """
+        Get the fitted curves of `period` starting in [start, end)
+        between `tokens`, indexed by (src, dst).
+        """
+        query = self.session.query(
+            *[CurveFit.__table__.c[col] for col in CurveFit.__table__.c.keys()]
+        ).filter(CurveFit.period == period)
+        if tokens:
+            query = query.filter(CurveFit.src.in_(tokens), CurveFit.dst.in_(tokens))
+        if start:
+            query = query.filter(CurveFit.start >= start // period * period)
+        if end:
+            query = query.filter(CurveFit.start < end)
+        results = query.order_by(CurveFit.src, CurveFit.dst, CurveFit.start).all()
+        if not results:
+            return pd.DataFrame()
+        return pd.DataFrame.from_dict(results).set_index(["src", "dst"])
+
+    def get_slippage_index(
+        self,
+        tokens: List[str] | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> SlippageIndex:
+        """
+        Build a :class:`src.curves.SlippageIndex` over the processed
+        quotes in [start, end) between `tokens`.
+        """
+        quotes = self.get_quotes(
+            tokens,
+            start,
+            end,
+            cols=["src", "dst", "in_amount", "timestamp"],
+            process=True,
+            method="rollup",
+        )
+        return SlippageIndex(quotes)
+
+    def update_windows(self, windows: WindowedStats) -> int:
+        """
+        Add the rounds rolled up since `windows` was last updated (or
+        over its longest window, if empty) to `windows`, reading only
+        their rollups. Returns the number of rounds added or updated.
+
+        Price impact at each USD notional is evaluated on the round's
+        rollup fit, converting notionals into `src` with its latest
+        reference price against the USDC of its chain, at most
+        `USD_PRICE_MAX_AGE` before the round: pairs are not quoted
+        every hour. Rounds without such a price are skipped. The last
+        `USD_PRICE_MAX_AGE` of rounds are read again on each update,
+        so rounds replayed into that span, or priced since, are
+        updated. Rounds without a fit are added as NaN.
+        """
+        latest = self.latest_timestamp()
+        if latest is None:
+            return 0
+        start = latest // HOUR * HOUR - windows.span + HOUR
+        if windows.last_hour is not None:
+            start = max(start, windows.last_hour - USD_PRICE_MAX_AGE)
+        rollups = self.get_rollups(None, start - USD_PRICE_MAX_AGE, None)
+        if rollups.empty:
+            return 0
+        rollups = rollups.reset_index()
+
+        usdc = list(USD_TOKENS.values())
+        usd = rollups.loc[rollups["dst"].isin(usdc), ["src", "hour", "reference_price"]]
+        rollups = pd.merge_asof(
+            rollups[rollups["hour"] >= start].sort_values("hour"),
+            usd.rename(columns={"reference_price": "usd_price"}).sort_values("hour"),
+            on="hour",
+            by="src",
+            direction="backward",
+            tolerance=USD_PRICE_MAX_AGE,
+        )
+        rollups.loc[rollups["src"].isin(usdc), "usd_price"] = 1.0
+        rollups = rollups[rollups["usd_price"].notna()]
+        decimals = self.get_tokens(["id", "decimals"]).set_index("id")["decimals"]
+        units = 10.0 ** rollups["src"].map(decimals).to_numpy(dtype=np.float64)
+        amounts = np.outer(
+            units / rollups["usd_price"].to_numpy(dtype=np.float64),
+            windows.notionals,
+        )
+        impacts = np.minimum(
+            evaluate_power_law(
+                rollups[["impact_intercept"]].to_numpy(dtype=np.float64),
+                rollups[["impact_slope"]].to_numpy(dtype=np.float64),
+                amounts,
+            ),
+            1.0,
+        )
+        for src, dst, hour, values in zip(
+            rollups["src"], rollups["dst"], rollups["hour"], impacts.tolist()
+        ):
+            windows.add(src, dst, int(hour), values)
+        return len(rollups)
+
+    def get_window_stats(
+        self, tokens: List[str] | None = None, checkpoint: str | None = None
+    ) -> pd.DataFrame:
+        """
+        Get rolling price impact statistics between `tokens`, see
+        :class:`src.curves.WindowedStats`. With `checkpoint`, the
+        windows are restored from and saved back to that file, so
+        only the rounds since the last call are read.
+        """
+        windows = WindowedStats.load(checkpoint) if checkpoint else WindowedStats()
+        self.update_windows(windows)
+        if checkpoint:
+            windows.save(checkpoint)
+        return windows.stats(tokens)
 
     def insert_df(
         self,
@@ -78,24 +363,32 @@ class DataHandler:
         entity: Type[Base],
         replace: bool = False,
         index_elements: List[str] | None = None,
+        method: str = "copy",
     ) -> None:
         """
-        Insert rows from dataframe in `entity`. If `replace`
-        is True, then conflicting rows will be updated.
+        Bulk insert rows from dataframe in `entity`. If `replace`
+        is True, then conflicting rows will be updated, otherwise
+        they are skipped. Rolls back on failure.
+
+        `method` is either "copy", which streams the dataframe into a
+        temporary table with COPY and upserts it with a single
+        INSERT ... SELECT, or "values", which sends multi-row
+        INSERT ... VALUES statements.
         """
-        for _, row in df.iterrows():
-            stmt = insert(entity.__table__).values(**row)
-            if replace:
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=index_elements, set_=dict(row)
-                )
+        if df.empty:
+            return
+        if method not in ("copy", "values"):
+            raise ValueError(f"Unknown insert method: {method}.")
+        try:
+            if method == "copy":
+                self._copy_df(df, entity, replace, index_elements)
             else:
-                stmt = stmt.on_conflict_do_nothing()
-            try:
-                self.session.execute(stmt)
-            except Exception as e:
-                self.session.rollback()
-                raise e
+                self._insert_records(
+                    df.to_dict(orient="records"), entity, replace, index_elements
+                )
+        except Exception as e:
+            self.session.rollback()
+            raise e
 
         self.session.commit()
 
@@ -107,28 +400,91 @@ class DataHandler:
         index_elements: List[str] | None = None,
     ) -> None:
         """
-        Insert a list of dicts in `entity`. If `replace`
+        Bulk insert a list of dicts in `entity`. If `replace`
         is True, then conflicting rows will be updated.
+        Rolls back on failure.
         """
         if not lst:
             return
 
-        for d in lst:
-            stmt = insert(entity.__table__).values(**d)
-            if replace:
-                stmt = stmt.on_conflict_do_update(
-                    index_elements=index_elements, set_=dict(d)
-                )
-            else:
-                stmt = stmt.on_conflict_do_nothing()
-            try:
-                self.session.execute(stmt)
-            except Exception as e:
-                self.session.rollback()
-                raise e
+        try:
+            self._insert_records(lst, entity, replace, index_elements)
+        except Exception as e:
+            self.session.rollback()
+            raise e
 
         self.session.commit()
 
+    @staticmethod
+    def _on_conflict(
+        stmt: Insert,
+        cols: List[str],
+        replace: bool,
+        index_elements: List[str] | None,
+    ) -> Insert:
+        """Update `cols` of conflicting rows if `replace`, else skip them."""
+        if replace:
+            return stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={col: stmt.excluded[col] for col in cols},
+            )
+        return stmt.on_conflict_do_nothing()
+
+    def _insert_records(
+        self,
+        records: List[dict],
+        entity: Type[Base],
+        replace: bool,
+        index_elements: List[str] | None,
+    ) -> None:
+        """
+        Insert `records` with one executemany, which SQLAlchemy batches
+        into multi-row INSERT ... VALUES statements.
+        """
+        cols = list(records[0].keys())
+        stmt = self._on_conflict(
+            insert(entity.__table__), cols, replace, index_elements
+        )
+        self.session.execute(stmt, records)
+
+    def _copy_df(
+        self,
+        df: pd.DataFrame,
+        entity: Type[Base],
+        replace: bool,
+        index_elements: List[str] | None,
+    ) -> None:
+        """
+        COPY `df` into a temporary table shaped like `entity`,
+        then upsert it into `entity` with one statement.
+        """
+        cols = list(df.columns)
+        table = entity.__table__
+        tmp = Table(
+            f"tmp_{table.name}",
+            MetaData(),
+            *[Column(col, table.c[col].type) for col in cols],
+            prefixes=["TEMPORARY"],
+            postgresql_on_commit="DROP",
+        )
+        conn = self.session.connection()
+        tmp.create(conn)
+
+        buf = io.StringIO()
+        df.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(  # psycopg2 extension
+                f"COPY {tmp.name} ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        finally:
+            cursor.close()
+
+        stmt = insert(table).from_select(cols, select(*tmp.c))
+        self.session.execute(self._on_conflict(stmt, cols, replace, index_elements))
+
     def get_tokens(self, cols: List[str] | None = None) -> pd.DataFrame:
         """Get tokens from database."""
         if not cols:
@@ -139,6 +495,88 @@ class DataHandler:
             return pd.DataFrame()
         return pd.DataFrame.from_dict(results)
 
+    def get_rollups(
+        self,
+        tokens: List[str] | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> pd.DataFrame:
+        """
+        Get the hourly rollups of the rounds in [start, end)
+        between `tokens`, indexed by (src, dst).
+        """
+        query = self.session.query(
+            *[QuoteRollup.__table__.c[col] for col in QuoteRollup.__table__.c.keys()]
+        )
+        if tokens:
+            query = query.filter(
+                QuoteRollup.src.in_(tokens), QuoteRollup.dst.in_(tokens)
+            )
+        if start:
+            query = query.filter(QuoteRollup.hour >= start // 3600 * 3600)
+        if end:
+            query = query.filter(QuoteRollup.hour < end)
+        results = query.order_by(
+            QuoteRollup.src, QuoteRollup.dst, QuoteRollup.hour
+        ).all()
+        if not results:
+            return pd.DataFrame()
+        return pd.DataFrame.from_dict(results).set_index(["src", "dst"])
+
+    # pylint: disable=not-callable
+    def get_route_dexes(
+        self,
+        tokens: List[str] | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> pd.DataFrame:
+        """
+        Count the quotes routed through each DEX, per pair and
+        size bucket, reading the `dexes` array of the routes
+        rather than parsing the routes' JSON.
+
+        `size_bucket` is the order of magnitude of the trade size
+        in units of the src token, i.e. `floor(log10(amount))`.
+        A quote split across several DEXes counts for each of them.
+        """
+        bucket = (
+            cast(func.floor(func.log(cast(Quote.in_amount, Float))), Integer)
+            - Token.decimals
+        )
+        used = (
+            select(
+                Quote.src,
+                Quote.dst,
+                bucket.label("size_bucket"),
+                func.unnest(Route.dexes).label("dex"),
+            )
+            .join(Route, Route.id == Quote.route_id)
+            .join(Token, Token.id == Quote.src)
+            .where(Quote.in_amount > 0, *self._quotes_filters(tokens, start, end))
+            .subquery("used")
+        )
+        keys = (used.c.src, used.c.dst, used.c.size_bucket, used.c.dex)
+        query = (
+            select(*keys, func.count().label("n_quotes"))
+            .group_by(*keys)
+            .order_by(*keys)
+        )
+        results = self.session.execute(query).all()
+        if not results:
+            return pd.DataFrame()
+        return pd.DataFrame.from_records(
+            results, columns=["src", "dst", "size_bucket", "dex", "n_quotes"]
+        ).set_index(["src", "dst"])
+
+    def latest_timestamp(self) -> int | None:
+        """
+        Timestamp of the most recently inserted quote. Uses the primary
+        key index, so it is cheap to poll.
+        """
+        return (
+            self.session.query(Quote.timestamp).order_by(Quote.id.desc()).limit(1)
+        ).scalar()
+
     # pylint: disable=too-many-arguments
     def get_quotes(
         self,
@@ -148,28 +586,32 @@ class DataHandler:
         cols: List[str] | None = None,
         process: bool = False,
         include_ref_price: bool = False,
+        method: str = "pandas",
     ) -> pd.DataFrame:
         """
         Get 1inch quotes from database. Filter
         query by the input parameters.
+
+        With `process=True`, `method` selects where the reference
+        price and price impact are computed: "pandas" fetches the raw
+        quotes and runs :func:`process_quotes`, "sql" computes them in
+        Postgres with window functions (see :func:`_processed_query`)
+        and only transfers the requested columns, and "rollup" does the
+        same but reads the reference prices from the `quote_rollups`
+        table where they are exact, falling back to "sql" otherwise.
+        All return the same frame.
         """
-        if not cols:
-            cols = [
-                "src",
-                "dst",
-                "in_amount",
-                "out_amount",
-                "price",
-                "timestamp",
-            ]
-        query = self.session.query(*[getattr(Quote, col) for col in cols])
-        if tokens:
-            logger.info(tokens)
-            query = query.filter(Quote.src.in_(tokens), Quote.dst.in_(tokens))
-        if start:
-            query = query.filter(Quote.timestamp >= start)
-        if end:
-            query = query.filter(Quote.timestamp < end)
+        if method not in QUOTE_METHODS:
+            raise ValueError(
+                f"Unknown method {method}, expected one of {QUOTE_METHODS}"
+            )
+        if process and method != "pandas":
+            stmt = self._processed_query(
+                tokens, start, end, cols, include_ref_price, method
+            )
+            result = self.session.execute(stmt)
+            return self._processed_frame(result.all(), list(result.keys()))
+        query = self._quotes_query(tokens, start, end, cols)
         results = query.all()
         if not results:
             return pd.DataFrame()
@@ -178,52 +620,285 @@ class DataHandler:
             results = self.process_quotes(results, include_ref_price)
         return results
 
+    # pylint: disable=too-many-arguments, too-many-locals
+    def iter_quotes(
+        self,
+        tokens: List[str] | None = None,
+        start: int | None = None,
+        end: int | None = None,
+        cols: List[str] | None = None,
+        process: bool = False,
+        include_ref_price: bool = False,
+        method: str = "pandas",
+        chunksize: int = 50_000,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Stream 1inch quotes from database in chunks of about
+        `chunksize` rows, reading them through a server-side cursor.
+        Takes the same filters as :func:`get_quotes`.
+
+        Rows are ordered by (src, dst, timestamp), so each 'round'
+        of a pair is contiguous. When processing, the last round of
+        a chunk is held back until it is complete, so the reference
+        prices match :func:`get_quotes`. With `method="sql"` or
+        `method="rollup"` the rounds are computed in Postgres and
+        chunks are yielded as is.
+        """
+        if method not in QUOTE_METHODS:
+            raise ValueError(
+                f"Unknown method {method}, expected one of {QUOTE_METHODS}"
+            )
+        if process and method != "pandas":
+            stmt = self._processed_query(
+                tokens, start, end, cols, include_ref_price, method
+            )
+            result = self.session.execute(stmt.execution_options(yield_per=chunksize))
+            keys = list(result.keys())
+            for partition in result.partitions():
+                yield self._processed_frame(partition, keys)
+            return
+        query = self._quotes_query(tokens, start, end, cols).order_by(
+            Quote.src, Quote.dst, Quote.timestamp
+        )
+        result = self.session.execute(
+            query.statement.execution_options(yield_per=chunksize)
+        )
+        carry = pd.DataFrame()
+        for partition in result.partitions():
+            df = pd.DataFrame.from_records(partition, columns=list(result.keys()))
+            if not process:
+                yield df
+                continue
+            if not carry.empty:
+                df = pd.concat([carry, df], ignore_index=True)
+            # Hold back the last (src, dst, hour) group: it may continue.
+            hour = df["timestamp"] // 3600
+            last = df.index[-1]
+            tail = (
+                (df["src"] == df.at[last, "src"])
+                & (df["dst"] == df.at[last, "dst"])
+                & (hour == hour[last])
+            )
+            carry = df[tail]
+            if not tail.all():
+                yield self.process_quotes(df[~tail].copy(), include_ref_price)
+        if not carry.empty:
+            yield self.process_quotes(carry.copy(), include_ref_price)
+
+    def _quotes_query(
+        self,
+        tokens: List[str] | None,
+        start: int | None,
+        end: int | None,
+        cols: List[str] | None,
+    ) -> Query:
+        """Query selecting `cols` of the quotes matching the filters."""
+        if not cols:
+            cols = DEFAULT_QUOTE_COLS
+        query = self.session.query(*[self._quote_column(col) for col in cols])
+        if "protocols" in cols:
+            query = query.outerjoin(Route, Route.id == Quote.route_id)
+        return query.filter(*self._quotes_filters(tokens, start, end))
+
+    @staticmethod
+    def _quote_column(col: str) -> Any:
+        """Column `col` of a quote. `protocols` is read from its route."""
+        if col == "protocols":
+            return Route.protocols.label("protocols")
+        return getattr(Quote, col)
+
+    @staticmethod
+    def _quotes_filters(
+        tokens: List[str] | None, start: int | None, end: int | None
+    ) -> List[ColumnElement[bool]]:
+        """WHERE clauses for the quotes matching the filters."""
+        filters: List[ColumnElement[bool]] = []
+        if tokens:
+            logger.info(tokens)
+            filters += [Quote.src.in_(tokens), Quote.dst.in_(tokens)]
+        if start:
+            filters.append(Quote.timestamp >= start)
+        if end:
+            filters.append(Quote.timestamp < end)
+        return filters
+
+    # pylint: disable=not-callable
+    def _rolled_up(
+        self, tokens: List[str] | None, start: int | None, end: int | None
+    ) -> bool:
+        """
+        Whether the reference prices of the quotes in [start, end) are
+        those of their rollups: the window is aligned to the hour, so
+        no round is cut, and each quote in it is counted in a rollup.
+        """
+        if (start and start % 3600) or (end and end % 3600):
+            return False
+        filters: List[ColumnElement[bool]] = []
+        if tokens:
+            filters += [QuoteRollup.src.in_(tokens), QuoteRollup.dst.in_(tokens)]
+        if start:
+            filters.append(QuoteRollup.hour >= start)
+        if end:
+            filters.append(QuoteRollup.hour < end)
+        rolled_up = select(func.coalesce(func.sum(QuoteRollup.n_quotes), 0)).where(
+            *filters
+        )
+        quotes = (
+            select(func.count())
+            .select_from(Quote)
+            .where(*self._quotes_filters(tokens, start, end))
+        )
+        n_rolled_up, n_quotes = self.session.execute(
+            select(rolled_up.scalar_subquery(), quotes.scalar_subquery())
+        ).one()
+        return n_rolled_up == n_quotes
+
+    # pylint: disable=too-many-arguments, not-callable
+    def _processed_query(
+        self,
+        tokens: List[str] | None,
+        start: int | None,
+        end: int | None,
+        cols: List[str] | None,
+        include_ref_price: bool,
+        method: str = "sql",
+    ) -> Select:
+        """
+        Query computing :func:`process_quotes` in Postgres.
+
+        With `method="sql"`, the reference price is a `max(price)`
+        window over (src, dst, hour), with `hour` the start of the
+        hour of `timestamp`, so the scan can follow the
+        (src, dst, timestamp) index. With `method="rollup"` it is
+        looked up in `quote_rollups` by primary key instead, if the
+        rollups are exact for the window (see :func:`_rolled_up`);
+        otherwise it falls back to the window function. Only
+        `cols` are returned, with amounts cast to double precision,
+        ordered like the pandas output.
+        """
+        if not cols:
+            cols = DEFAULT_QUOTE_COLS
+        values = [col for col in cols if col not in ("src", "dst")]
+        hour = Quote.timestamp // 3600 * 3600
+        filters = self._quotes_filters(tokens, start, end)
+        quote_cols = [
+            Quote.id,
+            Quote.src,
+            Quote.dst,
+            hour.label("hour"),
+            Quote.price.label("quote_price"),
+            *[self._quote_column(col) for col in values],
+        ]
+        if method == "rollup" and not self._rolled_up(tokens, start, end):
+            logger.info("Quotes not all rolled up, using window functions.")
+            method = "sql"
+        if method == "rollup":
+            if start:
+                filters.append(QuoteRollup.hour >= start // 3600 * 3600)
+            if end:
+                filters.append(QuoteRollup.hour < end)
+            query = select(*quote_cols, QuoteRollup.reference_price).join(
+                QuoteRollup,
+                and_(
+                    QuoteRollup.src == Quote.src,
+                    QuoteRollup.dst == Quote.dst,
+                    QuoteRollup.hour == hour,
+                ),
+            )
+        else:
+            reference_price = over(
+                func.max(Quote.price), partition_by=(Quote.src, Quote.dst, hour)
+            )
+            query = select(*quote_cols, reference_price.label("reference_price"))
+        if "protocols" in values:
+            query = query.outerjoin(Route, Route.id == Quote.route_id)
+        rounds = query.where(*filters).subquery("rounds")
+        columns = [rounds.c.src, rounds.c.dst]
+        for col in values:
+            if col in ("in_amount", "out_amount"):
+                columns.append(cast(rounds.c[col], Float).label(col))
+            else:
+                columns.append(rounds.c[col])
+        if include_ref_price:
+            columns.append(rounds.c.reference_price)
+        price_impact = (rounds.c.reference_price - rounds.c.quote_price) / (
+            rounds.c.reference_price
+        )
+        columns.append(price_impact.label("price_impact"))
+        return select(*columns).order_by(
+            rounds.c.src, rounds.c.dst, rounds.c.hour, rounds.c.id
+        )
+
+    @staticmethod
+    def _processed_frame(rows: Sequence[Any], keys: List[str]) -> pd.DataFrame:
+        """Frame of :func:`_processed_query` rows, indexed by (src, dst)."""
+        if not rows:
+            return pd.DataFrame()
+        return pd.DataFrame.from_records(rows, columns=keys).set_index(["src", "dst"])
+
+    @staticmethod
     def process_quotes(
-        self, df: pd.DataFrame, include_ref_price: bool = False
+        df: pd.DataFrame, include_ref_price: bool = False
     ) -> pd.DataFrame:
         """
         Performs the following processing steps:
-            1. Create datetime index (floored to hours).
+            1. Bucket quotes by hour.
             2. Add reference prices for each 'round' of quotes:
                 a. Quotes are fetched every hour. This is a 'round'.
                 b. The reference price is the best price for
                 that 'round'.
             3. Add price impact as the pct difference
             between the reference price and the quoted price.
+
+        Returns the quotes indexed and sorted by (src, dst).
+
+        Note
+        ----
+        Works in a single sort: src/dst are factorized into sorted
+        integer codes, rows are ordered once by (pair, hour), and the
+        reference price is a segmented max over that order. Each
+        column is copied once, into the output.
         """
         df["in_amount"] = df["in_amount"].astype(float)
         df["out_amount"] = df["out_amount"].astype(float)
 
-        # Create datetime index floored to hours.
-        df["hour"] = pd.to_datetime(df["timestamp"], unit="s").dt.floor("h")
+        src_codes, src_tokens = pd.factorize(df["src"], sort=True)
+        dst_codes, dst_tokens = pd.factorize(df["dst"], sort=True)
+        pair = src_codes.astype(np.int64) * len(dst_tokens) + dst_codes
+        hour = df["timestamp"].to_numpy(dtype=np.int64) // 3600
+        if len(hour):
+            hour -= hour.min()  # keeps the sort key small
+
+        # Order rows by (pair, hour) so each round is contiguous.
+        key = pair * (hour.max(initial=0) + 1) + hour
+        del pair, hour
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        price = df["price"].to_numpy(dtype=np.float64)[order]
 
         # Add reference price
         # TODO improve the way we get reference price.
-        grouped = (
-            df.groupby(["hour", "src", "dst"])
-            .agg(reference_price=("price", "max"))
-            .reset_index()
-        )
-        df = pd.merge(
-            df,
-            grouped,
-            left_on=["hour", "src", "dst"],
-            right_on=["hour", "src", "dst"],
+        starts = np.flatnonzero(np.diff(key, prepend=-1))
+        counts = np.diff(starts, append=len(key))
+        reference_price = np.repeat(np.fmax.reduceat(price, starts), counts)
+
+        index = pd.MultiIndex(
+            levels=[src_tokens, dst_tokens],
+            codes=[
+                src_codes.astype(np.int32)[order],
+                dst_codes.astype(np.int32)[order],
+            ],
+            names=["src", "dst"],
         )
+        data = {
+            col: df[col].to_numpy()[order]
+            for col in df.columns
+            if col not in ("src", "dst")
+        }
+        if include_ref_price:
+            data["reference_price"] = reference_price
 
         # Add price impact
-        df["price_impact"] = (df["reference_price"] - df["price"]) / df[
-            "reference_price"
-        ]
-
-        drop = ["hour"]
-
-        if not include_ref_price:
-            drop.append("reference_price")
-
-        df.drop(columns=drop, inplace=True)
-
-        df.set_index(["src", "dst"], inplace=True)
-        df.sort_index(inplace=True)
+        data["price_impact"] = (reference_price - price) / reference_price
 
-        return df
+        return pd.DataFrame(data, index=index, copy=False)
@@ -0,0 +1,390 @@
+"""
+Provides schema migrations and partition management
+for our PG database.
+
+The `quotes` table is partitioned by month on `timestamp`.
+Partitions are named `quotes_YYYY_MM` and cover
+[first second of the month, first second of the next month)
+in UTC. There is no default partition, so that old months can
+be detached concurrently; instead :func:`ensure_partitions`
+creates partitions a few months ahead of time, and back to the
+oldest quotes about to be inserted (e.g. replayed from the
+collector's spool into a fresh database).
+"""
+import json
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+from sqlalchemy import Connection, Engine, func, select, text
+from .models import Base, Quote, SchemaMigration, Token
+from .rollups import upsert_rollups
+from .routes import canonical_route, route_dexes, route_id
+from ..logging import get_logger
+
+logger = get_logger(__name__)
+
+# A migration runs on a connection in "commit as you go" mode: it is
+# committed with its version, unless it commits partway itself, which
+# it may only do if it can resume from any of its commits.
+Migration = Callable[[Connection], None]
+
+
+def month_start(timestamp: int) -> int:
+    """Timestamp of the first second of the (UTC) month of `timestamp`."""
+    dt = datetime.fromtimestamp(timestamp, timezone.utc)
+    return int(datetime(dt.year, dt.month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def next_month(start: int) -> int:
+    """Timestamp of the first second of the month after `start`."""
+    dt = datetime.fromtimestamp(start, timezone.utc)
+    year, month = divmod(dt.year * 12 + dt.month, 12)
+    return int(datetime(year, month + 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+def partition_name(start: int) -> str:
+    """Name of the `quotes` partition for the month starting at `start`."""
+    return f"{Quote.__tablename__}_{datetime.fromtimestamp(start, timezone.utc):%Y_%m}"
+
+
+def partition_start(name: str) -> int:
+    """Start of the month covered by the `quotes` partition `name`."""
+    year, month = map(int, name.rsplit("_", 2)[-2:])
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def list_partitions(conn: Connection) -> List[str]:
+    """Names of the partitions currently attached to `quotes`."""
+    return list(
+        conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:parent AS regclass) ORDER BY c.relname"
+            ),
+            {"parent": Quote.__tablename__},
+        ).scalars()
+    )
+
+
+def create_partition(conn: Connection, start: int) -> str:
+    """Create the partition for the month starting at `start`."""
+    name = partition_name(start)
+    conn.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {Quote.__tablename__} "
+            f"FOR VALUES FROM ({start}) TO ({next_month(start)})"
+        )
+    )
+    logger.info("Created partition %s.", name)
+    return name
+
+
+def ensure_partitions(
+    conn: Connection,
+    now: int | None = None,
+    ahead: int = 3,
+    since: int | None = None,
+) -> List[str]:
+    """
+    Create the partitions from the month of `since` (by default,
+    the current month) through the `ahead` months after the current
+    one, if they don't exist yet.
+    Returns the names of the created partitions.
+    """
+    existing = set(list_partitions(conn))
+    now = int(time.time()) if now is None else now
+    start = month_start(now if since is None else min(since, now))
+    end = month_start(now)
+    for _ in range(ahead):
+        end = next_month(end)
+    created = []
+    while start <= end:
+        if partition_name(start) not in existing:
+            created.append(create_partition(conn, start))
+        start = next_month(start)
+    return created
+
+
+def detach_partition(engine: Engine, start: int, concurrently: bool = True) -> str:
+    """
+    Detach the partition for the month starting at `start`, leaving
+    it as a standalone table that can be archived or dropped without
+    touching (or vacuuming) the rest of `quotes`.
+
+    With `concurrently`, concurrent queries on `quotes` are not
+    blocked. This cannot run inside a transaction, so it uses its
+    own autocommit connection.
+    """
+    name = partition_name(start)
+    mode = " CONCURRENTLY" if concurrently else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(
+            text(f"ALTER TABLE {Quote.__tablename__} DETACH PARTITION {name}{mode}")
+        )
+    logger.info("Detached partition %s.", name)
+    return name
+
+
+def _partition_quotes(conn: Connection) -> None:
+    """
+    Move an unpartitioned `quotes` table into a partitioned one,
+    and declare the (src, dst, timestamp) index.
+
+    The table is renamed to `quotes_legacy` and its rows are moved
+    one month at a time, each month in its own transaction, so the
+    migration resumes where it stopped if interrupted.
+    """
+    table = Quote.__tablename__
+    legacy = f"{table}_legacy"
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table},
+    ).scalar()
+    if kind == "r":
+        _create_partitioned(conn, table, legacy)
+        conn.commit()
+    elif conn.execute(text("SELECT to_regclass(:t)"), {"t": legacy}).scalar() is None:
+        # Fresh database: `create_all` already created the partitioned table.
+        return
+
+    logger.info("Partitioning %s...", table)
+    months = (
+        conn.execute(
+            text(
+                "SELECT DISTINCT CAST(extract(epoch FROM date_trunc('month', "
+                f"to_timestamp(timestamp) AT TIME ZONE 'UTC')) AS integer) "
+                f"FROM {legacy} WHERE timestamp IS NOT NULL ORDER BY 1"
+            )
+        )
+        .scalars()
+        .all()
+    )
+    cols = ", ".join(
+        conn.execute(
+            text(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_name = :table ORDER BY ordinal_position"
+            ),
+            {"table": legacy},
+        ).scalars()
+    )
+    for start in months:
+        name = create_partition(conn, start)
+        moved = conn.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {legacy} "
+                f"WHERE timestamp >= :start AND timestamp < :end RETURNING {cols}) "
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM moved"
+            ),
+            {"start": start, "end": next_month(start)},
+        ).rowcount
+        conn.commit()
+        logger.info("Moved %d quotes into %s.", moved, name)
+
+    skipped = conn.execute(text(f"SELECT count(*) FROM {legacy}")).scalar()
+    if skipped:
+        logger.warning("Dropping %d quotes without a timestamp.", skipped)
+    conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+    conn.execute(text(f"DROP TABLE {legacy}"))
+
+
+def _create_partitioned(conn: Connection, table: str, legacy: str) -> None:
+    """Rename `table` to `legacy` and create an empty partitioned `table`."""
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    conn.execute(
+        text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+    )
+    conn.execute(
+        text("ALTER INDEX IF EXISTS idx_src_dst_timestamp RENAME TO idx_legacy_sdt")
+    )
+    # Copy the legacy columns (and the id sequence default) rather than
+    # `Quote.__table__`, which later migrations change.
+    conn.execute(
+        text(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS, "
+            "PRIMARY KEY (id, timestamp)) PARTITION BY RANGE (timestamp)"
+        )
+    )
+    for col in ("src", "dst"):
+        conn.execute(
+            text(f"ALTER TABLE {table} ADD FOREIGN KEY ({col}) REFERENCES tokens (id)")
+        )
+    conn.execute(
+        text(f"CREATE INDEX idx_src_dst_timestamp ON {table} (src, dst, timestamp)")
+    )
+
+
+def _route_quotes(conn: Connection, batch: int = 10_000) -> None:
+    """
+    Move the `protocols` JSONB of every quote into the `routes`
+    table and replace it with a `route_id`. Routes are read with
+    a server-side cursor and hashed like at ingest.
+
+    The dropped column's space is only reclaimed once each
+    partition is rewritten, e.g. with VACUUM FULL.
+    """
+    table = Quote.__tablename__
+    has_protocols = conn.execute(
+        text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = :table AND column_name = 'protocols'"
+        ),
+        {"table": table},
+    ).scalar()
+    if not has_protocols:
+        return
+
+    logger.info("Moving routes out of %s...", table)
+    conn.execute(
+        text(f"ALTER TABLE {table} ADD COLUMN route_id bigint REFERENCES routes (id)")
+    )
+    conn.execute(
+        text(
+            "CREATE TEMPORARY TABLE route_map (id bigint, protocols jsonb) "
+            "ON COMMIT DROP"
+        )
+    )
+    result = conn.execute(
+        text(
+            f"SELECT DISTINCT protocols FROM {table} WHERE protocols IS NOT NULL"
+        ).execution_options(yield_per=batch)
+    )
+    n_routes = 0
+    for partition in result.partitions():
+        routes = []
+        for (protocols,) in partition:
+            canonical, parsed = canonical_route(protocols)
+            routes.append(
+                {
+                    "id": route_id(canonical),
+                    "protocols": canonical,
+                    "dexes": route_dexes(parsed),
+                    "stored": json.dumps(protocols),  # as in `quotes`
+                }
+            )
+        conn.execute(
+            text(
+                "INSERT INTO routes (id, protocols, dexes) "
+                "VALUES (:id, CAST(:protocols AS jsonb), :dexes) "
+                "ON CONFLICT DO NOTHING"
+            ),
+            routes,
+        )
+        conn.execute(
+            text(
+                "INSERT INTO route_map (id, protocols) "
+                "VALUES (:id, CAST(:stored AS jsonb))"
+            ),
+            routes,
+        )
+        n_routes += len(routes)
+    logger.info("Stored %d distinct routes.", n_routes)
+
+    conn.execute(text("CREATE INDEX ON route_map USING hash (protocols)"))
+    conn.execute(text("ANALYZE route_map"))
+    conn.execute(
+        text(
+            f"UPDATE {table} q SET route_id = m.id FROM route_map m "
+            "WHERE q.protocols = m.protocols"
+        )
+    )
+    conn.execute(text(f"ALTER TABLE {table} DROP COLUMN protocols"))
+
+
+def _chain_ids(conn: Connection) -> None:
+    """
+    Tag tokens and quotes with the id of their chain. Existing
+    rows were all collected on Ethereum mainnet (chain 1). The
+    constant default makes this a catalog-only change.
+    """
+    for table in (Token.__tablename__, Quote.__tablename__):
+        conn.execute(
+            text(
+                f"ALTER TABLE {table} "
+                "ADD COLUMN IF NOT EXISTS chain_id integer NOT NULL DEFAULT 1"
+            )
+        )
+
+
+def _unique_quotes(conn: Connection) -> None:
+    """
+    Drop duplicate quotes (same pair, timestamp and trade size),
+    keeping the first inserted, and declare them unique.
+    """
+    table = Quote.__tablename__
+    dropped = conn.execute(
+        text(
+            f"DELETE FROM {table} a USING {table} b "
+            "WHERE a.src = b.src AND a.dst = b.dst AND a.timestamp = b.timestamp "
+            "AND a.in_amount = b.in_amount AND a.id > b.id"
+        )
+    ).rowcount
+    if dropped:
+        logger.warning("Dropped %d duplicate quotes.", dropped)
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_src_dst_timestamp_in_amount "
+            f"ON {table} (src, dst, timestamp, in_amount)"
+        )
+    )
+
+
+# pylint: disable=not-callable
+def _backfill_rollups(conn: Connection) -> None:
+    """
+    Roll up the quotes inserted before `quote_rollups` existed, one
+    month at a time, so that reference prices can be read from it.
+    `scripts/backfill_rollups.py` recomputes a given range instead.
+    """
+    first, last = conn.execute(
+        select(func.min(Quote.timestamp), func.max(Quote.timestamp))
+    ).one()
+    if first is None:
+        return
+    start = month_start(first)
+    while start <= last:
+        end = next_month(start)
+        conn.execute(upsert_rollups(start, end))
+        logger.info("Rolled up quotes of %s.", partition_name(start))
+        start = end
+
+
+MIGRATIONS: List[Tuple[str, Migration]] = [
+    ("0001_partition_quotes", _partition_quotes),
+    ("0002_route_quotes", _route_quotes),
+    ("0003_chain_ids", _chain_ids),
+    ("0004_unique_quotes", _unique_quotes),
+    ("0005_backfill_rollups", _backfill_rollups),
+]
+
+
+def migrate(engine: Engine) -> List[str]:
+    """
+    Create missing tables, apply the pending `MIGRATIONS` in order,
+    each in its own transaction(s), and create upcoming partitions.
+    Returns the versions applied.
+    """
+    Base.metadata.create_all(engine)
+    applied = []
+    with engine.connect() as conn:
+        for version, migration in MIGRATIONS:
+            done = conn.execute(
+                select(SchemaMigration.version).where(
+                    SchemaMigration.version == version
+                )
+            ).scalar()
+            if done:
+                continue
+            logger.info("Applying migration %s...", version)
+            migration(conn)
+            conn.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=version, applied_at=int(time.time())
+                )
+            )
+            conn.commit()
+            applied.append(version)
+        ensure_partitions(conn)
+        conn.commit()
+    return applied
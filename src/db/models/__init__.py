@@ -1,15 +1,17 @@
 """Package for SQLAlchemy models for accessing our PG database."""
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     Numeric,
     Float,
     String,
     ForeignKey,
+    Index,
     Table,
     MetaData,
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.ext.declarative import as_declarative
 
 
@@ -30,11 +32,37 @@ class Token(Base):
     id = Column(String, primary_key=True)
     symbol = Column(String, nullable=False)
     decimals = Column(Integer, nullable=False)
+    chain_id = Column(Integer, nullable=False, server_default="1")
+
+
+# pylint: disable=too-few-public-methods
+class Route(Base):
+    """
+    A dimension table storing each distinct 1inch route once.
+
+    `id` is the first 8 bytes of the SHA-256 of the canonical
+    JSON of `protocols`, as a signed integer (see `src.db.routes`).
+    `dexes` lists the protocol names used by the route.
+    """
+
+    __tablename__ = "routes"
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    protocols = Column(JSONB, nullable=False)
+    dexes = Column(ARRAY(String), nullable=False)
 
 
 # pylint: disable=too-few-public-methods
 class Quote(Base):
-    """A fact table storing 1inch quotes."""
+    """
+    A fact table storing 1inch quotes.
+
+    Partitioned by month on `timestamp`, so the primary key
+    must include it. Partitions are managed by `src.db.migrations`.
+    `chain_id` is the chain the quote was made on (that of its
+    tokens, see `src.configs.tokens`). A quote is unique per pair,
+    timestamp and trade size, so that replayed inserts (e.g. from
+    `src.collector.spool`) are skipped.
+    """
 
     __tablename__ = "quotes"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -44,9 +72,74 @@ class Quote(Base):
     out_amount = Column(Numeric)
     gas = Column(Integer)
     price = Column(Float)
-    protocols = Column(JSONB)
-    timestamp = Column(Integer)
+    route_id = Column(BigInteger, ForeignKey("routes.id"))
+    timestamp = Column(Integer, primary_key=True)
+    chain_id = Column(Integer, nullable=False, server_default="1")
+
+    __table_args__ = (
+        Index("idx_src_dst_timestamp", src, dst, timestamp),
+        Index(
+            "uq_src_dst_timestamp_in_amount",
+            src,
+            dst,
+            timestamp,
+            in_amount,
+            unique=True,
+        ),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+# pylint: disable=too-few-public-methods
+class QuoteRollup(Base):
+    """
+    An aggregate table storing one row per 'round' of quotes,
+    i.e. per (src, dst, hour), where `hour` is the timestamp
+    of the start of the hour.
+
+    The impact columns are a least-squares fit of
+    ln(price_impact) = impact_intercept + impact_slope * ln(in_amount)
+    over the quotes of the round with a positive price impact.
+    """
+
+    __tablename__ = "quote_rollups"
+    src = Column(String, ForeignKey("tokens.id"), primary_key=True)
+    dst = Column(String, ForeignKey("tokens.id"), primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    reference_price = Column(Float, nullable=False)
+    n_quotes = Column(Integer, nullable=False)
+    impact_slope = Column(Float)
+    impact_intercept = Column(Float)
+    impact_r2 = Column(Float)
+
+
+# pylint: disable=too-few-public-methods
+class CurveFit(Base):
+    """
+    A table storing fitted price impact curves, one per pair and
+    `period` (3600 or 86400 seconds) starting at `start`:
+    price_impact = exp(intercept) * in_amount ** slope,
+    fitted on trade sizes in [min_amount, max_amount].
+    See `src.curves`.
+    """
+
+    __tablename__ = "curve_fits"
+    src = Column(String, ForeignKey("tokens.id"), primary_key=True)
+    dst = Column(String, ForeignKey("tokens.id"), primary_key=True)
+    period = Column(Integer, primary_key=True)
+    start = Column(Integer, primary_key=True)
+    n_quotes = Column(Integer, nullable=False)
+    intercept = Column(Float, nullable=False)
+    slope = Column(Float, nullable=False)
+    r2 = Column(Float)
+    min_amount = Column(Float, nullable=False)
+    max_amount = Column(Float, nullable=False)
+
+
+# pylint: disable=too-few-public-methods
+class SchemaMigration(Base):
+    """Migrations applied by `src.db.migrations`."""
 
-    # TODO migrate db using Alembic and apply below index
-    # (index was created manually via CLI for now.)
-    # idx_src_dst_timestamp = Index('idx_src_dst_timestamp', (src, dst, timestamp))
+    __tablename__ = "schema_migrations"
+    version = Column(String, primary_key=True)
+    applied_at = Column(Integer, nullable=False)
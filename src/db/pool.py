@@ -0,0 +1,126 @@
+"""
+Provides a SQLAlchemy engine whose connection pool and queries
+are timed, to be shared by the requests of a long-lived process.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+import numpy as np
+from sqlalchemy import Connection, Engine, create_engine, event
+from sqlalchemy.pool import PoolProxiedConnection, QueuePool
+
+
+class Timings:
+    """Count and total of timed events, and the latest `samples` durations."""
+
+    def __init__(self, samples: int = 4096) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=samples)
+        self._lock = threading.Lock()  # recorded from every request thread
+
+    def record(self, seconds: float) -> None:
+        """Record an event lasting `seconds`."""
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """Aggregate the samples, in seconds."""
+        with self._lock:
+            if not self.samples:
+                return {"count": self.count}
+            samples = np.array(self.samples)
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": self.count,
+            "total": self.total,
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(samples.max()),
+        }
+
+
+class TimedQueuePool(QueuePool):
+    """
+    A :class:`sqlalchemy.pool.QueuePool` that times each checkout,
+    including the wait for a free connection when the pool is
+    exhausted and the connect of a new one. Queries are timed by
+    :func:`timed_engine`. Timings survive :func:`Engine.dispose`.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = Timings()
+        self.queries = Timings()
+
+    def connect(self) -> PoolProxiedConnection:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.checkouts.record(time.perf_counter() - start)
+
+    def recreate(self) -> "TimedQueuePool":
+        pool = super().recreate()
+        assert isinstance(pool, TimedQueuePool)
+        pool.checkouts = self.checkouts
+        pool.queries = self.queries
+        return pool
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy, and checkout and query timings."""
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(0, self.overflow()),
+            "checkouts": self.checkouts.summary(),
+            "queries": self.queries.summary(),
+        }
+
+
+def timed_engine(
+    uri: str, pool_size: int = 10, max_overflow: int = 10, **kwargs: Any
+) -> Engine:
+    """
+    Engine over a :class:`TimedQueuePool` of `pool_size` connections
+    (plus up to `max_overflow` under load), recording the time of each
+    statement. Connections are checked with a ping before use and
+    recycled after 30 minutes, so a process can keep the engine for
+    its lifetime. `kwargs` are passed on to `create_engine`.
+    """
+    kwargs.setdefault("pool_pre_ping", True)
+    kwargs.setdefault("pool_recycle", 1800)
+    engine = create_engine(
+        uri,
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        **kwargs,
+    )
+
+    # One start per connection: after_cursor_execute is not fired for
+    # a failed statement, whose start is overwritten by the next one.
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn: Connection, *_args: Any) -> None:
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn: Connection, *_args: Any) -> None:
+        start = conn.info.pop("query_start", None)
+        pool = engine.pool
+        if start is not None and isinstance(pool, TimedQueuePool):
+            pool.queries.record(time.perf_counter() - start)
+
+    return engine
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """Stats of the pool of an engine made by :func:`timed_engine`."""
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {"status": pool.status()}
@@ -0,0 +1,85 @@
+"""
+Provides the aggregation of quotes into the hourly
+`quote_rollups` table, shared by inserts and migrations.
+"""
+from typing import List, Tuple
+from sqlalchemy import (
+    ColumnElement,
+    Float,
+    and_,
+    case,
+    cast,
+    func,
+    over,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import insert, Insert
+from .models import Quote, QuoteRollup
+
+ROLLUP_COLS = [
+    "src",
+    "dst",
+    "hour",
+    "reference_price",
+    "n_quotes",
+    "impact_slope",
+    "impact_intercept",
+    "impact_r2",
+]
+
+
+# pylint: disable=not-callable
+def upsert_rollups(
+    start: int | None = None,
+    end: int | None = None,
+    pairs: List[Tuple[str, str]] | None = None,
+) -> Insert:
+    """
+    Statement aggregating the quotes in [start, end), optionally only
+    of the given (src, dst) `pairs`, by (src, dst, hour) and upserting
+    them into `quote_rollups` with one
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    """
+    hour = Quote.timestamp // 3600 * 3600
+    filters: List[ColumnElement[bool]] = []
+    if start:
+        filters.append(Quote.timestamp >= start)
+    if end:
+        filters.append(Quote.timestamp < end)
+    if pairs:
+        filters.append(tuple_(Quote.src, Quote.dst).in_(pairs))
+    rounds = (
+        select(
+            Quote.src,
+            Quote.dst,
+            hour.label("hour"),
+            Quote.price,
+            cast(Quote.in_amount, Float).label("in_amount"),
+            over(
+                func.max(Quote.price), partition_by=(Quote.src, Quote.dst, hour)
+            ).label("reference_price"),
+        )
+        .where(*filters)
+        .subquery("rounds")
+    )
+    impact = (rounds.c.reference_price - rounds.c.price) / (rounds.c.reference_price)
+    # regr_* aggregates skip the NULLs, i.e. the quotes without a
+    # positive impact (the best quote of each round) or amount.
+    positive = and_(impact > 0, rounds.c.in_amount > 0)
+    log_impact = case((positive, func.ln(impact)))
+    log_amount = case((positive, func.ln(rounds.c.in_amount)))
+    keys = (rounds.c.src, rounds.c.dst, rounds.c.hour)
+    rollups = select(
+        *keys,
+        func.max(rounds.c.reference_price),
+        func.count(),
+        func.regr_slope(log_impact, log_amount),
+        func.regr_intercept(log_impact, log_amount),
+        func.regr_r2(log_impact, log_amount),
+    ).group_by(*keys)
+    stmt = insert(QuoteRollup.__table__).from_select(ROLLUP_COLS, rollups)
+    return stmt.on_conflict_do_update(
+        index_elements=["src", "dst", "hour"],
+        set_={col: stmt.excluded[col] for col in ROLLUP_COLS},
+    )
@@ -0,0 +1,71 @@
+"""
+Provides content hashing of 1inch routes and an LRU
+of the routes already stored in the `routes` table.
+"""
+import json
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Iterable, List, Tuple
+
+
+def canonical_route(protocols: Any) -> Tuple[str, Any]:
+    """
+    Canonical JSON of a route (keys sorted, no whitespace) and the
+    parsed route. `protocols` is the 1inch `protocols` field, either
+    parsed or as a JSON string. Quotes inserted through the legacy
+    row-wise path stored the JSON string itself as a JSON value, so
+    strings are decoded until a route is left.
+    """
+    while isinstance(protocols, str):
+        protocols = json.loads(protocols)
+    return json.dumps(protocols, sort_keys=True, separators=(",", ":")), protocols
+
+
+def route_id(canonical: str) -> int:
+    """Signed 64-bit id of a route: the head of its SHA-256 digest."""
+    return int.from_bytes(sha256(canonical.encode()).digest()[:8], "big", signed=True)
+
+
+def route_dexes(protocols: Any) -> List[str]:
+    """
+    Sorted names of the protocols (DEXes) used by a route. 1inch
+    routes are nested lists (splits -> hops -> parts), each part
+    being a dict with a `name`.
+    """
+    names = set()
+    stack = [protocols]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict) and "name" in node:
+            names.add(node["name"])
+    return sorted(names)
+
+
+class RouteCache:
+    """
+    LRU of the ids of routes known to be stored in the `routes`
+    table, so that repeated routes are not written again.
+    """
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.maxsize = maxsize
+        self.ids: OrderedDict[int, None] = OrderedDict()
+
+    def __contains__(self, route: int) -> bool:
+        if route not in self.ids:
+            return False
+        self.ids.move_to_end(route)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, routes: Iterable[int]) -> None:
+        """Mark routes as stored, evicting the least recently seen."""
+        for route in routes:
+            self.ids[route] = None
+            self.ids.move_to_end(route)
+        while len(self.ids) > self.maxsize:
+            self.ids.popitem(last=False)
@@ -0,0 +1,168 @@
+"""
+Provides the `MultiChainQuotes` class, which collects quotes
+on several chains in parallel under one rate limit.
+"""
+import asyncio
+from itertools import zip_longest
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from ..configs.tokens import CHAIN_TOKEN_DTOs
+from ..data_transfer_objects import TokenDTO
+from ..logging import get_logger
+from .oneinch import Amounts, OneInchQuotes, OnQuote, QuoteResponse
+from .ratelimit import AdaptiveRateLimiter, TokenBucket
+from .sampling import AdaptiveSampler, Pair
+
+logger = get_logger(__name__)
+
+
+class MultiChainQuotes:
+    """
+    One :class:`OneInchQuotes` per chain, sharing a rate limiter.
+
+    Our 1inch API key is rate limited across all chains, so the
+    rounds of every chain draw from one token bucket: they run
+    concurrently, and a chain with fewer pairs does not leave its
+    share of the budget unused. Trade sizes of every chain are
+    chosen by one `sampler`, over the tokens of all chains.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        api_key: str,
+        chains: List[str],
+        rate_limit: float = 1.0,
+        max_rate_limit: float | None = None,
+        sampler: AdaptiveSampler | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        api_key : str
+            The 1inch API key.
+        chains : List[str]
+            Names of the chains to quote, keys of
+            :attr:`OneInchQuotes.chains` with tokens configured in
+            `src.configs.tokens.CHAIN_TOKEN_DTOs`.
+        rate_limit, max_rate_limit : float, float | None
+            Initial and maximum requests per second, over all chains.
+            Refer to :class:`src.network.ratelimit.AdaptiveRateLimiter`.
+        sampler : AdaptiveSampler | None, default=None
+            Chooses the trade sizes of every chain.
+        **kwargs
+            Passed on to each :class:`OneInchQuotes` (e.g. `calls`).
+        """
+        unknown = [c for c in chains if c not in OneInchQuotes.chains]
+        if unknown:
+            raise ValueError(f"Unknown chains: {unknown}.")
+        self.configs: Dict[str, Dict[str, TokenDTO]] = {}
+        for chain in chains:
+            chain_id = int(OneInchQuotes.chains[chain])
+            if chain_id not in CHAIN_TOKEN_DTOs:
+                raise ValueError(f"No tokens configured for {chain}.")
+            self.configs[chain] = CHAIN_TOKEN_DTOs[chain_id]
+        self.config = {k: v for c in self.configs.values() for k, v in c.items()}
+        self.sampler = sampler if sampler else AdaptiveSampler(self.config)
+        self.rate_limit = rate_limit
+        self.max_rate_limit = max_rate_limit
+        self.quoters = {
+            chain: OneInchQuotes(
+                api_key,
+                config,
+                chain=chain,
+                rate_limit=rate_limit,
+                max_rate_limit=max_rate_limit,
+                sampler=self.sampler,
+                **kwargs,
+            )
+            for chain, config in self.configs.items()
+        }
+
+    def close(self) -> None:
+        """Close the HTTP pools of every chain."""
+        for quoter in self.quoters.values():
+            quoter.close()
+
+    def pairs(self) -> List[Pair]:
+        """
+        All pairwise permutations of the tokens of each chain,
+        alternating between chains, so that a budget split in order
+        (e.g. the cold start of a
+        :class:`src.network.scheduler.PairScheduler`) covers all.
+        """
+        per_chain = [
+            [(src, dst) for src in config for dst in config if src != dst]
+            for config in self.configs.values()
+        ]
+        return [pair for pairs in zip_longest(*per_chain) for pair in pairs if pair]
+
+    def chain(self, pair: Pair) -> str:
+        """Name of the chain of `pair`."""
+        for chain, config in self.configs.items():
+            if pair[0] in config:
+                return chain
+        raise KeyError(pair)
+
+    def trade_sizes(self, pair: Pair, calls: int | None = None) -> np.ndarray:
+        """Input amounts (base units) to quote for `pair`, on its chain."""
+        quoter = self.quoters[self.chain(pair)]
+        return quoter.trade_sizes(pair, calls or quoter.calls)
+
+    async def planned_quotes_async(
+        self,
+        plan: List[Tuple[Pair, int | None]],
+        limiter: TokenBucket | None = None,
+        on_quote: OnQuote | None = None,
+    ) -> Dict[str, List[QuoteResponse]]:
+        """
+        GET the quotes for the (pair, calls) of `plan`, which may mix
+        chains. Refer to :func:`sized_quotes_async`.
+        """
+        sizes = [(pair, self.trade_sizes(pair, calls)) for pair, calls in plan]
+        return await self.sized_quotes_async(sizes, limiter, on_quote)
+
+    async def sized_quotes_async(
+        self,
+        sizes: Sequence[Tuple[Pair, Amounts]],
+        limiter: TokenBucket | None = None,
+        on_quote: OnQuote | None = None,
+    ) -> Dict[str, List[QuoteResponse]]:
+        """
+        GET the quotes for the (pair, trade sizes in base units) of
+        `sizes`, which may mix chains, running the chains concurrently.
+        Requests are paced by `limiter`, shared by all chains; it
+        defaults to an :class:`AdaptiveRateLimiter` over `rate_limit`.
+        `on_quote` is called with each response as it arrives. Returns
+        the responses of each chain.
+        """
+        limiter = limiter or AdaptiveRateLimiter(
+            self.rate_limit, max_rate=self.max_rate_limit
+        )
+        chain_sizes: Dict[str, List[Tuple[Pair, Amounts]]] = {
+            chain: [] for chain in self.quoters
+        }
+        for pair, amounts in sizes:
+            chain_sizes[self.chain(pair)].append((pair, amounts))
+        results = await asyncio.gather(
+            *[
+                self.quoters[chain].sized_quotes_async(chain_plan, limiter, on_quote)
+                for chain, chain_plan in chain_sizes.items()
+            ]
+        )
+        for chain, responses in zip(chain_sizes, results):
+            logger.info("Fetched %d quotes on %s.", len(responses), chain)
+        return dict(zip(chain_sizes, results))
+
+    def to_df(self, responses: Dict[str, List[QuoteResponse]]) -> pd.DataFrame:
+        """Dump the responses of each chain into one pd.DataFrame."""
+        frames = [
+            self.quoters[chain].to_df(chain_responses)
+            for chain, chain_responses in responses.items()
+            if chain_responses
+        ]
+        if not frames:
+            return next(iter(self.quoters.values())).to_df([])
+        return pd.concat(frames, ignore_index=True)
@@ -1,33 +1,87 @@
 """
 Provides the `OneInchQuotes` class to 
-fetch quotes from the 1inch API, and the `QuoteResponse` class
-to store the response data.
+fetch quotes from the 1inch API, the `QuoteResponse` class
+to store the response data, and the `QuoteBatch` class
+to collect many responses column-wise.
 """
+import asyncio
 import json
 import time
+import uuid
+from array import array
 from datetime import datetime
 from dataclasses import dataclass
 from itertools import permutations
-from typing import List, Dict, Any
+from types import TracebackType
+from typing import Callable, Iterable, List, Dict, Any, Sequence, Tuple, Type
+import aiohttp
 import requests as req
 import pandas as pd
 import numpy as np
+import pyarrow as pa
 from tenacity import (
+    RetryCallState,
     retry,
     stop_after_attempt,
     wait_exponential,
-    retry_if_exception_type,
+    retry_if_exception,
 )
 from ..data_transfer_objects import TokenDTO
 from ..logging import get_logger
+from .ratelimit import TokenBucket, AdaptiveRateLimiter, parse_retry_after
+from .sampling import AdaptiveSampler, price_impacts
+from .timing import LatencyStats, TimedHTTPAdapter, pop_connect_time, trace_config
 
 MAX_RETRIES = 3
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
 
 logger = get_logger(__name__)
 
+_backoff = wait_exponential(multiplier=1, min=1, max=20)
+
+
+def dumps_column(values: Sequence[Any]) -> List[str]:
+    """
+    Compact JSON of each of `values`, e.g. the routes of a batch of
+    quotes, encoded in one call of the C encoder: the values are
+    joined by a random separator string, which the output is split
+    on. Should a value happen to contain it, each is encoded alone.
+    """
+    sep = uuid.uuid4().hex
+    items: List[Any] = [sep] * (2 * len(values) - 1)
+    items[::2] = values
+    parts = json.dumps(items, separators=(",", ":"))[1:-1].split(f',"{sep}",')
+    if len(parts) != len(values):
+        return [json.dumps(value, separators=(",", ":")) for value in values]
+    return parts
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Whether a failed request is worth retrying: rate limits (429),
+    server errors (5xx) and connection failures. Other 4xx errors
+    (e.g. a 400 for a bad amount) will not succeed on retry.
+    """
+    if isinstance(exc, req.HTTPError):
+        return (
+            exc.response is not None and exc.response.status_code in RETRYABLE_STATUSES
+        )
+    return isinstance(exc, (req.ConnectionError, req.Timeout))
+
+
+def wait_retry_after(retry_state: RetryCallState) -> float:
+    """Exponential backoff, extended to honor the `Retry-After` header."""
+    delay = _backoff(retry_state)
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    if isinstance(exc, req.HTTPError) and exc.response is not None:
+        retry_after = parse_retry_after(exc.response.headers.get("Retry-After"))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+    return delay
+
 
 # pylint: disable=too-many-instance-attributes
-@dataclass
+@dataclass(slots=True)
 class QuoteResponse:
     """Store 1inch quote response."""
 
@@ -57,26 +111,118 @@ class QuoteResponse:
         self.protocols = res["protocols"]
         # Cost of buying 1 unit of dst token using src token
 
+
+# Trade sizes of a pair, in base units.
+Amounts = Sequence[float] | np.ndarray
+
+# Callback for each quote of a round, as it arrives: (pair, response).
+OnQuote = Callable[[tuple, QuoteResponse], None]
+
+
+class QuoteBatch:
+    """
+    Column-wise store of many quote responses.
+
+    Responses are appended as they arrive. Token addresses are
+    dictionary-encoded into integer codes; codes, gas, price and
+    timestamps are kept in contiguous typed arrays. Amounts can
+    exceed 64 bits, so they are kept as Python ints.
+    """
+
+    def __init__(self) -> None:
+        self.tokens: List[str] = []  # code -> address
+        self.codes: Dict[str, int] = {}  # address -> code
+        self.src = array("i")
+        self.dst = array("i")
+        self.in_amount: List[int] = []
+        self.out_amount: List[int] = []
+        self.gas = array("q")
+        self.price = array("d")
+        self.timestamp = array("q")
+        self.protocols: List[list] = []
+
+    @classmethod
+    def from_responses(cls, responses: Iterable[QuoteResponse]) -> "QuoteBatch":
+        """Build a batch from quote responses."""
+        batch = cls()
+        batch.extend(responses)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def code(self, address: str) -> int:
+        """Integer code for a token address, added if unseen."""
+        code = self.codes.get(address)
+        if code is None:
+            code = self.codes[address] = len(self.tokens)
+            self.tokens.append(address)
+        return code
+
+    def append(self, res: QuoteResponse) -> None:
+        """Append one quote response."""
+        self.src.append(self.code(res.src))
+        self.dst.append(self.code(res.dst))
+        self.in_amount.append(res.in_amount)
+        self.out_amount.append(res.out_amount)
+        self.gas.append(res.gas)
+        self.price.append(res.price)
+        self.timestamp.append(res.timestamp)
+        self.protocols.append(res.protocols)
+
+    def extend(self, responses: Iterable[QuoteResponse]) -> None:
+        """Append many quote responses."""
+        for res in responses:
+            self.append(res)
+
+    def _tokens(self, codes: array) -> pd.Categorical:
+        """Decode token codes without materializing one string per row."""
+        return pd.Categorical.from_codes(
+            np.frombuffer(codes, dtype=np.int32), categories=self.tokens
+        )
+
     def to_df(self) -> pd.DataFrame:
         """
-        Note
-        ----
-        Dumps protocols field into a JSON string. Is there
-        a better approach?
+        Quotes as a DataFrame, ready for
+        :func:`src.db.datahandler.DataHandler.insert_quotes`. `src`
+        and `dst` are categoricals over the token addresses, and
+        `protocols` the routes as JSON strings.
         """
         return pd.DataFrame(
-            [
-                {
-                    "src": self.src,
-                    "dst": self.dst,
-                    "in_amount": self.in_amount,
-                    "out_amount": self.out_amount,
-                    "gas": self.gas,
-                    "price": self.price,
-                    "protocols": json.dumps(self.protocols),
-                    "timestamp": self.timestamp,
-                }
-            ]
+            {
+                "src": self._tokens(self.src),
+                "dst": self._tokens(self.dst),
+                "in_amount": np.array(self.in_amount, dtype=object),
+                "out_amount": np.array(self.out_amount, dtype=object),
+                "gas": np.frombuffer(self.gas, dtype=np.int64),
+                "price": np.frombuffer(self.price, dtype=np.float64),
+                "protocols": dumps_column(self.protocols),
+                "timestamp": np.frombuffer(self.timestamp, dtype=np.int64),
+            }
+        )
+
+    def to_arrow(self) -> pa.Table:
+        """
+        Quotes as an Arrow table. `src` and `dst` are dictionary
+        arrays over the token addresses and amounts are decimals.
+        """
+        tokens = pa.array(self.tokens, type=pa.string())
+        amount = pa.decimal128(38, 0)
+        return pa.table(
+            {
+                "src": pa.DictionaryArray.from_arrays(
+                    np.frombuffer(self.src, dtype=np.int32), tokens
+                ),
+                "dst": pa.DictionaryArray.from_arrays(
+                    np.frombuffer(self.dst, dtype=np.int32), tokens
+                ),
+                "in_amount": pa.array(self.in_amount, type=amount),
+                "out_amount": pa.array(self.out_amount, type=amount),
+                "gas": np.frombuffer(self.gas, dtype=np.int64),
+                "price": np.frombuffer(self.price, dtype=np.float64),
+                "protocols": dumps_column(self.protocols),
+                "timestamp": np.frombuffer(self.timestamp, dtype=np.int64),
+            }
         )
 
 
@@ -108,23 +254,78 @@ class OneInchQuotes:
         "zksync": "324",
     }
 
+    # pylint: disable=too-many-arguments
     def __init__(
         self,
         api_key: str,
         config: Dict[str, TokenDTO],
         chain: str = "ethereum",
         calls: int = 20,
+        rate_limit: float = 1.0,
+        max_rate_limit: float | None = None,
+        pool_size: int = 10,
+        base_url: str | None = None,
+        sampler: AdaptiveSampler | None = None,
     ):
         """
         Note
         ----
         The config file should be a dictionary of TokenDTO objects, where
         the key is the token address.
+
+        `rate_limit` is the initial requests per second used to pace
+        :func:`all_quotes_async`; the rate adapts to 429/5xx responses
+        up to `max_rate_limit` (twice `rate_limit` if None).
+
+        The client owns long-lived HTTP pools (a `requests.Session` for
+        sync calls, an `aiohttp` session per async round) so connections
+        are kept alive across requests. `pool_size` caps the number of
+        open connections. `base_url` overrides the 1inch endpoint
+        (e.g. to point at a local stub server).
+
+        Per-request latency, split into connect time and time-to-first-byte,
+        is collected in `self.latency`.
+
+        Trade sizes are chosen by `sampler`, which learns from each
+        round of quotes; pass one primed with
+        :func:`AdaptiveSampler.from_quotes` to start from the last
+        rounds in the database.
         """
         self.chain_id = self.chains[chain]
         self.api_key = api_key
         self.calls = calls  # default number of calls to construct curve
         self.config = config
+        self.rate_limit = rate_limit
+        self.max_rate_limit = max_rate_limit
+        self.pool_size = pool_size
+        if base_url:
+            self.base_url = base_url
+        self.sampler = sampler if sampler else AdaptiveSampler(config)
+        self.latency = LatencyStats()
+        self.session = req.Session()
+        self.session.headers.update(self.header)
+        adapter = TimedHTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        """Close the pooled HTTP session."""
+        self.session.close()
+
+    def __enter__(self) -> "OneInchQuotes":
+        """Enter OneInchQuotes context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Exit OneInchQuotes context manager."""
+        self.close()
 
     @property
     def quote_url(self) -> str:
@@ -143,59 +344,127 @@ class OneInchQuotes:
 
     def protocols(self) -> dict:
         """GET 1inch protocols."""
-        res = req.get(self.protocols_url, headers=self.header, timeout=15)
+        res = self.session.get(self.protocols_url, timeout=15)
         return res.json()
 
-    @retry(
-        stop=stop_after_attempt(MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=1, max=20),
-        retry=retry_if_exception_type(req.HTTPError),
-    )
-    def quote(self, in_token: str, out_token: str, in_amount: int) -> QuoteResponse:
-        """GET a quote from 1inch API. Retry if rate limit error."""
-        params: Dict[str, Any] = {
+    @staticmethod
+    def quote_params(in_token: str, out_token: str, in_amount: int) -> Dict[str, Any]:
+        """Query parameters for a 1inch quote request."""
+        return {
             "src": in_token,
             "dst": out_token,
             "amount": str(in_amount),
-            "includeGas": True,
-            "includeTokensInfo": True,
-            "includeProtocols": True,
+            "includeGas": "true",
+            "includeTokensInfo": "true",
+            "includeProtocols": "true",
         }
-        res = req.get(self.quote_url, params=params, headers=self.header, timeout=15)
-        res.raise_for_status()  # retry if rate limit error
+
+    @retry(
+        stop=stop_after_attempt(MAX_RETRIES),
+        wait=wait_retry_after,
+        retry=retry_if_exception(is_retryable),
+        reraise=True,
+    )
+    def quote(self, in_token: str, out_token: str, in_amount: int) -> QuoteResponse:
+        """
+        GET a quote from 1inch API. Retry if rate limit or server error,
+        honoring `Retry-After`. Other errors are raised immediately.
+        """
+        params = self.quote_params(in_token, out_token, in_amount)
+        pop_connect_time()
+        res = self.session.get(self.quote_url, params=params, timeout=15)
+        connect = pop_connect_time()
+        # `elapsed` runs from sending the request to parsing the headers.
+        self.latency.record(connect, res.elapsed.total_seconds() - connect)
+        res.raise_for_status()
         ts = int(datetime.now().timestamp())
         return QuoteResponse(res.json(), in_amount, ts)
 
+    async def quote_async(
+        self,
+        session: aiohttp.ClientSession,
+        limiter: TokenBucket,
+        in_token: str,
+        out_token: str,
+        in_amount: int,
+    ) -> QuoteResponse:
+        """
+        GET a quote from 1inch API using a shared `aiohttp` session.
+
+        Waits on `limiter` before each attempt and reports the outcome
+        back to it. Rate limit (429) and server (5xx) errors, connection
+        failures and timeouts are retried after backing off the limiter,
+        honoring `Retry-After`. Other errors are raised immediately.
+        """
+        params = self.quote_params(in_token, out_token, in_amount)
+        attempt = 0
+        while True:
+            attempt += 1
+            await limiter.acquire()
+            try:
+                async with session.get(self.quote_url, params=params) as res:
+                    if res.status in RETRYABLE_STATUSES:
+                        limiter.on_throttle(
+                            parse_retry_after(res.headers.get("Retry-After"))
+                        )
+                        if attempt < MAX_RETRIES:
+                            logger.debug("Throttled (%d), retrying.", res.status)
+                            continue
+                    res.raise_for_status()
+                    ts = int(datetime.now().timestamp())
+                    limiter.on_success()
+                    return QuoteResponse(await res.json(), in_amount, ts)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                # Like a 5xx, a sign of overload: slow down every request.
+                limiter.on_throttle()
+                if attempt >= MAX_RETRIES:
+                    raise
+
+    def trade_sizes(self, pair: tuple, calls: int) -> np.ndarray:
+        """
+        Input amounts (in token units with decimals) to quote for `pair`.
+        Refer to :class:`src.network.sampling.AdaptiveSampler`.
+        """
+        in_amounts = self.sampler.trade_sizes(pair, calls)
+        return in_amounts * 10 ** self.config[pair[0]].decimals
+
+    def observe(self, pair: tuple, responses: List[QuoteResponse]) -> None:
+        """Feed a round of quotes for `pair` back to the sampler."""
+        if not responses:
+            return
+        sizes = np.array([res.in_amount for res in responses], dtype=np.float64)
+        self.sampler.observe(
+            pair,
+            sizes / 10 ** self.config[pair[0]].decimals,
+            price_impacts([res.price for res in responses]),
+        )
+
     def quotes_for_pair(
         self, pair: tuple, calls: int | None = None
     ) -> List[QuoteResponse]:
         """
-        GET quotes for a pair of tokens using the specified amount
-        range in the config. The number of calls is specified by
-        the `calls` parameter. If `calls` is None, use the default
-        number of calls. Calls are spaced logarithmically between
-        the min and max trade sizes.
+        GET quotes for a pair of tokens. The number of calls is
+        specified by the `calls` parameter. If `calls` is None, use
+        the default number of calls. Trade sizes are chosen by
+        `self.sampler` from the previous rounds of the pair (spaced
+        logarithmically within the config's bounds for the first one).
         """
         calls = calls if calls else self.calls  # default to self.calls
         in_token, out_token = pair
-        in_amounts = np.geomspace(
-            self.config[in_token].min_trade_size,
-            self.config[in_token].max_trade_size,
-            calls,
-        )
-        # add some noise to get a more complete distribution
-        noise = 1 + np.random.uniform(-0.5, 0.5, calls)
-        in_amounts *= noise
-        in_amounts *= 10 ** self.config[in_token].decimals
+        in_amounts = self.trade_sizes(pair, calls)
         responses = []
         for in_amount in in_amounts:
-            res = self.quote(
-                self.config[in_token].address,
-                self.config[out_token].address,
-                int(in_amount),
-            )
-            responses.append(res)
+            try:
+                res = self.quote(
+                    self.config[in_token].address,
+                    self.config[out_token].address,
+                    int(in_amount),
+                )
+                responses.append(res)
+            except req.RequestException as e:
+                logger.warning("Skipping %s quote for %d: %s", pair, in_amount, e)
             time.sleep(2)  # Avoid rate limit
+        self.observe(pair, responses)
         return responses
 
     def all_quotes(
@@ -209,13 +478,153 @@ class OneInchQuotes:
             logger.info("Fetching: %s... %d/%d", pair, i + 1, n)
             responses.extend(self.quotes_for_pair(pair, calls=calls))
             time.sleep(2)  # Avoid rate limit
+        logger.info("Latency: %s", self.latency.summary())
+        return responses
+
+    # pylint: disable=too-many-arguments
+    async def quotes_for_pair_async(
+        self,
+        session: aiohttp.ClientSession,
+        limiter: TokenBucket,
+        pair: tuple,
+        calls: int | None = None,
+        in_amounts: Amounts | None = None,
+        on_quote: OnQuote | None = None,
+    ) -> List[QuoteResponse]:
+        """
+        Async version of :func:`quotes_for_pair`. All calls for the
+        pair are issued concurrently; pacing is left to `limiter`.
+        Quotes that fail, after retries or with a malformed response,
+        are logged and skipped.
+
+        `in_amounts` (base units) overrides the trade sizes chosen by
+        the sampler. `on_quote` is called with the pair and each
+        response as soon as it arrives.
+        """
+        calls = calls if calls else self.calls  # default to self.calls
+        in_token, out_token = pair
+        amounts = self.trade_sizes(pair, calls) if in_amounts is None else in_amounts
+
+        async def fetch(in_amount: float) -> QuoteResponse:
+            res = await self.quote_async(
+                session,
+                limiter,
+                self.config[in_token].address,
+                self.config[out_token].address,
+                int(in_amount),
+            )
+            if on_quote:
+                on_quote(pair, res)
+            return res
+
+        results = await asyncio.gather(
+            *[fetch(in_amount) for in_amount in amounts],
+            return_exceptions=True,
+        )
+        responses = []
+        for in_amount, res in zip(amounts, results):
+            if isinstance(res, QuoteResponse):
+                responses.append(res)
+            elif isinstance(res, Exception):
+                logger.warning("Skipping %s quote for %d: %r", pair, in_amount, res)
+            else:
+                raise res  # e.g. cancelled
+        self.observe(pair, responses)
         return responses
 
+    def client_session(self) -> aiohttp.ClientSession:
+        """
+        Pooled `aiohttp` session for async requests to the 1inch API.
+        Connections are kept alive between requests and their latency
+        is recorded in `self.latency`.
+        """
+        return aiohttp.ClientSession(
+            headers=self.header,
+            connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=15),
+            trace_configs=[trace_config(self.latency)],
+        )
+
+    async def all_quotes_async(
+        self,
+        tokens: List[str],
+        calls: int | None = None,
+        limiter: TokenBucket | None = None,
+    ) -> List[QuoteResponse]:
+        """
+        GET the quotes for all pairs of the input tokens concurrently.
+        Refer to :func:`planned_quotes_async`.
+        """
+        pairs = list(permutations(tokens, 2))
+        return await self.planned_quotes_async(
+            [(pair, calls) for pair in pairs], limiter
+        )
+
+    async def planned_quotes_async(
+        self,
+        plan: List[Tuple[tuple, int | None]],
+        limiter: TokenBucket | None = None,
+        on_quote: OnQuote | None = None,
+    ) -> List[QuoteResponse]:
+        """
+        GET the quotes for the (pair, calls) of `plan` concurrently,
+        e.g. as planned by :func:`src.network.scheduler.PairScheduler.plan`.
+        Refer to :func:`sized_quotes_async`.
+        """
+        sizes = [
+            (pair, self.trade_sizes(pair, calls or self.calls)) for pair, calls in plan
+        ]
+        return await self.sized_quotes_async(sizes, limiter, on_quote)
+
+    async def sized_quotes_async(
+        self,
+        sizes: Sequence[Tuple[tuple, Amounts]],
+        limiter: TokenBucket | None = None,
+        on_quote: OnQuote | None = None,
+    ) -> List[QuoteResponse]:
+        """
+        GET the quotes for the (pair, trade sizes in base units) of
+        `sizes` concurrently.
+
+        Requests share one pooled HTTP session and are paced by
+        `limiter`. It defaults to an :class:`AdaptiveRateLimiter` starting
+        at `self.rate_limit` requests per second, which backs off on
+        429/5xx responses and ramps up towards `self.max_rate_limit`.
+        `on_quote` is called with the pair and each response as soon
+        as it arrives.
+        """
+        limiter = (
+            limiter
+            if limiter
+            else AdaptiveRateLimiter(self.rate_limit, max_rate=self.max_rate_limit)
+        )
+        n = len(sizes)
+        done = 0
+
+        async def fetch(
+            session: aiohttp.ClientSession, pair: tuple, in_amounts: Amounts
+        ) -> List[QuoteResponse]:
+            nonlocal done
+            responses = await self.quotes_for_pair_async(
+                session, limiter, pair, in_amounts=in_amounts, on_quote=on_quote
+            )
+            done += 1
+            logger.info("Fetched: %s... %d/%d", pair, done, n)
+            return responses
+
+        async with self.client_session() as session:
+            results = await asyncio.gather(
+                *[fetch(session, pair, in_amounts) for pair, in_amounts in sizes]
+            )
+        logger.info("Latency: %s", self.latency.summary())
+        return [res for responses in results for res in responses]
+
     def to_df(
         self, responses: List[QuoteResponse], fn: str | None = None
     ) -> pd.DataFrame:
-        """Dump quote responses into a pd.DataFrame"""
-        df = pd.concat([res.to_df() for res in responses])
+        """Dump quote responses into a pd.DataFrame, tagged with our chain id."""
+        df = QuoteBatch.from_responses(responses).to_df()
+        df["chain_id"] = int(self.chain_id)
         if fn:
             df.to_csv(fn, index=False)
         return df
@@ -0,0 +1,172 @@
+"""
+Provides rate limiters for pacing requests to the 1inch API.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a `Retry-After` header into a delay in seconds.
+    The header is either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    An asyncio token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second, up to
+    `capacity`. Each request consumes one token, and
+    :func:`acquire` sleeps until a token is available.
+    Waiters are served in FIFO order.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """
+        Parameters
+        ----------
+        rate : float
+            Sustained requests per second allowed by our API tier.
+        capacity : float | None, default=None
+            Maximum burst size. Defaults to one second worth of tokens
+            (at least one token).
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity if capacity else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available, then consume it."""
+        async with self._lock:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self) -> None:
+        """Record a successful request. No-op for a fixed rate."""
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        """
+        Record a throttled (429/5xx) request. Drain the bucket and,
+        if the server sent a `Retry-After`, pause all requests until
+        it has elapsed.
+        """
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        if retry_after:
+            self.paused_until = max(self.paused_until, self.updated + retry_after)
+
+
+# pylint: disable=too-many-instance-attributes
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    A token bucket whose rate adapts to the provider's feedback
+    (additive increase, multiplicative decrease).
+
+    A throttled response multiplies the rate by `backoff`
+    (down to `min_rate`). Throttles within `cooldown` seconds of the
+    last decrease are from requests already in flight and do not
+    decrease the rate again. After `ramp_after` consecutive successes
+    the rate grows by `increase` requests per second (up to `max_rate`).
+    Shared by all requests in a round, this settles close to the
+    provider's real ceiling.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float = 0.1,
+        max_rate: float | None = None,
+        backoff: float = 0.5,
+        increase: float = 0.1,
+        ramp_after: int = 20,
+        cooldown: float = 1.0,
+        capacity: float | None = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        rate : float
+            Initial requests per second.
+        min_rate : float, default=0.1
+            Floor for the rate after repeated throttling.
+        max_rate : float | None, default=None
+            Ceiling for the rate. Defaults to twice the initial rate.
+        backoff : float, default=0.5
+            Multiplicative decrease applied on each throttle.
+        increase : float, default=0.1
+            Additive increase (requests per second) after a run of successes.
+        ramp_after : int, default=20
+            Number of consecutive successes before increasing the rate.
+        cooldown : float, default=1.0
+            Minimum seconds between two multiplicative decreases.
+        capacity : float | None, default=None
+            Maximum burst size, see :class:`TokenBucket`.
+        """
+        super().__init__(rate, capacity)
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max_rate if max_rate else 2 * rate
+        self.backoff = backoff
+        self.increase = increase
+        self.ramp_after = ramp_after
+        self.cooldown = cooldown
+        self.last_backoff = float("-inf")
+        self.successes = 0
+        self.throttles = 0
+
+    def on_success(self) -> None:
+        """Count a success and ramp the rate up after a run of them."""
+        self.successes += 1
+        if self.successes >= self.ramp_after:
+            self.successes = 0
+            self._set_rate(self.rate + self.increase)
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        """Back off the rate, then drain and pause as in :class:`TokenBucket`."""
+        self.successes = 0
+        self.throttles += 1
+        now = time.monotonic()
+        if now - self.last_backoff >= self.cooldown:
+            self.last_backoff = now
+            self._set_rate(self.rate * self.backoff)
+        super().on_throttle(retry_after)
+
+    def _set_rate(self, rate: float) -> None:
+        """Update the rate, clamped to [min_rate, max_rate]."""
+        self._refill()  # accrue tokens at the old rate first
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
@@ -0,0 +1,197 @@
+"""
+Provides the `AdaptiveSampler` class, which chooses the trade
+sizes to quote for each pair from its previous rounds.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from ..data_transfer_objects import TokenDTO
+
+Pair = Tuple[str, str]
+Round = Tuple[np.ndarray, np.ndarray]  # (trade sizes, price impacts)
+
+
+def price_impacts(prices: Sequence[float]) -> np.ndarray:
+    """Price impact of each quote of a round, relative to its best price."""
+    values = np.asarray(prices, dtype=np.float64)
+    return (values.max() - values) / values.max()
+
+
+# pylint: disable=too-many-instance-attributes
+class AdaptiveSampler:
+    """
+    Chooses the trade sizes (in token units) to quote for each pair.
+
+    A pair without history is sampled logarithmically between the
+    `min_trade_size` and `max_trade_size` of its `TokenDTO`, with
+    multiplicative noise. Once rounds of the pair have been observed:
+
+    - The bounds follow its liquidity. The lower bound is the largest
+      size whose impact stayed under `flat_impact`: smaller trades only
+      repeat the reference price. The upper bound is the smallest size
+      whose impact reached `max_impact`, or `growth` times the largest
+      size quoted if none did. Bounds stay within `max_scale` of the
+      `TokenDTO` bounds.
+    - Both bounds are always quoted. The other calls are drawn from a
+      density over log trade size proportional to the curvature of the
+      last rounds' curve plus the scatter of their quotes around it
+      (uncertainty), plus an `explore` floor. Draws are stratified and
+      jittered, so each round probes new sizes.
+
+    This spends few calls on the flat part of stable pairs and more on
+    the knee, so fewer calls (e.g. a quick round during busy hours)
+    still resolve the curve.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        config: Dict[str, TokenDTO],
+        flat_impact: float = 1e-4,
+        max_impact: float = 0.5,
+        growth: float = 2.0,
+        max_scale: float = 100.0,
+        explore: float = 0.2,
+        history: int = 3,
+        grid: int = 64,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        config : Dict[str, TokenDTO]
+            Tokens by address, for their decimals and initial bounds.
+        flat_impact : float, default=1e-4
+            Impact below which the curve is considered flat.
+        max_impact : float, default=0.5
+            Impact beyond which larger trades are not quoted.
+        growth : float, default=2.0
+            Factor by which bounds extend past the sizes quoted.
+        max_scale : float, default=100.0
+            Bounds stay within this factor of the `TokenDTO` bounds.
+        explore : float, default=0.2
+            Share of the density spread uniformly over log size.
+        history : int, default=3
+            Number of past rounds per pair the curve is estimated from.
+        grid : int, default=64
+            Resolution of the density over log size.
+        """
+        self.config = config
+        self.flat_impact = flat_impact
+        self.max_impact = max_impact
+        self.growth = growth
+        self.max_scale = max_scale
+        self.explore = explore
+        self.grid = grid
+        self.history = history
+        self.rounds: Dict[Pair, Deque[Round]] = {}
+        self.rng = np.random.default_rng()
+
+    @classmethod
+    def from_quotes(
+        cls, config: Dict[str, TokenDTO], quotes: pd.DataFrame, **kwargs: Any
+    ) -> "AdaptiveSampler":
+        """
+        Sampler primed with the rounds of processed `quotes`, indexed
+        by (src, dst) with the `in_amount`, `price_impact` and
+        `timestamp` columns, as returned by
+        :func:`src.db.datahandler.DataHandler.get_quotes`.
+        """
+        sampler = cls(config, **kwargs)
+        if quotes.empty:
+            return sampler
+        quotes = quotes.reset_index()
+        quotes["hour"] = quotes["timestamp"] // 3600
+        for (src, dst, _), round_ in quotes.groupby(["src", "dst", "hour"]):
+            if src not in config:
+                continue
+            sizes = round_["in_amount"].to_numpy(dtype=np.float64)
+            sampler.observe(
+                (src, dst),
+                sizes / 10 ** config[src].decimals,
+                round_["price_impact"].to_numpy(dtype=np.float64),
+            )
+        return sampler
+
+    def observe(self, pair: Pair, sizes: np.ndarray, impacts: np.ndarray) -> None:
+        """Record a round of `pair`: trade sizes (token units) and impacts."""
+        keep = (sizes > 0) & np.isfinite(impacts)
+        if keep.any():
+            rounds = self.rounds.setdefault(pair, deque(maxlen=self.history))
+            rounds.append((sizes[keep], impacts[keep]))
+
+    def _curve(self, pair: Pair) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Log sizes, impacts and monotone impact curve of the pair's
+        recent quotes, sorted by size.
+        """
+        sizes = np.concatenate([s for s, _ in self.rounds[pair]])
+        impacts = np.concatenate([i for _, i in self.rounds[pair]])
+        order = np.argsort(sizes)
+        x, y = np.log(sizes[order]), impacts[order]
+        # Impact does not decrease with size: smooth the scatter into
+        # the average of its running upper and lower envelopes.
+        curve = (np.maximum.accumulate(y) + np.minimum.accumulate(y[::-1])[::-1]) / 2
+        return x, y, curve
+
+    def bounds(self, pair: Pair) -> Tuple[float, float]:
+        """Smallest and largest trade sizes (token units) to quote."""
+        token = self.config[pair[0]]
+        lo, hi = token.min_trade_size, token.max_trade_size
+        if pair not in self.rounds:
+            return lo, hi
+        x, _, curve = self._curve(pair)
+        sizes = np.exp(x)
+        flat = curve <= self.flat_impact
+        new_lo = sizes[flat][-1] if flat.any() else sizes[0] / self.growth
+        steep = curve >= self.max_impact
+        new_hi = sizes[steep][0] if steep.any() else sizes[-1] * self.growth
+        new_lo = float(np.clip(new_lo, lo / self.max_scale, lo * self.max_scale))
+        new_hi = float(np.clip(new_hi, hi / self.max_scale, hi * self.max_scale))
+        return new_lo, max(new_hi, 10 * new_lo)
+
+    def density(
+        self, pair: Pair, lo: float, hi: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sampling density over log size in [lo, hi]: the edges of
+        `grid` cells and the weight of each cell (summing to 1).
+        """
+        edges = np.linspace(np.log(lo), np.log(hi), self.grid + 1)
+        weight = np.full(self.grid, self.explore / self.grid)
+        if pair not in self.rounds:
+            return edges, np.full(self.grid, 1 / self.grid)
+        x, y, curve = self._curve(pair)
+        # Curvature of the curve over log size.
+        smooth = np.interp((edges[1:] + edges[:-1]) / 2, x, curve)
+        bend = np.abs(np.gradient(np.gradient(smooth)))
+        # Scatter of the quotes around it, per cell. Cells without
+        # quotes take the largest scatter, so they get explored.
+        cell = np.clip(np.searchsorted(edges, x) - 1, 0, self.grid - 1)
+        counts = np.bincount(cell, minlength=self.grid)
+        scatter = np.divide(
+            np.bincount(cell, np.abs(y - curve), minlength=self.grid),
+            counts,
+            out=np.zeros(self.grid),
+            where=counts > 0,
+        )
+        scatter[counts == 0] = scatter.max()
+        for term in (bend, scatter):
+            if term.sum() > 0:
+                weight += (1 - self.explore) / 2 * term / term.sum()
+        return edges, weight / weight.sum()
+
+    def trade_sizes(self, pair: Pair, calls: int) -> np.ndarray:
+        """Trade sizes (token units) for the next `calls` quotes of `pair`."""
+        lo, hi = self.bounds(pair)
+        if pair not in self.rounds:
+            sizes = np.geomspace(lo, hi, calls)
+            # add some noise to get a more complete distribution
+            return sizes * (1 + self.rng.uniform(-0.5, 0.5, calls))
+        if calls <= 2:
+            return np.array([lo, hi][:calls])
+        edges, weight = self.density(pair, lo, hi)
+        cdf = np.concatenate([[0], np.cumsum(weight)])
+        strata = (np.arange(calls - 2) + self.rng.random(calls - 2)) / (calls - 2)
+        inner = np.exp(np.interp(strata, cdf, edges))
+        return np.concatenate([[lo], inner, [hi]])
@@ -0,0 +1,198 @@
+"""
+Provides the `PairScheduler` class, which decides which pairs
+to quote in each round, within a request budget.
+"""
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from itertools import permutations
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+from .sampling import Pair, price_impacts
+
+HOUR = 3600
+
+
+@dataclass
+class PairState:
+    """Refresh state of a pair."""
+
+    last: int | None = None  # timestamp of the last round
+    cadence: int = HOUR  # seconds between rounds
+    volatility: float | None = None  # impact change per hour
+    sizes: List[float] = field(default_factory=list)  # last round's curve
+    impacts: List[float] = field(default_factory=list)
+
+
+def curve_change(
+    sizes: np.ndarray,
+    impacts: np.ndarray,
+    new_sizes: np.ndarray,
+    new_impacts: np.ndarray,
+) -> float:
+    """
+    Mean absolute change in price impact between two rounds' curves,
+    compared over the trade sizes of the new round.
+    """
+    old = np.argsort(sizes)
+    new = np.argsort(new_sizes)
+    x = np.log(new_sizes[new])
+    before = np.interp(x, np.log(sizes[old]), impacts[old])
+    return float(np.mean(np.abs(new_impacts[new] - before)))
+
+
+# pylint: disable=too-many-instance-attributes
+class PairScheduler:
+    """
+    Keeps a refresh cadence per pair and picks the pairs to quote
+    in each round, most valuable first, within a request budget.
+
+    A pair's cadence is the time its curve takes to move by
+    `tolerance` (mean absolute price impact), estimated from the
+    change between its last rounds (an exponential moving average
+    of the change per hour), clamped to [`min_cadence`,
+    `max_cadence`]. Stable pairs are thus refreshed every few hours
+    and volatile ones every round.
+
+    The priority of a pair is its staleness over its cadence: 1 when
+    it is due. Pairs never quoted come first. :func:`plan` fills the
+    budget in order of priority, down to `min_priority`, so the cost
+    of a round is capped by the budget however many tokens are added.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        pairs: Iterable[Pair],
+        calls: int = 20,
+        min_calls: int = 5,
+        tolerance: float = 1e-3,
+        min_cadence: int = HOUR,
+        max_cadence: int = 24 * HOUR,
+        smoothing: float = 0.3,
+        min_priority: float = 0.9,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        pairs : Iterable[Pair]
+            The (src, dst) pairs to schedule.
+        calls : int, default=20
+            Calls per pair per round.
+        min_calls : int, default=5
+            A pair is not quoted with fewer calls than this when the
+            budget runs out.
+        tolerance : float, default=1e-3
+            Change in price impact a pair's cadence allows for.
+        min_cadence, max_cadence : int, default=1 hour, 24 hours
+            Bounds of the cadences, in seconds.
+        smoothing : float, default=0.3
+            Weight of the latest round in the volatility average.
+        min_priority : float, default=0.9
+            Pairs less than this far into their cadence are not quoted
+            ahead of time, even if the budget allows. Slightly under 1,
+            so hourly rounds that start a bit early still quote the
+            pairs due.
+        """
+        self.calls = calls
+        self.min_calls = min_calls
+        self.tolerance = tolerance
+        self.min_cadence = min_cadence
+        self.max_cadence = max_cadence
+        self.smoothing = smoothing
+        self.min_priority = min_priority
+        self.pairs: Dict[Pair, PairState] = {pair: PairState() for pair in pairs}
+
+    @classmethod
+    def for_tokens(cls, tokens: List[str], **kwargs: Any) -> "PairScheduler":
+        """Scheduler over all pairwise permutations of `tokens`."""
+        return cls(((src, dst) for src, dst in permutations(tokens, 2)), **kwargs)
+
+    def priority(self, pair: Pair, now: int) -> float:
+        """Staleness of `pair` over its cadence (inf if never quoted)."""
+        state = self.pairs[pair]
+        if state.last is None:
+            return float("inf")
+        return (now - state.last) / state.cadence
+
+    def plan(self, budget: int, now: int) -> List[Tuple[Pair, int]]:
+        """
+        Pairs to quote at `now` and their number of calls, most
+        valuable first, spending at most `budget` calls.
+        """
+        ranked = sorted(self.pairs, key=lambda p: self.priority(p, now), reverse=True)
+        plan = []
+        for pair in ranked:
+            calls = min(self.calls, budget)
+            if calls < self.min_calls or self.priority(pair, now) < self.min_priority:
+                break
+            plan.append((pair, calls))
+            budget -= calls
+        return plan
+
+    def record(
+        self, pair: Pair, now: int, sizes: np.ndarray, impacts: np.ndarray
+    ) -> None:
+        """
+        Record a round of `pair` at `now`, with its trade sizes and
+        price impacts, and update its volatility and cadence.
+        """
+        state = self.pairs.setdefault(pair, PairState())
+        if state.sizes and state.last is not None and now > state.last:
+            change = curve_change(
+                np.asarray(state.sizes), np.asarray(state.impacts), sizes, impacts
+            )
+            per_hour = change / ((now - state.last) / HOUR)
+            state.volatility = (
+                per_hour
+                if state.volatility is None
+                else self.smoothing * per_hour + (1 - self.smoothing) * state.volatility
+            )
+            cadence = self.tolerance / max(state.volatility, 1e-12) * HOUR
+            cadence = int(np.clip(cadence, self.min_cadence, self.max_cadence))
+            state.cadence = cadence // HOUR * HOUR if cadence >= HOUR else cadence
+        state.last = now
+        state.sizes = [float(s) for s in sizes]
+        state.impacts = [float(i) for i in impacts]
+
+    def record_quotes(self, quotes: pd.DataFrame, now: int) -> None:
+        """
+        Record the rounds of raw `quotes` (with the `src`, `dst`,
+        `in_amount` and `price` columns), e.g. from
+        :func:`src.network.oneinch.OneInchQuotes.to_df`.
+        """
+        for (src, dst), round_ in quotes.groupby(["src", "dst"], observed=True):
+            self.record(
+                (src, dst),
+                now,
+                round_["in_amount"].to_numpy(dtype=np.float64),
+                price_impacts(round_["price"]),
+            )
+
+    def save(self, path: str) -> None:
+        """Save the state of every pair to `path` as JSON, atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        state = [
+            {"src": src, "dst": dst, **asdict(pair)}
+            for (src, dst), pair in self.pairs.items()
+        ]
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> "PairScheduler":
+        """
+        Restore the state saved by :func:`save`, for the pairs being
+        scheduled. Pairs that are no longer scheduled are dropped.
+        """
+        if not os.path.exists(path):
+            return self
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        for pair in state:
+            key = (pair.pop("src"), pair.pop("dst"))
+            if key in self.pairs:
+                self.pairs[key] = PairState(**pair)
+        return self
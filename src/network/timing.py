@@ -0,0 +1,178 @@
+"""
+Provides per-request latency tracking for the 1inch client,
+split into pool wait, connect and time-to-first-byte.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_local = threading.local()
+
+
+@dataclass
+class LatencyStats:
+    """
+    Latency samples for requests made by the 1inch client.
+
+    `connect` is the time spent opening new TCP+TLS connections
+    (zero when a pooled connection is reused), `ttfb` the time from
+    sending the request to receiving the response headers, and
+    `queued` the time spent waiting for a free connection in the pool.
+    """
+
+    connect: List[float] = field(default_factory=list)
+    ttfb: List[float] = field(default_factory=list)
+    queued: List[float] = field(default_factory=list)
+
+    def record(self, connect: float, ttfb: float, queued: float = 0.0) -> None:
+        """Record the latency split of one request."""
+        self.connect.append(connect)
+        self.ttfb.append(ttfb)
+        self.queued.append(queued)
+
+    def reset(self) -> None:
+        """Drop all samples, e.g. at the start of a round."""
+        self.connect.clear()
+        self.ttfb.clear()
+        self.queued.clear()
+
+    def summary(self) -> Dict[str, float]:
+        """Aggregate the samples, in seconds."""
+        if not self.ttfb:
+            return {"requests": 0}
+        connect = np.array(self.connect)
+        ttfb = np.array(self.ttfb)
+        return {
+            "requests": len(ttfb),
+            "connections": int((connect > 0).sum()),
+            "connect_total": float(connect.sum()),
+            "ttfb_total": float(ttfb.sum()),
+            "queued_total": float(np.sum(self.queued)),
+            "ttfb_p50": float(np.percentile(ttfb, 50)),
+            "ttfb_p95": float(np.percentile(ttfb, 95)),
+        }
+
+
+def trace_config(stats: LatencyStats) -> aiohttp.TraceConfig:
+    """
+    An `aiohttp` trace config recording the latency split
+    of every request into `stats`.
+    """
+    config = aiohttp.TraceConfig()
+
+    def now() -> float:
+        return time.perf_counter()
+
+    async def on_request_start(
+        _session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any
+    ) -> None:
+        ctx.start = now()
+        ctx.connect = 0.0
+        ctx.queued = 0.0
+
+    async def on_queued_start(
+        _session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any
+    ) -> None:
+        ctx.queued_start = now()
+
+    async def on_queued_end(
+        _session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any
+    ) -> None:
+        ctx.queued += now() - ctx.queued_start
+
+    async def on_connect_start(
+        _session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any
+    ) -> None:
+        ctx.connect_start = now()
+
+    async def on_connect_end(
+        _session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any
+    ) -> None:
+        ctx.connect += now() - ctx.connect_start
+
+    async def on_request_end(
+        _session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any
+    ) -> None:
+        # Fired once the response headers have been received.
+        ttfb = now() - ctx.start - ctx.connect - ctx.queued
+        stats.record(ctx.connect, ttfb, ctx.queued)
+
+    # aiohttp's signal annotations don't match its callback signature.
+    signals: List[Tuple[Any, Any]] = [
+        (config.on_request_start, on_request_start),
+        (config.on_connection_queued_start, on_queued_start),
+        (config.on_connection_queued_end, on_queued_end),
+        (config.on_connection_create_start, on_connect_start),
+        (config.on_connection_create_end, on_connect_end),
+        (config.on_request_end, on_request_end),
+    ]
+    for signal, callback in signals:
+        signal.append(callback)
+    return config
+
+
+@contextmanager
+def _timed_connect() -> Iterator[None]:
+    """Add the time spent in the block to this thread's connect counter."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.connect = getattr(_local, "connect", 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTP connection that records how long `connect` takes."""
+
+    def connect(self) -> None:
+        with _timed_connect():
+            super().connect()
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that records how long `connect` (incl. TLS) takes."""
+
+    def connect(self) -> None:
+        with _timed_connect():
+            super().connect()
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    A pooled `requests` adapter whose connections record their
+    connect time. Use :func:`pop_connect_time` after a request to
+    read (and reset) the connect time spent by this thread.
+    """
+
+    # pylint: disable=arguments-differ
+    def init_poolmanager(
+        self, connections: int, maxsize: int, block: bool = False, **pool_kwargs: Any
+    ) -> None:
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def pop_connect_time() -> float:
+    """Connect time accrued by this thread since the last call."""
+    connect = getattr(_local, "connect", 0.0)
+    _local.connect = 0.0
+    return connect
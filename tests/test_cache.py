@@ -0,0 +1,46 @@
+"""Tests for :class:`src.app.cache.ResponseCache`."""
+from src.app.cache import ResponseCache
+
+
+def test_hit_and_miss():
+    cache = ResponseCache()
+    assert cache.get("a") is None
+    cache.put("a", b"body", "application/json", "gzip")
+    entry = cache.get("a")
+    assert entry is not None and entry.body == b"body" and entry.encoding == "gzip"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_insert_drops_every_entry():
+    cache = ResponseCache()
+    cache.observe(7200)
+    cache.put("closed", b"x")
+    cache.observe(7200)  # nothing inserted since
+    assert cache.get("closed") is not None
+    cache.observe(10800)  # a new round
+    assert cache.get("closed") is None
+    assert cache.latest == 10800
+
+
+def test_replay_drops_every_entry():
+    cache = ResponseCache()
+    cache.observe(10800)
+    cache.put("closed", b"x")
+    cache.observe(3600)  # older quotes drained from the spool
+    assert cache.get("closed") is None
+    assert cache.latest == 10800
+
+
+def test_bounds(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=2, max_bytes=10, max_age=60)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.put("c", b"1234")  # over both bounds: evicts the oldest
+    assert cache.get("a") is None and cache.size == 8
+    cache.put("big", b"x" * 11)  # larger than the cache
+    assert cache.get("big") is None
+    now[0] = 61
+    assert cache.get("b") is None
+    assert cache.evictions == 2
@@ -0,0 +1,52 @@
+"""Tests for :class:`src.app.coalesce.SingleFlight`."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.app.coalesce import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    flights: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute() -> int:
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flights.do, "key", compute) for _ in range(8)]
+        while flights.stats()["shared"] < 7:  # all but the leader waiting
+            threading.Event().wait(0.01)
+        release.set()
+        assert [f.result() for f in futures] == [42] * 8
+    assert len(calls) == 1
+    assert flights.stats() == {"computed": 1, "shared": 7, "in_flight": 0}
+
+
+def test_errors_are_shared_and_not_kept():
+    flights: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+
+    def fail() -> int:
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(flights.do, "key", fail) for _ in range(2)]
+        while flights.stats()["shared"] < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="boom"):
+                future.result()
+    assert flights.do("key", lambda: 1) == 1  # computed again
+    assert flights.stats()["computed"] == 2
+
+
+def test_keys_are_independent():
+    flights: SingleFlight[str] = SingleFlight()
+    assert flights.do("a", lambda: "a") == "a"
+    assert flights.do("b", lambda: "b") == "b"
+    assert flights.stats()["shared"] == 0
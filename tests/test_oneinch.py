@@ -0,0 +1,153 @@
+"""Tests for :mod:`src.network.oneinch`, against a local stub of the 1inch API."""
+import asyncio
+import json
+import time
+from itertools import permutations
+from typing import Any, Awaitable, Callable, List
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.configs import TOKEN_DTOs
+from src.network.oneinch import MAX_RETRIES, OneInchQuotes, QuoteResponse, dumps_column
+from src.network.ratelimit import AdaptiveRateLimiter, TokenBucket
+
+
+def test_dumps_column():
+    routes = [[[{"name": "UNISWAP_V3", "part": 100}]], [], [[{"name": 'a","b'}]]]
+    dumped = dumps_column(routes)
+    assert dumped == [json.dumps(r, separators=(",", ":")) for r in routes]
+    assert dumps_column([]) == []
+
+
+def test_dumps_column_separator_in_values(monkeypatch):
+    monkeypatch.setattr("uuid.uuid4", lambda: type("U", (), {"hex": "sep"})())
+    routes = [["sep"], "sep", [1]]
+    assert [json.loads(r) for r in dumps_column(routes)] == routes
+
+
+class CountingLimiter(TokenBucket):
+    """A fast token bucket that counts throttles."""
+
+    def __init__(self) -> None:
+        super().__init__(rate=1000)
+        self.throttled = 0
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        self.throttled += 1
+        super().on_throttle(retry_after)
+
+
+def test_connection_errors_back_off_limiter():
+    quoter = OneInchQuotes("key", TOKEN_DTOs, base_url="http://127.0.0.1:1")
+    limiter = CountingLimiter()
+    src, dst = list(TOKEN_DTOs)[:2]
+
+    async def quote() -> None:
+        async with quoter.client_session() as session:
+            await quoter.quote_async(session, limiter, src, dst, 10**18)
+
+    with pytest.raises(aiohttp.ClientConnectionError):
+        asyncio.run(quote())
+    assert limiter.throttled == MAX_RETRIES
+
+
+class StubAPI:
+    """A local 1inch quote endpoint, failing the first requests on demand."""
+
+    def __init__(self, failures: List[str]) -> None:
+        self.failures = failures
+        self.requests = 0
+
+    async def quote(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        failure = self.failures.pop(0) if self.failures else None
+        if failure == "throttle":
+            return web.Response(status=429, headers={"Retry-After": "0.2"})
+        if failure == "disconnect":
+            assert request.transport is not None
+            request.transport.close()
+            return web.Response()
+        if failure == "malformed":
+            return web.json_response({"error": "no route"})
+        query = request.query
+        return web.json_response(
+            {
+                "fromToken": {"address": query["src"], "decimals": 18},
+                "toToken": {"address": query["dst"], "decimals": 18},
+                "toAmount": str(2 * int(query["amount"])),
+                "gas": 100_000,
+                "protocols": [[[{"name": "UNISWAP_V3", "part": 100}]]],
+            }
+        )
+
+
+def with_stub(failures: List[str], fn: Callable[[OneInchQuotes], Awaitable[Any]]):
+    """Run `fn` on a quoter pointed at a :class:`StubAPI`."""
+    stub = StubAPI(failures)
+
+    async def run() -> Any:
+        app = web.Application()
+        app.router.add_get("/swap/v5.2/1/quote", stub.quote)
+        async with TestServer(app) as server:
+            base_url = str(server.make_url("/swap"))
+            with OneInchQuotes("key", TOKEN_DTOs, calls=2, base_url=base_url) as quoter:
+                return await fn(quoter)
+
+    return asyncio.run(run()), stub
+
+
+def quote_once(limiter: TokenBucket) -> Callable[[OneInchQuotes], Awaitable[Any]]:
+    """Request one quote of the first pair through `limiter`."""
+    src, dst = list(TOKEN_DTOs)[:2]
+
+    async def fn(quoter: OneInchQuotes) -> QuoteResponse:
+        async with quoter.client_session() as session:
+            return await quoter.quote_async(session, limiter, src, dst, 10**18)
+
+    return fn
+
+
+def test_all_quotes_async():
+    tokens = list(TOKEN_DTOs)[:3]
+
+    async def fn(quoter: OneInchQuotes) -> List[QuoteResponse]:
+        return await quoter.all_quotes_async(tokens, limiter=TokenBucket(1000))
+
+    responses, stub = with_stub([], fn)
+    assert len(responses) == stub.requests == 6 * 2
+    assert {(res.src, res.dst) for res in responses} == set(permutations(tokens, 2))
+    assert all(res.price == 2.0 for res in responses)
+
+
+def test_throttle_honours_retry_after():
+    limiter = AdaptiveRateLimiter(100, cooldown=0)
+    start = time.monotonic()
+    res, stub = with_stub(["throttle"], quote_once(limiter))
+    assert time.monotonic() - start >= 0.2
+    assert res.price == 2.0 and stub.requests == 2
+    assert limiter.throttles == 1 and limiter.rate == 50
+
+
+def test_disconnect_is_retried():
+    limiter = CountingLimiter()
+    res, stub = with_stub(["disconnect"], quote_once(limiter))
+    assert res.price == 2.0 and stub.requests == 2
+    assert limiter.throttled == 1
+
+
+@pytest.mark.parametrize(
+    "failures, amounts",
+    [(["malformed"], 2), (["disconnect"] * MAX_RETRIES, 1)],
+)
+def test_failed_quotes_are_skipped(failures, amounts):
+    pair = tuple(list(TOKEN_DTOs)[:2])
+
+    async def fn(quoter: OneInchQuotes) -> List[QuoteResponse]:
+        async with quoter.client_session() as session:
+            return await quoter.quotes_for_pair_async(
+                session, TokenBucket(1000), pair, in_amounts=[10**18] * amounts
+            )
+
+    responses, _ = with_stub(failures, fn)
+    assert len(responses) == amounts - 1
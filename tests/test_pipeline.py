@@ -0,0 +1,51 @@
+"""Tests for :class:`src.collector.pipeline.QuotePipeline`."""
+import asyncio
+from types import SimpleNamespace
+import pandas as pd
+from src.collector.pipeline import QuotePipeline
+from src.collector.spool import QuoteSpool
+from src.configs import ALL_TOKEN_DTOs
+
+
+class FailingHandler:
+    """Stands in for a DataHandler whose first insert fails."""
+
+    def __init__(self) -> None:
+        self.inserts = 0
+
+    def insert_quotes(self, df: pd.DataFrame) -> None:
+        self.inserts += 1
+        if self.inserts == 1:
+            raise ConnectionError("Postgres is down")
+
+
+def test_no_inserts_after_failed_batch(tmp_path):
+    src, dst = list(ALL_TOKEN_DTOs)[:2]
+    spool = QuoteSpool(str(tmp_path), fsync=False)
+    spool.start_round(1, [((src, dst), [1, 2, 3])])
+    dh = FailingHandler()
+    quoter = SimpleNamespace(rate_limit=1.0, max_rate_limit=None)
+    pipeline = QuotePipeline(quoter, spool, dh, batch=1)  # type: ignore [arg-type]
+
+    async def write() -> None:
+        for i, amount in enumerate([1, 2, 3]):
+            record = {
+                "type": "quote",
+                "src": src,
+                "dst": dst,
+                "in_amount": amount,
+                "out_amount": amount,
+                "gas": 0,
+                "price": 1.0,
+                "protocols": [],
+                "timestamp": 1,
+            }
+            await pipeline.spooled.put((record, 100 * (i + 1), 0.0))
+        await pipeline.spooled.put(None)
+        await pipeline._write()  # pylint: disable=protected-access
+
+    asyncio.run(write())
+    assert dh.inserts == 1
+    assert pipeline.behind
+    assert pipeline.stages["write"].items == 0
+    assert "1" not in spool.offsets
@@ -0,0 +1,66 @@
+"""Tests for :func:`src.curves.fit_power_law`."""
+import numpy as np
+import pandas as pd
+import pytest
+from src.curves import CURVE_COLS, HOUR, evaluate_power_law, fit_power_law
+
+
+def quotes_frame(rows):
+    """Processed quotes indexed by (src, dst) from (src, dst, amount, impact, ts)."""
+    df = pd.DataFrame(
+        rows, columns=["src", "dst", "in_amount", "price_impact", "timestamp"]
+    )
+    return df.set_index(["src", "dst"])
+
+
+def test_recovers_exact_curves():
+    amounts = np.logspace(18, 22, 8)
+    rows = []
+    for (src, dst), intercept, slope in [
+        (("a", "b"), -30.0, 1.2),
+        (("b", "a"), -20.0, 0.8),
+    ]:
+        for hour in (0, 1):
+            impacts = evaluate_power_law(intercept + hour, slope, amounts)
+            rows += [
+                (src, dst, x, y, hour * HOUR + 5) for x, y in zip(amounts, impacts)
+            ]
+            rows.append((src, dst, 1e17, 0.0, hour * HOUR + 5))  # reference quote
+    curves = fit_power_law(quotes_frame(rows))
+
+    assert list(curves.columns) == CURVE_COLS
+    assert len(curves) == 4
+    ab = curves.loc[("a", "b")].sort_values("start")
+    assert ab["start"].tolist() == [0, HOUR]
+    assert ab["slope"].to_numpy() == pytest.approx([1.2, 1.2])
+    assert ab["intercept"].to_numpy() == pytest.approx([-30.0, -29.0])
+    assert ab["r2"].to_numpy() == pytest.approx([1.0, 1.0])
+    assert ab["n_quotes"].tolist() == [8, 8]
+    assert ab["min_amount"].iloc[0] == amounts[0]  # the reference quote is skipped
+    assert ab["max_amount"].iloc[0] == amounts[-1]
+    assert curves.loc[("b", "a"), "slope"].to_numpy() == pytest.approx([0.8, 0.8])
+
+
+def test_matches_polyfit_on_noisy_quotes():
+    rng = np.random.default_rng(0)
+    amounts = rng.uniform(1e18, 1e22, 50)
+    impacts = evaluate_power_law(-25.0, 1.0, amounts) * rng.lognormal(0, 0.3, 50)
+    rows = [("a", "b", x, y, 100) for x, y in zip(amounts, impacts)]
+    curves = fit_power_law(quotes_frame(rows), period=24 * HOUR)
+    slope, intercept = np.polyfit(np.log(amounts), np.log(impacts), 1)
+    r = np.corrcoef(np.log(amounts), np.log(impacts))[0, 1]
+    assert curves["slope"].iloc[0] == pytest.approx(slope)
+    assert curves["intercept"].iloc[0] == pytest.approx(intercept)
+    assert curves["r2"].iloc[0] == pytest.approx(r**2)
+    assert curves["period"].iloc[0] == 24 * HOUR
+
+
+def test_skips_small_groups():
+    rows = [("a", "b", 10.0**k, 10.0**-k, 0) for k in range(2)]
+    assert fit_power_law(quotes_frame(rows)).empty
+    assert fit_power_law(quotes_frame(rows), min_quotes=2)["n_quotes"].tolist() == [2]
+
+
+def test_empty_quotes():
+    curves = fit_power_law(pd.DataFrame())
+    assert curves.empty and list(curves.columns) == CURVE_COLS
@@ -0,0 +1,70 @@
+"""Tests for :mod:`src.network.ratelimit`."""
+import asyncio
+import time
+import pytest
+from src.network.ratelimit import AdaptiveRateLimiter, TokenBucket, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # past
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=50, capacity=2)
+
+    async def acquire(n: int) -> float:
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # 2 tokens of burst, then one every 20ms.
+    assert asyncio.run(acquire(7)) == pytest.approx(0.1, abs=0.05)
+
+
+def test_token_bucket_pauses_on_retry_after():
+    bucket = TokenBucket(rate=1000)
+    bucket.on_throttle(retry_after=0.1)
+    assert bucket.tokens == 0
+
+    async def acquire() -> float:
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire()) >= 0.1
+
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_adaptive_backs_off_once_per_cooldown():
+    limiter = AdaptiveRateLimiter(rate=8, min_rate=1, cooldown=60)
+    limiter.on_throttle()
+    limiter.on_throttle()  # from a request already in flight
+    assert limiter.rate == 4
+    assert limiter.throttles == 2
+    limiter.last_backoff = float("-inf")
+    for _ in range(5):
+        limiter.on_throttle()
+        limiter.last_backoff = float("-inf")
+    assert limiter.rate == 1  # clamped to min_rate
+
+
+def test_adaptive_ramps_up_after_successes():
+    limiter = AdaptiveRateLimiter(rate=1, max_rate=1.15, increase=0.1, ramp_after=3)
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(1.1)
+    limiter.on_throttle()
+    assert limiter.successes == 0
+    limiter.rate = 1.1
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.rate == 1.15  # clamped to max_rate
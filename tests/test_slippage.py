@@ -0,0 +1,78 @@
+"""Tests for :class:`src.curves.SlippageIndex`."""
+import numpy as np
+import pandas as pd
+from src.curves import HOUR, SlippageIndex
+
+
+def random_quotes(rng: np.random.Generator) -> pd.DataFrame:
+    """Rounds of 1 to 40 quotes, over a few pairs and sparse hours."""
+    rows = []
+    for src, dst in [("a", "b"), ("b", "a"), ("a", "c")]:
+        for hour in sorted(rng.choice(48, 10, replace=False)):
+            n = int(rng.integers(1, 41))
+            amounts = np.round(rng.uniform(1, 100, n))  # with duplicates
+            rows += [
+                (src, dst, x, rng.uniform(0, 0.1), hour * HOUR + 60) for x in amounts
+            ]
+    df = pd.DataFrame(
+        rows, columns=["src", "dst", "in_amount", "price_impact", "timestamp"]
+    )
+    return df.set_index(["src", "dst"])
+
+
+def reference(quotes, src, dst, amount, timestamp, max_age=None) -> float:
+    """np.interp on the latest round of the pair at or before `timestamp`."""
+    try:
+        pair = quotes.loc[[(src, dst)]]
+    except KeyError:
+        return np.nan
+    hours = pair["timestamp"] // HOUR
+    hours = hours[hours <= timestamp // HOUR]
+    if hours.empty or (
+        max_age is not None and timestamp - hours.max() * HOUR >= max_age + HOUR
+    ):
+        return np.nan
+    rnd = pair[pair["timestamp"] // HOUR == hours.max()]
+    rnd = rnd.sort_values("in_amount", kind="stable")
+    return float(np.interp(amount, rnd["in_amount"], rnd["price_impact"]))
+
+
+def test_matches_interp_on_latest_round():
+    rng = np.random.default_rng(1)
+    quotes = random_quotes(rng)
+    index = SlippageIndex(quotes)
+    n = 300
+    src = rng.choice(["a", "b", "c"], n)
+    dst = rng.choice(["a", "b", "c"], n)
+    amount = rng.uniform(-10, 110, n)  # beyond the quoted sizes too
+    timestamp = rng.integers(-HOUR, 50 * HOUR, n)
+    for max_age in (None, 3 * HOUR):
+        got = index.lookup(src, dst, amount, timestamp, max_age=max_age)
+        want = [
+            reference(quotes, *query, max_age=max_age)
+            for query in zip(src, dst, amount, timestamp)
+        ]
+        np.testing.assert_allclose(got, want, equal_nan=True)
+
+
+def test_exact_quotes_and_unknown_pairs():
+    quotes = pd.DataFrame(
+        {
+            "src": ["a"] * 3,
+            "dst": ["b"] * 3,
+            "in_amount": [10.0, 0.0, 20.0],  # zero amounts are dropped
+            "price_impact": [0.01, 0.5, 0.03],
+            "timestamp": [HOUR] * 3,
+        }
+    ).set_index(["src", "dst"])
+    index = SlippageIndex(quotes)
+    assert len(index) == 2
+    got = index.lookup(["a", "a", "b"], ["b", "b", "a"], [10, 15, 10], HOUR + 1)
+    np.testing.assert_allclose(got, [0.01, 0.02, np.nan])
+    codes = index.pair_codes(np.array(["a"]), np.array(["b"]))
+    assert index.lookup_codes(codes, 20, 5 * HOUR) == [0.03]
+
+
+def test_empty_index():
+    index = SlippageIndex(pd.DataFrame())
+    assert np.isnan(index.lookup("a", "b", 1.0, HOUR)).all()
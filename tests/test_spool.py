@@ -0,0 +1,96 @@
+"""Tests for :class:`src.collector.spool.QuoteSpool`."""
+import os
+from typing import List
+import pandas as pd
+from src.collector.spool import QuoteSpool
+from src.configs import ALL_TOKEN_DTOs
+from src.network.oneinch import QuoteResponse
+
+SRC, DST = list(ALL_TOKEN_DTOs)[:2]
+
+
+def response(amount: int, timestamp: int = 1) -> QuoteResponse:
+    """A quote of `amount` of SRC for twice as much DST."""
+    return QuoteResponse(
+        {
+            "fromToken": {"address": SRC, "decimals": 0},
+            "toToken": {"address": DST, "decimals": 0},
+            "toAmount": str(2 * amount),
+            "gas": 0,
+            "protocols": [],
+        },
+        amount,
+        timestamp,
+    )
+
+
+class RecordingHandler:
+    """Stands in for a DataHandler, failing while `down`."""
+
+    def __init__(self) -> None:
+        self.frames: List[pd.DataFrame] = []
+        self.down = False
+
+    def insert_quotes(self, df: pd.DataFrame) -> None:
+        if self.down:
+            raise ConnectionError("Postgres is down")
+        self.frames.append(df)
+
+    @property
+    def amounts(self) -> List[int]:
+        return [int(a) for df in self.frames for a in df["in_amount"]]
+
+
+def test_pending_resumes_missing_slots(tmp_path):
+    spool = QuoteSpool(str(tmp_path), fsync=False)
+    assert spool.pending() is None
+    spool.start_round(100, [((SRC, DST), [1, 2, 3]), ((DST, SRC), [4])])
+    spool.append((SRC, DST), response(2))
+    spool.close()
+    with open(tmp_path / "100.ndjson", "a", encoding="utf-8") as f:
+        f.write('{"type": "quo')  # torn by a crash
+
+    restarted = QuoteSpool(str(tmp_path), fsync=False)
+    assert restarted.pending() == (100, [((SRC, DST), [1, 3]), ((DST, SRC), [4])])
+    assert restarted.round == 100  # reopened, without the torn line
+    restarted.append((SRC, DST), response(1))
+    assert restarted.quotes(100)["in_amount"].tolist() == [2, 1]
+    restarted.finish_round()
+    assert restarted.pending() is None
+
+
+def test_drain_resumes_after_failure(tmp_path):
+    spool = QuoteSpool(str(tmp_path), fsync=False)
+    spool.start_round(100, [((SRC, DST), list(range(1, 6)))])
+    for amount in range(1, 6):
+        spool.append((SRC, DST), response(amount))
+    spool.finish_round()
+    dh = RecordingHandler()
+    dh.down = True
+    assert not spool.drain(dh, batch=2)  # type: ignore [arg-type]
+    assert spool.rounds() == [100]
+
+    dh.down = False
+    assert spool.drain(dh, batch=2)  # type: ignore [arg-type]
+    assert dh.amounts == [1, 2, 3, 4, 5]
+    assert [len(df) for df in dh.frames] == [2, 2, 1]
+    assert spool.rounds() == [] and spool.offsets == {}
+
+
+def test_drain_skips_marked_quotes(tmp_path):
+    spool = QuoteSpool(str(tmp_path), fsync=False)
+    spool.start_round(100, [((SRC, DST), [1, 2, 3])])
+    spool.append((SRC, DST), response(1))
+    offset = spool.append((SRC, DST), response(2))
+    spool.mark_drained(100, offset)  # inserted by the pipeline
+    spool.append((SRC, DST), response(3))
+    dh = RecordingHandler()
+    assert spool.drain(dh)  # type: ignore [arg-type]
+    assert dh.amounts == [3]
+    assert spool.rounds() == [100]  # still open
+    assert QuoteSpool(str(tmp_path)).offsets == {"100": spool.offsets["100"]}
+
+    spool.finish_round()
+    assert spool.drain(dh)  # type: ignore [arg-type]
+    assert dh.amounts == [3]
+    assert os.listdir(tmp_path) == ["drained.json"]
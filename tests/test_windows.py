@@ -0,0 +1,47 @@
+"""Tests for :class:`src.curves.WindowedStats`."""
+import numpy as np
+import pytest
+from src.curves import HOUR, WINDOW_COLS, WindowedStats
+
+WINDOWS = {"1h": HOUR, "3h": 3 * HOUR}
+
+
+def test_windows_end_at_latest_round():
+    stats = WindowedStats(notionals=(1, 2), windows=WINDOWS)
+    for hour, impact in enumerate([0.1, 0.2, 0.3, 0.4]):
+        stats.add("a", "b", hour * HOUR, [impact, np.nan])
+    stats.add("a", "c", 0, [0.5, 0.5])  # outside the windows by now
+    assert len(stats) == 3  # only the last 3 rounds of (a, b) are kept
+
+    df = stats.stats()
+    assert list(df.columns) == WINDOW_COLS
+    ab = df.loc[("a", "b")].set_index("window")
+    assert ab.loc["1h", "median"] == pytest.approx(0.4)
+    assert ab.loc["3h", "median"] == pytest.approx(0.3)
+    assert ab.loc["3h", "n_rounds"] == 3
+    assert ab.loc["3h", "p90"] == pytest.approx(np.percentile([0.2, 0.3, 0.4], 90))
+    assert (ab["notional"] == 1).all()  # no impact known at notional 2
+    assert ("a", "c") not in df.index
+    assert stats.stats(["a", "c"]).empty
+
+
+def test_add_replaces_and_orders_rounds():
+    stats = WindowedStats(notionals=(1,), windows=WINDOWS)
+    stats.add("a", "b", 2 * HOUR, [0.2])
+    stats.add("a", "b", HOUR, [0.1])  # late round
+    stats.add("a", "b", 2 * HOUR, [0.3])  # replaced
+    assert stats.rounds[("a", "b")] == ([HOUR, 2 * HOUR], [[0.1], [0.3]])
+    assert stats.last_hour == 2 * HOUR
+    assert stats.stats().set_index("window").loc["3h", "median"] == pytest.approx(0.2)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "windows.json")
+    stats = WindowedStats(notionals=(1, 2), windows=WINDOWS)
+    stats.add("a", "b", HOUR, [0.1, np.nan])
+    stats.save(path)
+    restored = WindowedStats.load(path, notionals=(1, 2), windows=WINDOWS)
+    assert restored.last_hour == HOUR
+    assert restored.stats().equals(stats.stats())
+    assert not WindowedStats.load(path, notionals=(1,), windows=WINDOWS).rounds
+    assert not WindowedStats.load(str(tmp_path / "none.json")).rounds